@@ -0,0 +1,111 @@
+"""动态关键词分发基准：对比逐条解析映射与预编译分发索引在未命中消息上的单条开销。
+
+用法（在插件根目录下）：python -m bench.bench_dispatch [--mappings 10000] [--messages 200000]
+"""
+
+import argparse
+import random
+import string
+import time
+
+from core.dispatch import KeywordDispatchIndex
+
+
+def build_mappings(count: int) -> dict:
+    mappings = {}
+    for i in range(count):
+        keyword = "".join(random.choices(string.ascii_lowercase, k=6)) + str(i)
+        folders = ",".join(f"folder{random.randrange(100)}" for _ in range(random.randint(1, 3)))
+        mappings[keyword] = {"folder": folders, "content_type": random.choice(["image", "video", "image,video"])}
+    return mappings
+
+
+class Plain:
+    __slots__ = ("text",)
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class At:
+    __slots__ = ("qq",)
+
+    def __init__(self, qq: str):
+        self.qq = qq
+
+
+class Message:
+    """模拟事件：原始文本 + 消息段列表"""
+
+    __slots__ = ("message_str", "segments")
+
+    def __init__(self, text: str, with_at: bool):
+        self.message_str = text
+        self.segments = ([At("10000")] if with_at else []) + [Plain(text)]
+
+
+def first_plain_text(message: Message) -> str:
+    for seg in message.segments:
+        if isinstance(seg, Plain):
+            return seg.text.strip()
+    return ""
+
+
+def legacy_dispatch(mappings: dict, message: Message):
+    """v1.3 中 _process_dynamic_command 的逐条处理逻辑"""
+    message_text = first_plain_text(message)
+    if message_text.startswith('/') and len(message_text) > 1:
+        keyword = message_text[1:]
+        if keyword in mappings:
+            mapping = mappings[keyword]
+            folder_name_raw = mapping.get("folder", "")
+            content_type = mapping.get("content_type", "image,video")
+            folders = [f.strip() for f in folder_name_raw.replace('，', ',').split(',') if f.strip()]
+            return folders, content_type
+    return None
+
+
+def indexed_dispatch(index: KeywordDispatchIndex, message: Message):
+    if index.quick_reject(message.message_str):
+        return None
+    return index.match(first_plain_text(message))
+
+
+def bench(name: str, func, arg, messages: list[Message]):
+    start = time.perf_counter()
+    for text in messages:
+        func(arg, text)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<10} {elapsed / len(messages) * 1e9:8.1f} ns/msg")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mappings", type=int, default=10000)
+    parser.add_argument("--messages", type=int, default=200000)
+    args = parser.parse_args()
+
+    mappings = build_mappings(args.mappings)
+    start = time.perf_counter()
+    index = KeywordDispatchIndex(mappings)
+    print(f"mappings={len(mappings)}, index build={(time.perf_counter() - start) * 1000:.1f}ms")
+
+    def make(text: str) -> Message:
+        return Message(text, with_at=random.random() < 0.3)
+
+    chat = [
+        make("".join(random.choices(string.ascii_letters + "，。你好哈 ", k=random.randint(4, 60))))
+        for _ in range(args.messages)
+    ]
+    commands_miss = [make(f"/{'Z' + str(i)}") for i in range(args.messages)]
+    keywords = list(mappings)
+    commands_hit = [make(f"/{random.choice(keywords)}") for _ in range(args.messages)]
+
+    for label, messages in (("普通聊天", chat), ("未命中指令", commands_miss), ("命中指令", commands_hit)):
+        print(f"-- {label}")
+        bench("legacy", legacy_dispatch, mappings, messages)
+        bench("indexed", indexed_dispatch, index, messages)
+
+
+if __name__ == "__main__":
+    main()
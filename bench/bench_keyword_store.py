@@ -0,0 +1,85 @@
+"""关键词映射存储基准：对比整文件 JSON 读写与 SQLite（WAL）存储在大量映射下的加载与保存耗时。
+
+用法（在插件根目录下）：python -m bench.bench_keyword_store [--mappings 50000]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from core.keyword_store import KeywordMappingStore
+
+
+def build_mappings(count: int) -> dict:
+    mappings = {}
+    for i in range(count):
+        if i % 10 == 0:
+            # 旧版字符串格式
+            mappings[f"kw{i}"] = f"folder{i % 300}"
+        else:
+            mappings[f"kw{i}"] = {"folder": f"folder{i % 300},folder{(i + 7) % 300}", "content_type": "image,video"}
+    return mappings
+
+
+def timed(label: str, start: float):
+    print(f"{label:<28} {(time.perf_counter() - start) * 1000:9.1f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mappings", type=int, default=50000)
+    parser.add_argument("--burst", type=int, default=200, help="一次突发修改的条数")
+    args = parser.parse_args()
+
+    mappings = build_mappings(args.mappings)
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "keyword_mappings.json")
+
+        start = time.perf_counter()
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(mappings, f, ensure_ascii=False, indent=2)
+        timed("json save (full rewrite)", start)
+
+        start = time.perf_counter()
+        with open(json_path, "r", encoding="utf-8") as f:
+            json.load(f)
+        timed("json load", start)
+
+        start = time.perf_counter()
+        for i in range(args.burst):
+            mappings[f"kw{i}"] = {"folder": "burst", "content_type": "image"}
+            with open(json_path, "w", encoding="utf-8") as f:
+                json.dump(mappings, f, ensure_ascii=False, indent=2)
+        timed(f"json save x{args.burst} edits", start)
+
+        db_path = os.path.join(tmp, "keyword_mappings.db")
+        store = KeywordMappingStore(db_path, legacy_json_path=json_path, flush_delay=0.05)
+        start = time.perf_counter()
+        loaded = await store.load()
+        timed(f"sqlite migrate+load ({store.migrated})", start)
+        assert len(loaded) == len(mappings)
+        await store.close()
+
+        store = KeywordMappingStore(db_path, legacy_json_path=json_path, flush_delay=0.05)
+        start = time.perf_counter()
+        await store.load()
+        timed("sqlite load", start)
+
+        start = time.perf_counter()
+        store.put("kw1", {"folder": "single", "content_type": "video"})
+        await store.flush()
+        timed("sqlite save (1 edit)", start)
+
+        start = time.perf_counter()
+        for i in range(args.burst):
+            store.put(f"kw{i}", {"folder": "burst2", "content_type": "video"})
+        await store.flush()
+        timed(f"sqlite save x{args.burst} edits", start)
+        await store.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,236 @@
+"""插件压测：在本地图床替身与 OneBot 替身上并发执行 /img、关键词指令与 /上传，统计延迟分位数、吞吐与峰值内存，并与保存的基线对比。
+
+需在 AstrBot 运行环境中执行（可导入 astrbot 与 aiohttp），在插件根目录下：
+    python -m bench.bench_load --scenario img --requests 500 --concurrency 50
+    python -m bench.bench_load --scenario upload --requests 20 --concurrency 4 --batch 100 --save-baseline
+    python -m bench.bench_load --scenario keyword --compare
+
+--config 可指定一个 JSON 文件覆盖插件配置（如开启 prefetch、manifest），用于对比各项优化的效果；
+--fixtures 可使用录制的 OneBot 数据代替生成的合并转发。基线保存在 bench/baselines/<场景>.json。
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from unittest import mock
+
+from bench.fake_imgbed import FakeImgBed
+from bench.fake_onebot import FakeBotAPI, FakeEvent, build_forward_fixture, load_fixtures
+
+PLUGIN_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_DIR = os.path.join(PLUGIN_ROOT, "bench", "baselines")
+SCENARIOS = ("img", "keyword", "upload")
+
+
+def import_plugin_module():
+    """以包的形式导入插件（main.py 使用相对导入）"""
+    parent, package = os.path.split(PLUGIN_ROOT)
+    if parent not in sys.path:
+        sys.path.insert(0, parent)
+    return importlib.import_module(f"{package}.main")
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def peak_rss_mb() -> float:
+    # Linux 下 ru_maxrss 单位为 KB，macOS 为字节
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+async def drain(agen, first_reply: list[float] | None = None) -> list:
+    """收集处理函数的全部回复；first_reply 非空时追加首条回复的耗时"""
+    start = time.perf_counter()
+    items = []
+    async for item in agen:
+        if not items and first_reply is not None:
+            first_reply.append(time.perf_counter() - start)
+        items.append(item)
+    return items
+
+
+async def run_scenario(args) -> dict:
+    module = import_plugin_module()
+    components = importlib.import_module("astrbot.core.message.components")
+
+    imgbed = FakeImgBed(
+        latency={
+            "random": args.random_ms / 1000,
+            "upload": args.upload_ms / 1000,
+            "file": args.file_ms / 1000,
+        },
+        error_rate=args.error_rate,
+        image_size=args.image_kb * 1024,
+        video_size=args.video_kb * 1024,
+    )
+    base_url = await imgbed.start()
+    api = FakeBotAPI(latency={"get_forward_msg": args.forward_ms / 1000, "get_file": args.get_file_ms / 1000})
+    if args.fixtures:
+        for action, items in load_fixtures(args.fixtures, base_url).items():
+            for key, response in items.items():
+                api.add(action, key, response)
+
+    config = {"base_url": base_url, "auth_code": "", "upload_admin_only": False, "show_upload_link": True}
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as f:
+            config.update(json.load(f))
+        config["base_url"] = base_url
+
+    data_dir = tempfile.mkdtemp(prefix="cloudimg-bench-")
+    with mock.patch.object(module.StarTools, "get_data_dir", return_value=data_dir):
+        plugin = module.CloudImgPlugin(context=mock.MagicMock(), config=config)
+    await plugin.load_keyword_mappings()
+    plugin.keyword_folder_map["bench"] = {"folder": "bench1,bench2,bench3", "content_type": "image,video"}
+    plugin.save_keyword_mappings("bench")
+
+    def make_event(i: int) -> tuple:
+        if args.scenario == "img":
+            text = "/img"
+            return plugin.get_image, FakeEvent(api, [components.Plain(text=text)], text), ()
+        if args.scenario == "keyword":
+            text = "/bench"
+            return plugin._process_dynamic_command, FakeEvent(api, [components.Plain(text=text)], text), ()
+        forward_id = f"fwd{i}" if not args.fixtures else args.forward_id
+        if not args.fixtures:
+            build_forward_fixture(api, forward_id, args.batch, base_url, video_ratio=args.video_ratio)
+        text = "/上传 bench"
+        event = FakeEvent(
+            api,
+            [components.Forward(id=forward_id)],
+            text,
+            origin=f"bench:GroupMessage:{i % args.chats}",
+            sender_id=str(10000 + i % args.chats),
+        )
+        return plugin.upload_image, event, ("bench",)
+
+    jobs = [make_event(i) for i in range(args.requests)]
+    latencies: list[float] = []
+    first_replies: list[float] = []
+    failures = 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def run_one(handler, event, handler_args):
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                results = await drain(handler(event, *handler_args), first_replies)
+                if not results or any(kind == "plain" and "失败" in str(text) for kind, text in results):
+                    failures += 1
+            except Exception:
+                failures += 1
+            latencies.append(time.perf_counter() - start)
+
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(run_one(*job) for job in jobs))
+    wall = time.perf_counter() - wall_start
+
+    plugin_metrics = plugin.metrics.render_text()
+    await plugin.terminate()
+    await imgbed.stop()
+
+    latencies.sort()
+    first_replies.sort()
+    report = {
+        "scenario": args.scenario,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "batch": args.batch if args.scenario == "upload" else None,
+        "failures": failures,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(args.requests / wall, 2) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "first_reply_p50_ms": round(percentile(first_replies, 0.50) * 1000, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "imgbed": imgbed.stats(),
+        "onebot_calls": dict(api.calls),
+    }
+    if args.verbose:
+        print(plugin_metrics)
+    return report
+
+
+def baseline_path(scenario: str) -> str:
+    return os.path.join(BASELINE_DIR, f"{scenario}.json")
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """返回超出容差的指标：延迟与内存越低越好，吞吐越高越好"""
+    regressions = []
+    for key in ("p50_ms", "p95_ms", "p99_ms", "peak_rss_mb"):
+        old, new = baseline.get(key), report.get(key)
+        if old and new is not None and new > old * (1 + tolerance):
+            regressions.append(f"{key}: {old} -> {new} (+{(new / old - 1) * 100:.1f}%)")
+    old, new = baseline.get("throughput_rps"), report.get("throughput_rps")
+    if old and new is not None and new < old * (1 - tolerance):
+        regressions.append(f"throughput_rps: {old} -> {new} ({(new / old - 1) * 100:.1f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", choices=SCENARIOS, default="img")
+    parser.add_argument("--requests", type=int, default=200, help="指令总数")
+    parser.add_argument("--concurrency", type=int, default=20, help="同时执行的指令数")
+    parser.add_argument("--batch", type=int, default=20, help="upload 场景每条合并转发的媒体数")
+    parser.add_argument("--chats", type=int, default=4, help="upload 场景模拟的会话数")
+    parser.add_argument("--video-ratio", type=float, default=0.1)
+    parser.add_argument("--random-ms", type=float, default=30)
+    parser.add_argument("--upload-ms", type=float, default=200)
+    parser.add_argument("--file-ms", type=float, default=50, help="CDN 下载延迟")
+    parser.add_argument("--forward-ms", type=float, default=150)
+    parser.add_argument("--get-file-ms", type=float, default=30)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--image-kb", type=int, default=200)
+    parser.add_argument("--video-kb", type=int, default=4096)
+    parser.add_argument("--config", help="覆盖插件配置的 JSON 文件")
+    parser.add_argument("--fixtures", help="录制的 OneBot 数据 JSON 文件")
+    parser.add_argument("--forward-id", default="fixture", help="使用录制数据时上传的合并转发 id")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true", help="与保存的基线对比，超出容差时以非零状态退出")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    parser.add_argument("--verbose", action="store_true", help="同时输出插件内置指标")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_scenario(args))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(baseline_path(args.scenario), "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"基线已保存: {baseline_path(args.scenario)}")
+
+    if args.compare:
+        try:
+            with open(baseline_path(args.scenario), "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            print("未找到基线，请先使用 --save-baseline 保存")
+            sys.exit(2)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print("性能回退:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("与基线相比无回退")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""阻塞操作卸载基准：对比大 JSON 解析与大文件读取内联/卸载执行时的事件循环延迟。
+
+模拟一个持续发送 /img 的请求方（每 interval 毫秒唤醒一次并记录唤醒延迟），
+同时在事件循环中处理大型合并转发负载。卸载后唤醒延迟应保持平稳。
+
+用法（在插件根目录下）：python -m bench.bench_offload [--nodes 20000] [--file-mb 64]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from core.offload import BlockingOffloader
+
+
+def build_forward_payload(nodes: int) -> str:
+    segments = [
+        {"type": "image", "data": {"url": f"https://multimedia.nt.qq.com.cn/download?appid=1407&fileid={i:08x}", "file": f"{i:032x}.jpg"}}
+        for i in range(nodes)
+    ]
+    return json.dumps(segments)
+
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float, samples: list[float]):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append((time.perf_counter() - start - interval) * 1000)
+
+
+async def run_case(offloader: BlockingOffloader, payload: str, path: str, rounds: int, interval: float) -> list[float]:
+    stop = asyncio.Event()
+    samples: list[float] = []
+    ticker = asyncio.create_task(measure_loop_lag(stop, interval, samples))
+    await asyncio.sleep(interval * 5)
+    for _ in range(rounds):
+        await offloader.json_loads(payload)
+        await offloader.read_file(path)
+    stop.set()
+    await ticker
+    return samples
+
+
+def summarize(name: str, samples: list[float]):
+    ordered = sorted(samples)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(
+        f"{name:<10} samples={len(ordered):<5} p50={statistics.median(ordered):7.2f}ms "
+        f"p99={p99:7.2f}ms max={ordered[-1]:7.2f}ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=20000, help="合并转发中的媒体段数量")
+    parser.add_argument("--file-mb", type=int, default=64, help="本地媒体文件大小（MB）")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--interval-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    payload = build_forward_payload(args.nodes)
+    with tempfile.NamedTemporaryFile(delete=False) as f:
+        f.write(os.urandom(args.file_mb * 1024 * 1024))
+        path = f.name
+
+    try:
+        print(f"payload={len(payload) / 1024 / 1024:.1f}MB, file={args.file_mb}MB, rounds={args.rounds}")
+        inline = BlockingOffloader(inline_threshold=1 << 62)
+        summarize("inline", await run_case(inline, payload, path, args.rounds, args.interval_ms / 1000))
+        offloaded = BlockingOffloader()
+        summarize("offloaded", await run_case(offloaded, payload, path, args.rounds, args.interval_ms / 1000))
+        print(f"offloaded stats: {offloaded.stats()}")
+        offloaded.shutdown()
+    finally:
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,235 @@
+"""本地 CloudFlare-ImgBed 替身：提供 /random、/upload、文件列表与文件下载接口，延迟、错误率与文件体积可配置。
+
+单独运行（在插件根目录下）：python -m bench.fake_imgbed [--port 8787]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import random
+import struct
+import time
+import uuid
+
+from aiohttp import web
+
+
+class FakeImgBed:
+    """基于 aiohttp.web 的图床替身。
+
+    latency 为各接口的固定延迟（秒），jitter 为在其基础上叠加的随机比例；
+    error_rate 比例的请求直接返回 503，用于触发重试与熔断。
+    /file/ 下的文件内容为带真实文件头（JPEG SOI / MP4 ftyp 盒）的随机数据，可通过上传前的格式识别；
+    图片与视频体积分别由 image_size、video_size 决定。
+    /upload 同时支持分块上传（initChunked -> chunked + chunkIndex -> merge）。
+    """
+
+    def __init__(
+        self,
+        latency: dict[str, float] | None = None,
+        jitter: float = 0.2,
+        error_rate: float = 0.0,
+        image_size: int = 200 * 1024,
+        video_size: int = 4 * 1024 * 1024,
+        folder_size: int = 500,
+        video_ratio: float = 0.2,
+    ):
+        self.latency = {"random": 0.03, "upload": 0.2, "upload_chunk": 0.05, "list": 0.05, "file": 0.05}
+        self.latency.update(latency or {})
+        self.jitter = max(0.0, jitter)
+        self.error_rate = max(0.0, min(1.0, error_rate))
+        self.image_size = image_size
+        self.video_size = video_size
+        self.folder_size = folder_size
+        self.video_ratio = video_ratio
+        self.base_url = ""
+        self.requests: dict[str, int] = {}
+        self.errors: dict[str, int] = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._runner: web.AppRunner | None = None
+        # (体积, 是否视频) -> 文件内容
+        self._blobs: dict[tuple[int, bool], bytes] = {}
+        # 分块上传会话：uploadId -> {分块序号: 字节数}
+        self._chunked: dict[str, dict[int, int]] = {}
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=1024 ** 3)
+        app.router.add_get("/random", self._random)
+        app.router.add_post("/upload", self._upload)
+        app.router.add_get("/api/manage/list", self._list)
+        app.router.add_get("/file/{path:.*}", self._file)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_port = self._runner.addresses[0][1]
+        self.base_url = f"http://{host}:{bound_port}"
+        return self.base_url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def stats(self) -> dict:
+        return {
+            "requests": dict(self.requests),
+            "errors": dict(self.errors),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+        }
+
+    async def _simulate(self, route: str) -> web.Response | None:
+        self.requests[route] = self.requests.get(route, 0) + 1
+        delay = self.latency.get(route, 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay * (1 + random.uniform(-self.jitter, self.jitter)))
+        if self.error_rate and random.random() < self.error_rate:
+            self.errors[route] = self.errors.get(route, 0) + 1
+            return web.Response(status=503, text="Service Unavailable")
+        return None
+
+    def _file_name(self, folder: str, index: int, video: bool) -> str:
+        name = f"{index}.mp4" if video else f"{index}.jpg"
+        return f"{folder}/{name}" if folder else name
+
+    async def _random(self, request: web.Request) -> web.Response:
+        error = await self._simulate("random")
+        if error is not None:
+            return error
+        content = request.query.get("content", "image,video")
+        folder = request.query.get("dir", "")
+        kinds = [k for k in content.split(",") if k in ("image", "video")] or ["image"]
+        if len(kinds) > 1:
+            video = random.random() < self.video_ratio
+        else:
+            video = kinds[0] == "video"
+        return web.Response(text=f"/file/{self._file_name(folder, random.randrange(self.folder_size), video)}")
+
+    async def _upload(self, request: web.Request) -> web.Response:
+        # 先完整读取请求体，与真实图床一样在收完数据后才开始计算处理延迟
+        filename = "upload.jpg"
+        fields: dict[str, str] = {}
+        received = 0
+        if request.content_type.startswith("multipart/"):
+            reader = await request.multipart()
+            async for part in reader:
+                if part.name == "file":
+                    filename = part.filename or filename
+                    while chunk := await part.read_chunk(256 * 1024):
+                        received += len(chunk)
+                else:
+                    fields[part.name] = await part.text()
+        else:
+            fields.update(await request.post())
+        self.bytes_in += received
+
+        if fields.get("chunked") == "true" and fields.get("merge") != "true":
+            # 分块上传的单个分块
+            error = await self._simulate("upload_chunk")
+            if error is not None:
+                return error
+            chunks = self._chunked.get(fields.get("uploadId"))
+            if chunks is None:
+                return web.Response(status=404, text="upload session not found")
+            chunks[int(fields.get("chunkIndex", 0))] = received
+            return web.json_response({"success": True})
+
+        error = await self._simulate("upload")
+        if error is not None:
+            return error
+        if fields.get("initChunked") == "true":
+            upload_id = uuid.uuid4().hex
+            self._chunked[upload_id] = {}
+            return web.json_response({"uploadId": upload_id})
+        if fields.get("merge") == "true":
+            chunks = self._chunked.get(fields.get("uploadId"))
+            if chunks is None or len(chunks) != int(fields.get("totalChunks", 0)):
+                return web.Response(status=400, text="chunks incomplete")
+            del self._chunked[fields["uploadId"]]
+            filename = fields.get("originalFileName") or filename
+
+        folder = request.query.get("uploadFolder", "")
+        ext = filename.rsplit(".", 1)[-1] if "." in filename else "jpg"
+        name = f"{folder}/{uuid.uuid4().hex}.{ext}" if folder else f"{uuid.uuid4().hex}.{ext}"
+        return web.json_response([{"src": f"{self.base_url}/file/{name}"}])
+
+    async def _list(self, request: web.Request) -> web.Response:
+        error = await self._simulate("list")
+        if error is not None:
+            return error
+        folder = request.query.get("dir", "")
+        etag = f'"{hashlib.md5(f"{folder}:{self.folder_size}".encode()).hexdigest()}"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304)
+        start = int(request.query.get("start", 0))
+        count = int(request.query.get("count", 1000))
+        now = time.time()
+        files = []
+        for i in range(start, min(start + count, self.folder_size)):
+            video = (i * 7919 % 100) < self.video_ratio * 100
+            files.append({
+                "name": self._file_name(folder, i, video),
+                "metadata": {"FileType": "video/mp4" if video else "image/jpeg", "TimeStamp": now - i},
+            })
+        return web.json_response({"files": files}, headers={"ETag": etag})
+
+    async def _file(self, request: web.Request) -> web.Response:
+        error = await self._simulate("file")
+        if error is not None:
+            return error
+        video = request.match_info["path"].endswith(".mp4")
+        size = self.video_size if video else self.image_size
+        blob = self._blobs.get((size, video))
+        if blob is None:
+            blob = self._blobs[(size, video)] = _make_blob(size, video)
+        self.bytes_out += size
+        return web.Response(body=blob, content_type="video/mp4" if video else "image/jpeg")
+
+
+def _make_blob(size: int, video: bool) -> bytes:
+    """生成指定体积的媒体内容：真实文件头 + 随机数据"""
+    if video:
+        body = b"ftypisom" + b"\x00\x00\x02\x00" + b"isomiso2avc1mp41"
+        head = struct.pack(">I", len(body) + 4) + body
+    else:
+        head = b"\xff\xd8\xff\xe0"
+    return head + random.randbytes(max(0, size - len(head)))
+
+
+async def serve(args):
+    imgbed = FakeImgBed(
+        latency={"random": args.random_ms / 1000, "upload": args.upload_ms / 1000, "file": args.file_ms / 1000},
+        error_rate=args.error_rate,
+        image_size=args.image_kb * 1024,
+        video_size=args.video_kb * 1024,
+    )
+    url = await imgbed.start(port=args.port)
+    print(f"fake ImgBed listening on {url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await imgbed.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--random-ms", type=float, default=30)
+    parser.add_argument("--upload-ms", type=float, default=200)
+    parser.add_argument("--file-ms", type=float, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--image-kb", type=int, default=200)
+    parser.add_argument("--video-kb", type=int, default=4096)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
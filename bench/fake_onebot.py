@@ -0,0 +1,117 @@
+"""OneBot 接口替身：以录制或生成的数据响应 get_msg、get_forward_msg、get_file，并构造可直接交给插件处理的消息事件。
+
+录制数据为 JSON 文件，结构为 {"get_msg": {message_id: 响应}, "get_forward_msg": {id: 响应}, "get_file": {file_id: 响应}}，
+其中字符串内的 {cdn} 会替换为本地图床替身地址。
+"""
+
+import asyncio
+import json
+import random
+
+# 各接口以哪个参数作为数据的键
+ACTION_KEYS = {"get_msg": "message_id", "get_forward_msg": "id", "get_file": "file_id"}
+
+
+class FakeBotAPI:
+    """模拟 event.bot.api，call_action 按接口名与参数查找数据，未命中时与真实协议端一样抛出异常"""
+
+    def __init__(self, fixtures: dict | None = None, latency: dict[str, float] | None = None, jitter: float = 0.2):
+        self.fixtures: dict[str, dict] = {action: {} for action in ACTION_KEYS}
+        for action, items in (fixtures or {}).items():
+            self.fixtures.setdefault(action, {}).update({str(k): v for k, v in items.items()})
+        self.latency = {"get_msg": 0.02, "get_forward_msg": 0.15, "get_file": 0.03}
+        self.latency.update(latency or {})
+        self.jitter = jitter
+        self.calls: dict[str, int] = {}
+
+    def add(self, action: str, key, response):
+        self.fixtures.setdefault(action, {})[str(key)] = response
+
+    async def call_action(self, action: str, **params):
+        self.calls[action] = self.calls.get(action, 0) + 1
+        delay = self.latency.get(action, 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay * (1 + random.uniform(-self.jitter, self.jitter)))
+        key = params.get(ACTION_KEYS.get(action, ""))
+        try:
+            return self.fixtures[action][str(key)]
+        except KeyError:
+            raise RuntimeError(f"{action} 无数据: {params}") from None
+
+
+def load_fixtures(path: str, cdn_base: str) -> dict:
+    """读取录制数据，将其中的 {cdn} 替换为本地图床替身地址"""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    return json.loads(text.replace("{cdn}", cdn_base))
+
+
+def build_forward_fixture(
+    api: FakeBotAPI,
+    forward_id: str,
+    count: int,
+    cdn_base: str,
+    video_ratio: float = 0.0,
+    get_file_ratio: float = 0.5,
+):
+    """生成一条含 count 个媒体节点的合并转发，部分节点只带 file_id，需要经 get_file 换取链接"""
+    nodes = []
+    for i in range(count):
+        video = random.random() < video_ratio
+        ext = "mp4" if video else "jpg"
+        kind = "video" if video else "image"
+        file_id = f"{forward_id}_{i}.{ext}"
+        url = f"{cdn_base}/file/cdn/{forward_id}/{i}.{ext}"
+        if random.random() < get_file_ratio:
+            data = {"file": file_id}
+            api.add("get_file", file_id, {"url": url})
+        else:
+            data = {"file": file_id, "url": url}
+        nodes.append({"sender": {"user_id": 10000 + i}, "message": [{"type": kind, "data": data}]})
+    api.add("get_forward_msg", forward_id, {"messages": nodes})
+
+
+class FakeMessageObject:
+    def __init__(self, message: list, message_str: str, message_id: str):
+        self.message = message
+        self.message_str = message_str
+        self.message_id = message_id
+
+
+class FakeEvent:
+    """最小化的消息事件，提供插件处理指令时用到的接口"""
+
+    def __init__(
+        self,
+        api: FakeBotAPI,
+        message: list,
+        message_str: str,
+        origin: str = "bench:GroupMessage:1",
+        sender_id: str = "10001",
+        admin: bool = True,
+    ):
+        self.bot = type("FakeBot", (), {"api": api})()
+        self.message_obj = FakeMessageObject(message, message_str, f"msg-{random.getrandbits(32)}")
+        self.message_str = message_str
+        self.unified_msg_origin = origin
+        self._sender_id = sender_id
+        self._admin = admin
+        self.stopped = False
+
+    def get_messages(self) -> list:
+        return self.message_obj.message
+
+    def get_sender_id(self) -> str:
+        return self._sender_id
+
+    def is_admin(self) -> bool:
+        return self._admin
+
+    def stop_event(self):
+        self.stopped = True
+
+    def plain_result(self, text: str):
+        return ("plain", text)
+
+    def chain_result(self, chain: list):
+        return ("chain", chain)
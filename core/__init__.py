@@ -0,0 +1 @@
+"""CF图床助手内部组件"""
@@ -0,0 +1,134 @@
+import random
+from typing import Callable, Iterable
+
+from .resilience import CircuitBreaker
+
+READ = "read"
+WRITE = "write"
+BOTH = "both"
+ROLES = (READ, WRITE, BOTH)
+
+
+class Backend:
+    """单个图床实例：地址、角色、认证码，以及用于健康判定的熔断器与延迟 EWMA"""
+
+    __slots__ = ("name", "base_url", "role", "auth_code", "breaker", "ewma", "requests", "failures")
+
+    def __init__(self, name: str, base_url: str, role: str, auth_code: str, breaker: CircuitBreaker):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.role = role if role in ROLES else BOTH
+        self.auth_code = auth_code
+        self.breaker = breaker
+        # 尚无样本时为 None，选路时优先尝试
+        self.ewma: float | None = None
+        self.requests = 0
+        self.failures = 0
+
+    @property
+    def can_read(self) -> bool:
+        return self.role in (READ, BOTH)
+
+    @property
+    def can_write(self) -> bool:
+        return self.role in (WRITE, BOTH)
+
+    @property
+    def ejected(self) -> bool:
+        """熔断打开即视为摘除；恢复时间到后进入半开，由探测请求决定是否重新接纳"""
+        return self.breaker.state == CircuitBreaker.OPEN
+
+    def stats(self) -> dict:
+        return {
+            "role": self.role,
+            "state": self.breaker.state,
+            "ejected": self.ejected,
+            "ewma_ms": round(self.ewma * 1000, 1) if self.ewma is not None else None,
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+
+def parse_backends(
+    base_url: str,
+    auth_code: str,
+    entries: Iterable[str] | None,
+    breaker_factory: Callable[[str, bool], CircuitBreaker],
+) -> list[Backend]:
+    """主图床（base_url，读写）加上 "地址|角色|认证码" 形式的镜像配置，角色与认证码可省略。
+
+    breaker_factory 接收 (实例名, 是否为主图床)，返回该实例使用的熔断器。
+    """
+    backends: list[Backend] = []
+    seen: set[str] = set()
+    candidates = [f"{base_url}|{BOTH}"] if base_url else []
+    candidates.extend(e for e in entries or () if isinstance(e, str))
+    for entry in candidates:
+        parts = [p.strip() for p in entry.split("|")]
+        url = parts[0].rstrip("/")
+        if not url or url in seen:
+            continue
+        seen.add(url)
+        role = parts[1].lower() if len(parts) > 1 and parts[1] else BOTH
+        code = parts[2] if len(parts) > 2 and parts[2] else auth_code
+        name = url.split("://", 1)[-1]
+        backends.append(Backend(name, url, role, code, breaker_factory(name, not backends and bool(base_url))))
+    return backends
+
+
+class BackendRouter:
+    """多图床实例的选路：读请求按延迟 EWMA 选择最快的健康实例，写请求按配置顺序故障转移。
+
+    每个实例的熔断器兼作健康检查，连续失败后摘除，恢复时间到后放行探测请求重新接纳；
+    以 explore 的概率随机选择其他健康实例，使长期未被选中的实例的 EWMA 保持更新。
+    """
+
+    def __init__(self, backends: list[Backend], alpha: float = 0.3, explore: float = 0.05):
+        self.backends = backends
+        self.alpha = min(1.0, max(0.01, float(alpha)))
+        self.explore = min(1.0, max(0.0, float(explore)))
+
+    @property
+    def primary(self) -> Backend | None:
+        return self.backends[0] if self.backends else None
+
+    def get(self, base_url: str | None) -> Backend | None:
+        """按地址查找实例；地址为空（如旧版清单）时视为主图床，已从配置中移除的返回 None"""
+        if not base_url:
+            return self.primary
+        base_url = base_url.rstrip("/")
+        return next((b for b in self.backends if b.base_url == base_url), None)
+
+    def read_order(self) -> list[Backend]:
+        """读请求的尝试顺序：健康实例按 EWMA 升序，已摘除的排在最后"""
+        readers = [b for b in self.backends if b.can_read]
+        healthy = sorted((b for b in readers if not b.ejected), key=lambda b: b.ewma or 0.0)
+        if len(healthy) > 1 and random.random() < self.explore:
+            pick = random.randrange(1, len(healthy))
+            healthy[0], healthy[pick] = healthy[pick], healthy[0]
+        return healthy + [b for b in readers if b.ejected]
+
+    def pick_read(self) -> Backend | None:
+        order = self.read_order()
+        return order[0] if order else self.primary
+
+    def write_order(self) -> list[Backend]:
+        """写请求的尝试顺序：按配置顺序，已摘除的排在最后"""
+        writers = [b for b in self.backends if b.can_write]
+        return [b for b in writers if not b.ejected] + [b for b in writers if b.ejected]
+
+    def record(self, backend: Backend, elapsed: float | None, ok: bool):
+        """记录一次请求结果；elapsed 为 None 时（如上传，耗时取决于文件大小）不计入 EWMA"""
+        backend.requests += 1
+        if not ok:
+            backend.failures += 1
+            return
+        if elapsed is None:
+            return
+        if backend.ewma is None:
+            backend.ewma = elapsed
+        else:
+            backend.ewma += self.alpha * (elapsed - backend.ewma)
+
+    def stats(self) -> dict:
+        return {b.name: b.stats() for b in self.backends}
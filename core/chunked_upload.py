@@ -0,0 +1,265 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import time
+from typing import AsyncIterator, Awaitable, Callable
+
+from astrbot import logger
+
+from .resilience import (
+    CircuitBreaker,
+    HttpStatusError,
+    RetryPolicy,
+    is_idempotent_retryable,
+    is_upload_retryable,
+    retry_call,
+)
+from .streaming import MediaStream
+
+# (上传地址, 查询参数, 表单字段, 分块数据或 None, 文件名) -> 响应文本；非 200 时抛出 HttpStatusError
+ChunkPoster = Callable[[str, dict[str, str], dict[str, str], bytes | None, str], Awaitable[str]]
+
+
+class ChunkedUploadError(RuntimeError):
+    """分块上传流程异常（初始化响应无效、数据长度与声明不符等）"""
+
+
+class ChunkedUploader:
+    """大文件分块上传，沿用 CloudFlare-ImgBed 的 初始化 -> 并行上传分块 -> 合并 流程。
+
+    每个分块独立重试；已完成的分块记录在 state_dir 下的续传清单中，
+    上传中断（包括插件重载）后再次上传同一文件时只补传缺失的分块。
+    续传清单以 调用方给出的 resume_key + 大小 + 分块大小 区分，超过 resume_ttl 后视为失效。
+    """
+
+    def __init__(
+        self,
+        state_dir: str,
+        poster: ChunkPoster,
+        retry_policy: RetryPolicy,
+        breaker: CircuitBreaker | None = None,
+        threshold: int = 50 * 1024 * 1024,
+        chunk_size: int = 8 * 1024 * 1024,
+        parallel: int = 3,
+        resume_ttl: float = 3600,
+    ):
+        self.state_dir = state_dir
+        self._poster = poster
+        self._retry_policy = retry_policy
+        self._breaker = breaker
+        self.threshold = max(1, int(threshold))
+        self.chunk_size = max(1024 * 1024, int(chunk_size))
+        self.parallel = max(1, int(parallel))
+        self.resume_ttl = max(0.0, float(resume_ttl))
+        self._uploads = 0
+        self._chunks_sent = 0
+        self._chunks_resumed = 0
+        self._chunk_failures = 0
+        self._pruned = False
+        os.makedirs(state_dir, exist_ok=True)
+
+    def should_chunk(self, size: int | None) -> bool:
+        return size is not None and size >= self.threshold
+
+    async def upload(
+        self,
+        data: bytes | MediaStream,
+        filename: str,
+        content_type: str,
+        url: str,
+        params: dict[str, str],
+        resume_key: str,
+        breaker: CircuitBreaker | None = None,
+    ) -> str:
+        """分块上传到 url 并返回合并接口的响应文本。
+
+        params 为每个请求共用的查询参数（认证码、目标文件夹等）；breaker 为目标实例的熔断器，
+        未指定时使用构造时的熔断器。续传清单按 url 区分，不同实例的上传会话互不复用。
+        """
+        breaker = breaker or self._breaker
+
+        async def post(fields: dict[str, str], chunk: bytes | None) -> str:
+            return await self._post(url, params, fields, chunk, filename, breaker)
+
+        size = len(data) if isinstance(data, bytes) else data.size
+        if size is None:
+            raise ChunkedUploadError("分块上传需要已知文件大小")
+        total = max(1, math.ceil(size / self.chunk_size))
+        key = hashlib.sha1(f"{url}\0{resume_key}\0{size}\0{self.chunk_size}".encode("utf-8")).hexdigest()[:24]
+        file_fields = {
+            "originalFileName": filename,
+            "originalFileType": content_type,
+            "totalChunks": str(total),
+        }
+
+        if not self._pruned:
+            self._pruned = True
+            await asyncio.to_thread(self.prune)
+        state = await asyncio.to_thread(self._load_state, key, total)
+        if state is None:
+            text = await post({"initChunked": "true", **file_fields}, None)
+            try:
+                upload_id = json.loads(text).get("uploadId")
+            except (ValueError, AttributeError):
+                upload_id = None
+            if not upload_id:
+                raise ChunkedUploadError(f"分块上传初始化响应无效: {text[:200]}")
+            state = {"upload_id": str(upload_id), "total": total, "done": [], "created_at": time.time()}
+            await asyncio.to_thread(self._save_state, key, state)
+        else:
+            logger.info(f"继续未完成的分块上传: filename={filename}, 已完成 {len(state['done'])}/{total}")
+            self._chunks_resumed += len(state["done"])
+
+        self._uploads += 1
+        upload_id = state["upload_id"]
+        done = set(state["done"])
+        save_lock = asyncio.Lock()
+
+        async def send(index: int, chunk: bytes):
+            await post({"chunked": "true", "uploadId": upload_id, "chunkIndex": str(index), **file_fields}, chunk)
+            self._chunks_sent += 1
+            async with save_lock:
+                done.add(index)
+                state["done"] = sorted(done)
+                await asyncio.to_thread(self._save_state, key, state)
+
+        # 读取下一块前先占用并发名额，内存中最多同时保留 parallel 个分块
+        slots = asyncio.Semaphore(self.parallel)
+        tasks: list[asyncio.Task] = []
+
+        async def run(index: int, chunk: bytes):
+            try:
+                await send(index, chunk)
+            finally:
+                slots.release()
+
+        try:
+            async for index, chunk in self._iter_chunks(data, size):
+                if index in done:
+                    continue
+                await slots.acquire()
+                failed = next((t for t in tasks if t.done() and t.exception() is not None), None)
+                if failed is not None:
+                    slots.release()
+                    raise failed.exception()
+                tasks.append(asyncio.create_task(run(index, chunk)))
+            if tasks:
+                await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        try:
+            text = await post({"chunked": "true", "merge": "true", "uploadId": upload_id, **file_fields}, None)
+        except HttpStatusError as e:
+            if e.status < 500:
+                # 上传会话已失效或分块不完整，丢弃续传清单，下次从头上传
+                await asyncio.to_thread(self._remove_state, key)
+            raise
+        await asyncio.to_thread(self._remove_state, key)
+        return text
+
+    async def _post(
+        self,
+        url: str,
+        params: dict[str, str],
+        fields: dict[str, str],
+        chunk: bytes | None,
+        filename: str,
+        breaker: CircuitBreaker | None,
+    ) -> str:
+        # 分块按序号覆盖写入，可按幂等请求重试；初始化与合并不是幂等的，超时或 500 后服务端可能已生效，
+        # 只在请求确定未被处理（连接失败、网关错误）时重试，避免重复创建会话或合并出重复文件
+        retryable = is_idempotent_retryable if chunk is not None else is_upload_retryable
+        try:
+            return await retry_call(
+                lambda: self._poster(url, params, fields, chunk, filename),
+                self._retry_policy,
+                retryable,
+                breaker,
+            )
+        except Exception:
+            if chunk is not None:
+                self._chunk_failures += 1
+            raise
+
+    async def _iter_chunks(self, data: bytes | MediaStream, size: int) -> AsyncIterator[tuple[int, bytes]]:
+        if isinstance(data, bytes):
+            view = memoryview(data)
+            for index, offset in enumerate(range(0, size, self.chunk_size)):
+                yield index, bytes(view[offset:offset + self.chunk_size])
+            return
+
+        buffer = bytearray()
+        index = 0
+        received = 0
+        async for piece in data.iter_chunks():
+            buffer += piece
+            received += len(piece)
+            while len(buffer) >= self.chunk_size:
+                yield index, bytes(buffer[:self.chunk_size])
+                del buffer[:self.chunk_size]
+                index += 1
+        if buffer:
+            yield index, bytes(buffer)
+        if received != size:
+            raise ChunkedUploadError(f"数据长度与声明不符: {received} != {size}")
+
+    # ---------- 续传清单 ----------
+
+    def _state_path(self, key: str) -> str:
+        return os.path.join(self.state_dir, f"{key}.json")
+
+    def _load_state(self, key: str, total: int) -> dict | None:
+        path = self._state_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except Exception:
+            return None
+        expired = self.resume_ttl and time.time() - state.get("created_at", 0) > self.resume_ttl
+        if expired or state.get("total") != total or not state.get("upload_id"):
+            self._remove_state(key)
+            return None
+        return state
+
+    def _save_state(self, key: str, state: dict):
+        path = self._state_path(key)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    def _remove_state(self, key: str):
+        try:
+            os.remove(self._state_path(key))
+        except OSError:
+            pass
+
+    def prune(self):
+        """删除过期的续传清单"""
+        if not self.resume_ttl:
+            return
+        now = time.time()
+        for name in os.listdir(self.state_dir):
+            path = os.path.join(self.state_dir, name)
+            try:
+                if now - os.path.getmtime(path) > self.resume_ttl:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "uploads": self._uploads,
+            "chunks_sent": self._chunks_sent,
+            "chunks_resumed": self._chunks_resumed,
+            "chunk_failures": self._chunk_failures,
+        }
@@ -0,0 +1,66 @@
+import asyncio
+import time
+from typing import Awaitable, TypeVar
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """命令整体截止时间或某一阶段预算耗尽"""
+
+    def __init__(self, phase: str | None = None):
+        self.phase = phase
+        super().__init__(f"{phase} 阶段超时" if phase else "操作超时")
+
+
+class Deadline:
+    """单条命令的整体截止时间，并为各阶段（get_msg、下载、上传等）提供独立预算。
+
+    每一步实际可用的时间取 阶段预算 与 剩余总时间 的较小值。
+    """
+
+    def __init__(self, total: float | None = None, phases: dict[str, float] | None = None):
+        self.total = total if total and total > 0 else None
+        self._expires_at = time.monotonic() + self.total if self.total else None
+        self.phases = {k: float(v) for k, v in (phases or {}).items() if v and v > 0}
+
+    @classmethod
+    def unbounded(cls) -> "Deadline":
+        return cls(None)
+
+    def remaining(self) -> float | None:
+        if self._expires_at is None:
+            return None
+        return max(0.0, self._expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def budget(self, phase: str | None = None) -> float | None:
+        remaining = self.remaining()
+        limit = self.phases.get(phase) if phase else None
+        if remaining is None:
+            return limit
+        if limit is None:
+            return remaining
+        return min(remaining, limit)
+
+    async def run(self, aw: Awaitable[T], phase: str | None = None) -> T:
+        """在预算内等待 aw 完成，超时则取消并抛出 DeadlineExceeded"""
+        budget = self.budget(phase)
+        if budget is None:
+            return await aw
+        if budget <= 0:
+            if asyncio.iscoroutine(aw):
+                aw.close()
+            raise DeadlineExceeded(phase)
+        start = time.monotonic()
+        try:
+            return await asyncio.wait_for(aw, budget)
+        except asyncio.TimeoutError:
+            # 仅当确实等满预算时视为本层超时，内部自身抛出的超时原样向上传递
+            if time.monotonic() - start >= budget:
+                raise DeadlineExceeded(phase) from None
+            raise
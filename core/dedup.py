@@ -0,0 +1,180 @@
+import asyncio
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+from astrbot import logger
+
+
+def new_hasher():
+    """创建内容哈希器，支持对分块数据增量 update"""
+    return hashlib.blake2b(digest_size=16)
+
+
+def content_digest(data: bytes) -> str:
+    hasher = new_hasher()
+    hasher.update(data)
+    return hasher.hexdigest()
+
+
+class SingleFlight:
+    """合并相同键的并发调用：同一时刻只执行一次，其余调用方等待同一结果"""
+
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(factory())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield 避免某个等待方被取消时连带取消其他等待方共享的任务
+        return await asyncio.shield(future)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+
+class UploadDedupIndex:
+    """内容哈希 + 文件夹 -> 图床链接 的持久化 LRU 索引。
+
+    索引在首次使用时懒加载，修改后延迟合并写盘。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 20000,
+        flush_delay: float = 5,
+        writer: Callable[[str, Any], Awaitable[None]] | None = None,
+    ):
+        self.path = path
+        self.max_entries = max(1, int(max_entries))
+        self.flush_delay = max(0.0, float(flush_delay))
+        self._writer = writer
+        self._entries: OrderedDict[str, str] = OrderedDict()
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+        self._flush_task: asyncio.Task | None = None
+        self._flush_lock = asyncio.Lock()
+        self._flushing = False
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.flight = SingleFlight()
+
+    @staticmethod
+    def _key(digest: str, folder: str) -> str:
+        return f"{folder}\0{digest}"
+
+    async def ensure_loaded(self):
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if self._loaded:
+                return
+            entries = await asyncio.to_thread(self._read)
+            # 加载期间可能已有新记录，保留较新的
+            entries.update(self._entries)
+            self._entries = entries
+            self._loaded = True
+            self._evict()
+
+    def _read(self) -> OrderedDict:
+        if not os.path.exists(self.path):
+            return OrderedDict()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                return OrderedDict((k, v) for k, v in data.items() if isinstance(v, str))
+        except Exception as e:
+            logger.warning(f"加载上传去重索引失败: {e}")
+        return OrderedDict()
+
+    async def lookup(self, digest: str, folder: str) -> str | None:
+        await self.ensure_loaded()
+        key = self._key(digest, folder)
+        url = self._entries.get(key)
+        if url is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return url
+
+    def record(self, digest: str, folder: str, url: str):
+        key = self._key(digest, folder)
+        self._entries[key] = url
+        self._entries.move_to_end(key)
+        self._evict()
+        self._mark_dirty()
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _mark_dirty(self):
+        self._dirty = True
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(self.flush_delay)
+        self._flushing = True
+        try:
+            await self.flush()
+        finally:
+            self._flushing = False
+
+    async def flush(self):
+        # 串行写盘，避免两次写入同时使用同一个临时文件
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            # 首次加载前记录的条目需与磁盘上的索引合并后再写入，否则会覆盖已有索引
+            await self.ensure_loaded()
+            self._dirty = False
+            snapshot = dict(self._entries)
+            try:
+                if self._writer is not None:
+                    await self._writer(self.path, snapshot)
+                else:
+                    await asyncio.to_thread(self._write, snapshot)
+            except Exception as e:
+                self._dirty = True
+                logger.error(f"保存上传去重索引失败: {e}")
+
+    def _write(self, snapshot: dict):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "inflight": len(self.flight),
+        }
+
+    async def close(self):
+        task = self._flush_task
+        if task and not task.done():
+            if self._flushing:
+                # 正在写盘时等待其完成，取消无法中止已在线程中执行的写入
+                await asyncio.gather(task, return_exceptions=True)
+            else:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        await self.flush()
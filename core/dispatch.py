@@ -0,0 +1,113 @@
+from typing import Iterable
+
+_VALID_TYPES = ("image", "video")
+
+
+def normalize_content_type(content_type: str | None) -> str:
+    """规范化内容类型：去空白、小写、去重，并按 image,video 的固定顺序排列"""
+    if not content_type:
+        return "image,video"
+    types = {t.strip().lower() for t in content_type.replace("，", ",").split(",")}
+    ordered = [t for t in _VALID_TYPES if t in types]
+    return ",".join(ordered) or "image,video"
+
+
+def split_folders(folder_name_raw: str) -> tuple[str, ...]:
+    return tuple(f.strip() for f in folder_name_raw.replace("，", ",").split(",") if f.strip())
+
+
+class KeywordRoute:
+    """预编译的关键词指令目标"""
+
+    __slots__ = ("keyword", "folders", "content_type")
+
+    def __init__(self, keyword: str, folders: tuple[str, ...], content_type: str):
+        self.keyword = keyword
+        self.folders = folders
+        self.content_type = content_type
+
+
+class KeywordDispatchIndex:
+    """动态关键词指令的预编译分发索引。
+
+    仅在映射变更时重建；匹配时先用首字符集合与长度范围快速拒绝，
+    再做一次字典查找，文件夹列表与内容类型均已预先拆分规范化。
+    """
+
+    def __init__(
+        self,
+        mappings: dict,
+        case_fold: bool = False,
+        aliases: dict[str, str] | None = None,
+        prefix: str = "/",
+    ):
+        self.case_fold = case_fold
+        self.prefix = prefix
+        self._routes: dict[str, KeywordRoute] = {}
+
+        for keyword, mapping in mappings.items():
+            if isinstance(mapping, dict):
+                folder_name_raw = mapping.get("folder", "")
+                content_type = mapping.get("content_type", "image,video")
+            else:
+                folder_name_raw = mapping
+                content_type = "image,video"
+            folders = split_folders(folder_name_raw or "")
+            if not folders:
+                continue
+            self._routes[self._fold(keyword)] = KeywordRoute(keyword, folders, normalize_content_type(content_type))
+
+        for alias, target in (aliases or {}).items():
+            route = self._routes.get(self._fold(target))
+            alias_key = self._fold(alias)
+            # 别名不覆盖已有的同名关键词
+            if route is not None and alias_key not in self._routes:
+                self._routes[alias_key] = route
+
+        self._first_chars = frozenset(k[0] for k in self._routes)
+        lengths = [len(k) for k in self._routes]
+        self._min_len = min(lengths, default=0)
+        self._max_len = max(lengths, default=0)
+
+    def _fold(self, text: str) -> str:
+        return text.casefold() if self.case_fold else text
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    def quick_reject(self, raw_text: str | None) -> bool:
+        """在遍历消息段之前，基于原始文本做常数时间的快速拒绝"""
+        if not self._routes:
+            return True
+        if not isinstance(raw_text, str):
+            return False
+        prefix = self.prefix
+        if raw_text.startswith(prefix):
+            head = raw_text[len(prefix):len(prefix) + 1]
+            return not head or self._fold(head) not in self._first_chars
+        # 原始文本可能带前导空白或混有其他消息段的文本，此时仅在完全不含前缀时拒绝
+        return prefix not in raw_text
+
+    def match(self, text: str) -> KeywordRoute | None:
+        """匹配已去除首尾空白的指令文本，如 "/二次元" """
+        prefix_len = len(self.prefix)
+        if len(text) <= prefix_len or not text.startswith(self.prefix):
+            return None
+        keyword = self._fold(text[prefix_len:])
+        if len(keyword) < self._min_len or len(keyword) > self._max_len:
+            return None
+        if keyword[0] not in self._first_chars:
+            return None
+        return self._routes.get(keyword)
+
+
+def parse_aliases(entries: Iterable[str] | None) -> dict[str, str]:
+    """解析 "别名=关键词" 形式的配置项"""
+    aliases: dict[str, str] = {}
+    for entry in entries or ():
+        if not isinstance(entry, str) or "=" not in entry:
+            continue
+        alias, target = entry.split("=", 1)
+        if alias.strip() and target.strip():
+            aliases[alias.strip()] = target.strip()
+    return aliases
@@ -0,0 +1,100 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Iterable
+
+from .dedup import SingleFlight
+
+
+class FileUrlResolver:
+    """file_id -> 下载链接 的解析层：TTL 缓存 + 并发合并 + 协议端调用并发上限。
+
+    缓存只保存解析成功的链接；同一 file_id 的并发解析只会调用一次协议端，
+    所有解析共享一个并发上限，避免批量上传时瞬间向适配器发起大量 get_file。
+    """
+
+    def __init__(self, ttl: float = 300, max_entries: int = 5000, concurrency: int = 4):
+        self.ttl = max(0.0, float(ttl))
+        self.max_entries = max(1, int(max_entries))
+        self.concurrency = max(1, int(concurrency))
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._flight = SingleFlight()
+        self._limit: asyncio.Semaphore | None = None
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._failures = 0
+
+    def peek(self, file_id: str) -> str | None:
+        """返回未过期的缓存链接，不触发解析"""
+        entry = self._entries.get(file_id)
+        if entry is None:
+            return None
+        url, expires_at = entry
+        if self.ttl and time.monotonic() >= expires_at:
+            del self._entries[file_id]
+            return None
+        self._entries.move_to_end(file_id)
+        return url
+
+    async def resolve(self, file_id: str, fetch: Callable[[], Awaitable[str | None]]) -> str | None:
+        """解析 file_id，fetch 为实际调用协议端的函数，返回链接或 None"""
+        url = self.peek(file_id)
+        if url is not None:
+            self._hits += 1
+            return url
+        if file_id in self._flight:
+            self._coalesced += 1
+        else:
+            self._misses += 1
+
+        async def load() -> str | None:
+            if self._limit is None:
+                self._limit = asyncio.Semaphore(self.concurrency)
+            try:
+                async with self._limit:
+                    url = await fetch()
+            except Exception:
+                self._failures += 1
+                raise
+            if url:
+                self._store(file_id, url)
+            else:
+                self._failures += 1
+            return url
+
+        return await self._flight.do(file_id, load)
+
+    def prefetch(self, file_ids: Iterable[str], fetch_for: Callable[[str], Callable[[], Awaitable[str | None]]]) -> list[asyncio.Task]:
+        """在后台提前解析一批 file_id，失败会被忽略；返回的任务可在不再需要时取消"""
+        tasks = []
+        for file_id in dict.fromkeys(file_ids):
+            if self.peek(file_id) is not None:
+                continue
+            tasks.append(asyncio.ensure_future(self._prefetch_one(file_id, fetch_for(file_id))))
+        return tasks
+
+    async def _prefetch_one(self, file_id: str, fetch: Callable[[], Awaitable[str | None]]):
+        try:
+            await self.resolve(file_id, fetch)
+        except Exception:
+            pass
+
+    def invalidate(self, file_id: str):
+        self._entries.pop(file_id, None)
+
+    def _store(self, file_id: str, url: str):
+        self._entries[file_id] = (url, time.monotonic() + self.ttl)
+        self._entries.move_to_end(file_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "inflight": len(self._flight),
+            "hits": self._hits,
+            "misses": self._misses,
+            "coalesced": self._coalesced,
+            "failures": self._failures,
+        }
@@ -0,0 +1,104 @@
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable
+
+from .dedup import SingleFlight
+
+
+class _TtlLru:
+    """带过期时间的 LRU 映射，可按条目权重限制总量"""
+
+    def __init__(self, ttl: float, max_entries: int, max_weight: int = 0):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_weight = max_weight
+        self.weight = 0
+        # key -> (value, 过期时间, 权重)
+        self._entries: OrderedDict[Hashable, tuple[object, float, int]] = OrderedDict()
+
+    def get(self, key: Hashable) -> tuple[bool, object]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        value, expires_at, weight = entry
+        if self.ttl and time.monotonic() >= expires_at:
+            del self._entries[key]
+            self.weight -= weight
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def put(self, key: Hashable, value: object, weight: int = 1):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.weight -= old[2]
+        self._entries[key] = (value, time.monotonic() + self.ttl, weight)
+        self.weight += weight
+        while self._entries and (
+            len(self._entries) > self.max_entries or (self.max_weight and self.weight > self.max_weight)
+        ):
+            _, (_, _, evicted) = self._entries.popitem(last=False)
+            self.weight -= evicted
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class ForwardRefCache:
+    """合并转发解析结果缓存：被回复消息 ID -> 合并转发 ID，合并转发 ID -> 媒体列表。
+
+    分段上传同一合并转发（/上传 f 1-20、/上传 f 21-40 ...）时，后续指令无需再调用
+    get_msg 与 get_forward_msg；相同键的并发解析只执行一次。
+    媒体列表按条目数与媒体总数双重限制，超出后淘汰最久未使用的合并转发。
+    """
+
+    def __init__(self, ttl: float = 600, max_entries: int = 64, max_refs: int = 20000):
+        ttl = max(0.0, float(ttl))
+        max_entries = max(1, int(max_entries))
+        self._replies = _TtlLru(ttl, max_entries * 8)
+        self._refs = _TtlLru(ttl, max_entries, max(1, int(max_refs)))
+        self._flight = SingleFlight()
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+
+    async def forward_of_reply(
+        self,
+        reply_id: str,
+        lookup: Callable[[], Awaitable[tuple[str | None, bool]]],
+    ) -> tuple[str | None, bool]:
+        """被回复消息中的 (合并转发 ID, 是否为 JSON 合并记录)，lookup 抛出异常时不缓存"""
+        return await self._cached(self._replies, ("reply", str(reply_id)), lookup, lambda _: 1)
+
+    async def media_refs(self, forward_id: str, fetch: Callable[[], Awaitable[list[dict]]]) -> list[dict]:
+        """合并转发中的媒体列表；空列表（可能是拉取失败）不缓存"""
+        refs = await self._cached(self._refs, ("forward", str(forward_id)), fetch, len)
+        return list(refs)
+
+    async def _cached(self, store: _TtlLru, key: tuple, load: Callable[[], Awaitable], weight: Callable[[object], int]):
+        found, value = store.get(key)
+        if found:
+            self._hits += 1
+            return value
+        if key in self._flight:
+            self._coalesced += 1
+        else:
+            self._misses += 1
+
+        async def run():
+            value = await load()
+            if value:
+                store.put(key, tuple(value) if isinstance(value, list) else value, weight(value))
+            return value
+
+        return await self._flight.do(key, run)
+
+    def stats(self) -> dict:
+        return {
+            "replies": len(self._replies),
+            "forwards": len(self._refs),
+            "refs": self._refs.weight,
+            "hits": self._hits,
+            "misses": self._misses,
+            "coalesced": self._coalesced,
+        }
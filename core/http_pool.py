@@ -0,0 +1,122 @@
+import asyncio
+import ssl
+import time
+from typing import Callable
+
+import aiohttp
+
+from astrbot import logger
+
+
+class HttpSessionPool:
+    """插件共享的 aiohttp 会话池。
+
+    按用途区分多个连接池（图床 / QQ·NapCat 媒体 CDN），每个池懒创建一个
+    长连接复用的 ClientSession，并通过 TraceConfig 统计连接复用与新建次数。
+    on_response 为可选的回调 (池名称, 主机, 是否新建连接, 到收到响应头的秒数)，用于区分冷/热连接的延迟。
+    SSL 校验在创建连接器时按池确定，请求时不再单独指定，避免同一主机的连接按 ssl 参数分裂成多组。
+    """
+
+    IMGBED = "imgbed"
+    CDN = "cdn"
+
+    def __init__(
+        self,
+        limit: int = 64,
+        limit_per_host: int = 8,
+        dns_cache_ttl: int = 300,
+        keepalive_timeout: float = 60,
+        on_response: Callable[[str, str, bool, float], None] | None = None,
+        imgbed_verify_ssl: bool = False,
+    ):
+        self.limit = max(0, int(limit))
+        self.limit_per_host = max(0, int(limit_per_host))
+        self.dns_cache_ttl = max(0, int(dns_cache_ttl))
+        self.keepalive_timeout = float(keepalive_timeout)
+
+        self._sessions: dict[str, aiohttp.ClientSession] = {}
+        self._lock = asyncio.Lock()
+        # 同一个 SSLContext 在连接器内共享，配合长连接减少 TLS 握手
+        self._ssl_context = ssl.create_default_context()
+        self._counters: dict[str, dict[str, int]] = {}
+        self._on_response = on_response
+        self._verify_ssl = {self.IMGBED: bool(imgbed_verify_ssl)}
+
+    def _new_counters(self) -> dict[str, int]:
+        return {"requests": 0, "new_connections": 0, "reused_connections": 0}
+
+    def _build_trace_config(self, name: str) -> aiohttp.TraceConfig:
+        counters = self._counters.setdefault(name, self._new_counters())
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(session, ctx, params):
+            counters["requests"] += 1
+            ctx.start = time.perf_counter()
+            ctx.cold = False
+
+        async def on_connection_create_end(session, ctx, params):
+            counters["new_connections"] += 1
+            ctx.cold = True
+
+        async def on_request_end(session, ctx, params):
+            if self._on_response is not None and hasattr(ctx, "start"):
+                self._on_response(name, params.url.host or "", ctx.cold, time.perf_counter() - ctx.start)
+
+        async def on_connection_reuseconn(session, ctx, params):
+            counters["reused_connections"] += 1
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace_config.on_request_end.append(on_request_end)
+        return trace_config
+
+    def _create_session(self, name: str) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=self.dns_cache_ttl or None,
+            use_dns_cache=self.dns_cache_ttl > 0,
+            keepalive_timeout=self.keepalive_timeout,
+            ssl=self._ssl_context if self._verify_ssl.get(name, True) else False,
+        )
+        logger.debug(
+            f"创建连接池: name={name}, limit={self.limit}, limit_per_host={self.limit_per_host}, dns_cache_ttl={self.dns_cache_ttl}"
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            trace_configs=[self._build_trace_config(name)],
+        )
+
+    async def get(self, name: str) -> aiohttp.ClientSession:
+        """获取指定用途的会话，不存在或已关闭时懒创建"""
+        session = self._sessions.get(name)
+        if session is not None and not session.closed:
+            return session
+        async with self._lock:
+            session = self._sessions.get(name)
+            if session is None or session.closed:
+                session = self._create_session(name)
+                self._sessions[name] = session
+            return session
+
+    async def imgbed(self) -> aiohttp.ClientSession:
+        return await self.get(self.IMGBED)
+
+    async def cdn(self) -> aiohttp.ClientSession:
+        return await self.get(self.CDN)
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """返回各连接池的请求数、新建连接数与复用连接数"""
+        return {name: dict(counters) for name, counters in self._counters.items()}
+
+    async def close(self):
+        async with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            if not session.closed:
+                await session.close()
+        # 给底层 SSL 传输留出关闭时间，避免 "Unclosed connection" 警告
+        if sessions:
+            await asyncio.sleep(0.25)
@@ -0,0 +1,167 @@
+import asyncio
+import json
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from astrbot import logger
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS keyword_mappings (
+    keyword TEXT PRIMARY KEY,
+    folder TEXT NOT NULL,
+    content_type TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def normalize_mapping(value) -> dict | None:
+    """兼容旧版字符串格式，统一为 {"folder", "content_type"}"""
+    if isinstance(value, str):
+        return {"folder": value, "content_type": "image,video"}
+    if isinstance(value, dict) and isinstance(value.get("folder"), str):
+        return {"folder": value["folder"], "content_type": value.get("content_type") or "image,video"}
+    return None
+
+
+class KeywordMappingStore:
+    """关键词映射的 SQLite（WAL 模式）存储。
+
+    所有数据库操作在单独的单线程执行器中串行完成，不阻塞事件循环；
+    修改先记入待写集合，延迟 flush_delay 秒后在一个事务内批量提交。
+    首次加载时自动迁移旧版 keyword_mappings.json（迁移后保留 .migrated 备份，无法解析时改名为 .corrupt）。
+    """
+
+    def __init__(self, db_path: str, legacy_json_path: str | None = None, flush_delay: float = 1.0):
+        self.db_path = db_path
+        self.legacy_json_path = legacy_json_path
+        self.flush_delay = max(0.0, float(flush_delay))
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cloudimg-kvstore")
+        self._conn: sqlite3.Connection | None = None
+        # keyword -> mapping，None 表示删除
+        self._pending: dict[str, dict | None] = {}
+        self._flush_task: asyncio.Task | None = None
+        self._flush_lock = asyncio.Lock()
+        self.migrated = 0
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _load_sync(self) -> dict[str, dict]:
+        conn = self._connect()
+        migrated = conn.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+        if not migrated and self.legacy_json_path and os.path.exists(self.legacy_json_path):
+            try:
+                self._migrate_json_sync(conn)
+            except Exception as e:
+                # 迁移失败不影响读取已有映射，下次加载时重试
+                logger.error(f"迁移旧版关键词映射失败: {e}")
+        rows = conn.execute("SELECT keyword, folder, content_type FROM keyword_mappings").fetchall()
+        return {keyword: {"folder": folder, "content_type": content_type} for keyword, folder, content_type in rows}
+
+    def _migrate_json_sync(self, conn: sqlite3.Connection):
+        try:
+            with open(self.legacy_json_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except ValueError as e:
+            # JSON 或编码错误：保留原文件供手动恢复，并标记已迁移，避免每次启动重复失败
+            corrupt_path = f"{self.legacy_json_path}.corrupt"
+            logger.error(f"旧版关键词映射文件无法解析，已跳过迁移并改名为 {os.path.basename(corrupt_path)}: {e}")
+            os.replace(self.legacy_json_path, corrupt_path)
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', '1')")
+            return
+        rows = []
+        for keyword, value in (data.items() if isinstance(data, dict) else ()):
+            mapping = normalize_mapping(value)
+            if mapping is not None:
+                rows.append((keyword, mapping["folder"], mapping["content_type"]))
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO keyword_mappings (keyword, folder, content_type) VALUES (?, ?, ?)",
+                rows,
+            )
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', '1')")
+        os.replace(self.legacy_json_path, f"{self.legacy_json_path}.migrated")
+        self.migrated = len(rows)
+
+    async def load(self) -> dict[str, dict]:
+        return await self._run(self._load_sync)
+
+    def put(self, keyword: str, mapping: dict):
+        normalized = normalize_mapping(mapping)
+        if normalized is None:
+            return
+        self._pending[keyword] = normalized
+        self._schedule_flush()
+
+    def delete(self, keyword: str):
+        self._pending[keyword] = None
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(self.flush_delay)
+        try:
+            await self.flush()
+        except Exception as e:
+            # 后台任务的异常无人等待，在此记录；失败的修改已放回待写集合，下次修改或关闭时重试
+            logger.error(f"保存关键词映射失败: {e}")
+
+    def _apply_sync(self, pending: dict[str, dict | None]):
+        conn = self._connect()
+        upserts = [(k, v["folder"], v["content_type"]) for k, v in pending.items() if v is not None]
+        deletes = [(k,) for k, v in pending.items() if v is None]
+        # 单个事务内提交，崩溃时要么全部生效要么全部不生效
+        with conn:
+            if upserts:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO keyword_mappings (keyword, folder, content_type) VALUES (?, ?, ?)",
+                    upserts,
+                )
+            if deletes:
+                conn.executemany("DELETE FROM keyword_mappings WHERE keyword = ?", deletes)
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            try:
+                await self._run(self._apply_sync, pending)
+            except BaseException:
+                # 写入失败时放回待写集合，较新的修改优先
+                pending.update(self._pending)
+                self._pending = pending
+                raise
+
+    def _close_sync(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def close(self):
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+        try:
+            await self.flush()
+        finally:
+            await self._run(self._close_sync)
+            self._executor.shutdown(wait=False)
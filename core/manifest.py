@@ -0,0 +1,266 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from typing import Awaitable, Callable
+
+from astrbot import logger
+
+VIDEO_EXTS = frozenset(('.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.webm', '.m4v', '.3gp'))
+
+# (名称, MIME 类型或 None, 修改时间)
+ListedFile = tuple[str, str | None, float]
+# 返回 (文件列表, 新 ETag, 提供列表的图床地址)；文件列表为 None 表示未修改
+FolderLister = Callable[[str, str | None], Awaitable[tuple[list[ListedFile] | None, str | None, str | None]]]
+
+
+def classify_media_kind(name: str, mime: str | None = None) -> str:
+    """按 MIME 类型或扩展名判断媒体类型，返回 "image" 或 "video" """
+    if isinstance(mime, str) and mime:
+        if mime.startswith("video/"):
+            return "video"
+        if mime.startswith("image/"):
+            return "image"
+    return "video" if os.path.splitext(name)[1].lower() in VIDEO_EXTS else "image"
+
+
+class FolderManifest:
+    """单个文件夹的文件清单，按媒体类型分桶以支持 O(1) 随机抽样与增量增删"""
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.etag: str | None = None
+        # 提供清单的图床地址，抽样得到的文件从该实例获取；旧版清单没有此字段
+        self.source: str | None = None
+        self.fetched_at = 0.0
+        self.stale = True
+        # name -> (kind, mtime)
+        self.entries: dict[str, tuple[str, float]] = {}
+        self._buckets: dict[str, list[str]] = {"image": [], "video": []}
+        self._positions: dict[str, int] = {}
+
+    def _add(self, name: str, kind: str, mtime: float):
+        bucket = self._buckets.setdefault(kind, [])
+        self._positions[name] = len(bucket)
+        bucket.append(name)
+        self.entries[name] = (kind, mtime)
+
+    def _remove(self, name: str):
+        kind, _ = self.entries.pop(name)
+        bucket = self._buckets[kind]
+        pos = self._positions.pop(name)
+        last = bucket.pop()
+        if last != name:
+            bucket[pos] = last
+            self._positions[last] = pos
+
+    def apply(self, files: list[ListedFile]) -> tuple[int, int, int]:
+        """与最新列表做差异合并，返回 (新增, 删除, 变更) 数量"""
+        latest: dict[str, tuple[str, float]] = {}
+        for name, mime, mtime in files:
+            latest[name] = (classify_media_kind(name, mime), mtime)
+
+        removed = [n for n in self.entries if n not in latest]
+        for name in removed:
+            self._remove(name)
+
+        added = changed = 0
+        for name, (kind, mtime) in latest.items():
+            current = self.entries.get(name)
+            if current is None:
+                self._add(name, kind, mtime)
+                added += 1
+            elif current != (kind, mtime):
+                self._remove(name)
+                self._add(name, kind, mtime)
+                changed += 1
+        return added, len(removed), changed
+
+    def count(self, content_type: str) -> int:
+        return sum(len(self._buckets.get(t, ())) for t in _split_types(content_type))
+
+    def sample(self, content_type: str) -> str | None:
+        types = [t for t in _split_types(content_type) if self._buckets.get(t)]
+        if not types:
+            return None
+        total = sum(len(self._buckets[t]) for t in types)
+        # 多类型时按文件数加权，等价于在合并后的列表上均匀抽样
+        pick = random.randrange(total)
+        for t in types:
+            bucket = self._buckets[t]
+            if pick < len(bucket):
+                return bucket[pick]
+            pick -= len(bucket)
+        return None
+
+    def to_dict(self) -> dict:
+        return {
+            "folder": self.folder,
+            "etag": self.etag,
+            "source": self.source,
+            "fetched_at": self.fetched_at,
+            "entries": {name: [kind, mtime] for name, (kind, mtime) in self.entries.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "FolderManifest":
+        manifest = cls(data.get("folder", ""))
+        manifest.etag = data.get("etag")
+        manifest.source = data.get("source")
+        manifest.fetched_at = float(data.get("fetched_at") or 0)
+        for name, value in (data.get("entries") or {}).items():
+            if isinstance(value, list) and len(value) == 2:
+                manifest._add(name, value[0], float(value[1] or 0))
+        return manifest
+
+
+def _split_types(content_type: str) -> list[str]:
+    return [t.strip() for t in (content_type or "image,video").split(",") if t.strip()]
+
+
+class FolderManifestIndex:
+    """文件夹清单索引：内存常驻、可持久化，过期后在后台增量刷新。
+
+    未建立清单的文件夹返回 None，由调用方回退到图床 /random 接口，
+    同时在后台拉取清单，后续请求即可在本地抽样。
+    """
+
+    def __init__(
+        self,
+        lister: FolderLister,
+        persist_dir: str | None = None,
+        ttl: float = 1800,
+        retry_interval: float = 60,
+    ):
+        self._lister = lister
+        self.persist_dir = persist_dir
+        self.ttl = max(0.0, float(ttl))
+        self.retry_interval = max(0.0, float(retry_interval))
+        self._manifests: dict[str, FolderManifest] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._failed_at: dict[str, float] = {}
+        self._closed = False
+        if persist_dir:
+            os.makedirs(persist_dir, exist_ok=True)
+
+    def get(self, folder: str) -> FolderManifest | None:
+        """返回文件夹清单（可能已过期），缺失或过期时在后台刷新"""
+        manifest = self._manifests.get(folder)
+        if manifest is None or manifest.stale or (self.ttl and time.time() - manifest.fetched_at > self.ttl):
+            self._schedule_refresh(folder)
+        return manifest
+
+    def sample(self, folder: str, content_type: str) -> tuple[str, str | None] | None:
+        """随机抽取一个文件，返回 (文件名, 提供清单的图床地址)"""
+        manifest = self.get(folder)
+        if manifest is None:
+            return None
+        name = manifest.sample(content_type)
+        return (name, manifest.source) if name else None
+
+    def count(self, folder: str, content_type: str) -> int | None:
+        manifest = self.get(folder)
+        if manifest is None:
+            return None
+        return manifest.count(content_type)
+
+    def invalidate(self, folder: str):
+        """标记文件夹及其所有上级目录的清单为过期（如上传了新文件）"""
+        folder = folder.strip("/")
+        for key, manifest in self._manifests.items():
+            key = key.strip("/")
+            if not key or folder == key or folder.startswith(key + "/"):
+                manifest.stale = True
+
+    def _schedule_refresh(self, folder: str):
+        if self._closed:
+            return
+        task = self._tasks.get(folder)
+        if task and not task.done():
+            return
+        # 拉取失败后在重试间隔内不再请求，避免图床异常时反复打满列表接口
+        failed_at = self._failed_at.get(folder)
+        if failed_at and time.monotonic() - failed_at < self.retry_interval:
+            return
+        self._tasks[folder] = asyncio.create_task(self.refresh(folder))
+
+    async def refresh(self, folder: str):
+        manifest = self._manifests.get(folder)
+        if manifest is None and self.persist_dir:
+            manifest = await asyncio.to_thread(self._load, folder)
+            if manifest is not None:
+                self._manifests[folder] = manifest
+                if not self.ttl or time.time() - manifest.fetched_at <= self.ttl:
+                    manifest.stale = False
+                    return
+
+        try:
+            files, etag, source = await self._lister(folder, manifest.etag if manifest else None)
+        except Exception as e:
+            logger.warning(f"拉取文件夹清单失败: folder={folder}, err={e}")
+            self._failed_at[folder] = time.monotonic()
+            return
+        self._failed_at.pop(folder, None)
+
+        if manifest is None:
+            if files is None:
+                return
+            manifest = self._manifests[folder] = FolderManifest(folder)
+
+        if files is not None:
+            added, removed, changed = manifest.apply(files)
+            logger.debug(
+                f"文件夹清单已刷新: folder={folder}, total={len(manifest.entries)}, added={added}, removed={removed}, changed={changed}"
+            )
+        manifest.etag = etag or manifest.etag
+        manifest.source = source or manifest.source
+        manifest.fetched_at = time.time()
+        manifest.stale = False
+
+        if self.persist_dir and files is not None:
+            await asyncio.to_thread(self._save, manifest)
+
+    def _path_for(self, folder: str) -> str:
+        digest = hashlib.sha1(folder.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.persist_dir, f"{digest}.json")
+
+    def _load(self, folder: str) -> FolderManifest | None:
+        path = self._path_for(folder)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("folder") != folder:
+                return None
+            return FolderManifest.from_dict(data)
+        except Exception as e:
+            logger.warning(f"读取文件夹清单缓存失败: folder={folder}, err={e}")
+            return None
+
+    def _save(self, manifest: FolderManifest):
+        path = self._path_for(manifest.folder)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(manifest.to_dict(), f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"保存文件夹清单缓存失败: folder={manifest.folder}, err={e}")
+
+    def stats(self) -> dict:
+        return {
+            "folders": len(self._manifests),
+            "files": sum(len(m.entries) for m in self._manifests.values()),
+        }
+
+    async def close(self):
+        self._closed = True
+        tasks = [t for t in self._tasks.values() if not t.done()]
+        self._tasks.clear()
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,266 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from astrbot import logger
+
+from .manifest import classify_media_kind
+
+# 相对路径（如 /file/acg/1.jpg）-> 文件内容
+MediaFetcher = Callable[[str], Awaitable[bytes | None]]
+
+INDEX_FILE = "index.json"
+
+
+class CacheEntry:
+    __slots__ = ("filename", "folder", "kind", "size")
+
+    def __init__(self, filename: str, folder: str, kind: str, size: int):
+        self.filename = filename
+        self.folder = folder
+        self.kind = kind
+        self.size = size
+
+
+class MediaDiskCache:
+    """随机媒体的磁盘 LRU 缓存，按总体积淘汰。
+
+    同一文件被请求 admit_after 次后才在后台下载写入，缓存集中在热门文件上；
+    命中时以本地文件发送，图床异常时可从同一文件夹已缓存的文件中随机返回一个。
+    索引保存在缓存目录的 index.json 中，首次使用时懒加载，变更后延迟写盘。
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        fetcher: MediaFetcher,
+        max_bytes: int = 512 * 1024 * 1024,
+        max_file_bytes: int = 20 * 1024 * 1024,
+        admit_after: int = 2,
+        fill_concurrency: int = 2,
+        flush_delay: float = 10,
+    ):
+        self.cache_dir = cache_dir
+        self._fetcher = fetcher
+        self.max_bytes = max(1, int(max_bytes))
+        self.max_file_bytes = max(1, min(int(max_file_bytes), self.max_bytes))
+        self.admit_after = max(1, int(admit_after))
+        self.fill_concurrency = max(1, int(fill_concurrency))
+        self.flush_delay = max(0.0, float(flush_delay))
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._total_bytes = 0
+        # 尚未缓存的文件的请求次数，只保留最近的一部分
+        self._seen: OrderedDict[str, int] = OrderedDict()
+        self._seen_limit = 4096
+        self._filling: dict[str, asyncio.Task] = {}
+        self._fill_sem: asyncio.Semaphore | None = None
+        self._loaded = False
+        self._load_task: asyncio.Task | None = None
+        self._flush_task: asyncio.Task | None = None
+        self._closed = False
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._fills = 0
+        self._fill_failures = 0
+        self._fallbacks = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # ---------- 查询 ----------
+
+    def lookup(self, key: str) -> str | None:
+        """返回已缓存文件的本地路径，同时更新 LRU 顺序"""
+        if not self._ensure_loaded():
+            return None
+        entry = self._entries.get(key)
+        if entry is None:
+            self._misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return os.path.join(self.cache_dir, entry.filename)
+
+    def offer(self, key: str, folder: str):
+        """记录一次未命中的请求，达到准入次数后在后台缓存该文件"""
+        if self._closed or not self._loaded or key in self._entries or key in self._filling:
+            return
+        count = self._seen.pop(key, 0) + 1
+        if count < self.admit_after:
+            self._seen[key] = count
+            while len(self._seen) > self._seen_limit:
+                self._seen.popitem(last=False)
+            return
+        self._filling[key] = asyncio.create_task(self._fill(key, folder))
+
+    def fallback(self, folder: str, content_type: str) -> tuple[str, str] | None:
+        """图床不可用时，从该文件夹已缓存的文件中随机选一个，返回 (相对路径, 本地路径)"""
+        if not self._loaded:
+            return None
+        types = {t.strip() for t in content_type.split(",") if t.strip()}
+        candidates = [
+            key for key, entry in self._entries.items()
+            if entry.folder == folder and (not types or entry.kind in types)
+        ]
+        if not candidates:
+            return None
+        key = random.choice(candidates)
+        self._entries.move_to_end(key)
+        self._fallbacks += 1
+        return key, os.path.join(self.cache_dir, self._entries[key].filename)
+
+    # ---------- 写入与淘汰 ----------
+
+    async def _fill(self, key: str, folder: str):
+        if self._fill_sem is None:
+            self._fill_sem = asyncio.Semaphore(self.fill_concurrency)
+        try:
+            async with self._fill_sem:
+                data = await self._fetcher(key)
+                if not data or len(data) > self.max_file_bytes:
+                    self._fill_failures += 1
+                    return
+                ext = os.path.splitext(key)[1].lower()[:8]
+                filename = hashlib.sha1(key.encode("utf-8")).hexdigest()[:20] + ext
+                await asyncio.to_thread(self._write_file, filename, data)
+            if self._closed:
+                return
+            self._entries[key] = CacheEntry(filename, folder, classify_media_kind(key), len(data))
+            self._total_bytes += len(data)
+            self._fills += 1
+            await self._evict()
+            self._schedule_flush()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._fill_failures += 1
+            logger.debug(f"媒体缓存写入失败: key={key}, err={e}")
+        finally:
+            self._filling.pop(key, None)
+
+    def _write_file(self, filename: str, data: bytes):
+        path = os.path.join(self.cache_dir, filename)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    async def _evict(self):
+        removed = []
+        while self._total_bytes > self.max_bytes and self._entries:
+            _, entry = self._entries.popitem(last=False)
+            self._total_bytes -= entry.size
+            self._evictions += 1
+            removed.append(entry.filename)
+        if removed:
+            await asyncio.to_thread(self._remove_files, removed)
+
+    def _remove_files(self, filenames: list[str]):
+        for filename in filenames:
+            try:
+                os.remove(os.path.join(self.cache_dir, filename))
+            except OSError:
+                pass
+
+    # ---------- 索引持久化 ----------
+
+    def _ensure_loaded(self) -> bool:
+        if self._loaded:
+            return True
+        if self._load_task is None and not self._closed:
+            self._load_task = asyncio.create_task(self._load())
+        return False
+
+    async def _load(self):
+        try:
+            entries = await asyncio.to_thread(self._read_index)
+        except Exception as e:
+            logger.warning(f"读取媒体缓存索引失败: {e}")
+            entries = []
+        for key, entry in entries:
+            self._entries[key] = entry
+            self._total_bytes += entry.size
+        self._loaded = True
+        await self._evict()
+
+    def _read_index(self) -> list[tuple[str, CacheEntry]]:
+        path = os.path.join(self.cache_dir, INDEX_FILE)
+        data = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        files = set(os.listdir(self.cache_dir))
+        entries = []
+        # 索引按 LRU 顺序保存，文件已被删除的条目直接丢弃
+        for item in data.get("entries", []):
+            filename = item.get("filename")
+            if not filename or filename not in files:
+                continue
+            files.discard(filename)
+            entries.append((item["key"], CacheEntry(filename, item.get("folder", ""), item.get("kind", "image"), int(item.get("size", 0)))))
+        # 清理未记录在索引中的残留文件（如写入后未来得及保存索引）
+        files.discard(INDEX_FILE)
+        self._remove_files(list(files))
+        return entries
+
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(self.flush_delay)
+        await self.flush()
+
+    async def flush(self):
+        snapshot = {
+            "saved_at": time.time(),
+            "entries": [
+                {"key": key, "filename": e.filename, "folder": e.folder, "kind": e.kind, "size": e.size}
+                for key, e in self._entries.items()
+            ],
+        }
+        try:
+            await asyncio.to_thread(self._write_index, snapshot)
+        except Exception as e:
+            logger.warning(f"保存媒体缓存索引失败: {e}")
+
+    def _write_index(self, snapshot: dict):
+        path = os.path.join(self.cache_dir, INDEX_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._total_bytes,
+            "hits": self._hits,
+            "misses": self._misses,
+            "evictions": self._evictions,
+            "fills": self._fills,
+            "fill_failures": self._fill_failures,
+            "fallbacks": self._fallbacks,
+            "filling": len(self._filling),
+        }
+
+    async def close(self):
+        self._closed = True
+        tasks = list(self._filling.values())
+        if self._load_task and not self._load_task.done():
+            tasks.append(self._load_task)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        flush_task = self._flush_task
+        if flush_task and not flush_task.done():
+            flush_task.cancel()
+            await asyncio.gather(flush_task, return_exceptions=True)
+        # 同时保存命中带来的 LRU 顺序变化
+        if self._loaded:
+            await self.flush()
@@ -0,0 +1,143 @@
+import bisect
+import time
+
+# 延迟直方图桶上限（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+class Histogram:
+    """固定桶直方图，observe 只做一次二分查找与两次加法"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """按桶线性插值估算分位数"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for i, c in enumerate(self.counts):
+            upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+            if c and seen + c >= rank:
+                return lower + (upper - lower) * (rank - seen) / c
+            seen += c
+            lower = upper
+        return self.buckets[-1]
+
+
+class Metrics:
+    """进程内计数器与延迟直方图。
+
+    插件运行在单个事件循环中，记录只是普通的字典自增，无需加锁。
+    指标以 (名称, 标签) 区分，标签为单个字符串（如状态码、接口名）。
+    """
+
+    def __init__(self, namespace: str = "cloudimg"):
+        self.namespace = namespace
+        self.counters: dict[tuple[str, str], float] = {}
+        self.histograms: dict[tuple[str, str], Histogram] = {}
+        self.started_at = time.time()
+
+    def inc(self, name: str, value: float = 1, label: str = ""):
+        key = (name, label)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, label: str = ""):
+        key = (name, label)
+        hist = self.histograms.get(key)
+        if hist is None:
+            hist = self.histograms[key] = Histogram()
+        hist.observe(seconds)
+
+    def observe_since(self, name: str, start: float, label: str = ""):
+        """记录自 start（time.perf_counter()）以来的耗时"""
+        self.observe(name, time.perf_counter() - start, label)
+
+    def render_text(self) -> str:
+        lines = [f"运行时长: {int(time.time() - self.started_at)}s"]
+        if self.counters:
+            lines.append("计数:")
+            for (name, label), value in sorted(self.counters.items()):
+                suffix = f"[{label}]" if label else ""
+                value_str = f"{value:.0f}" if float(value).is_integer() else f"{value:.2f}"
+                lines.append(f"  {name}{suffix}: {value_str}")
+        if self.histograms:
+            lines.append("延迟 (p50/p95/p99, ms):")
+            for (name, label), hist in sorted(self.histograms.items()):
+                suffix = f"[{label}]" if label else ""
+                lines.append(
+                    f"  {name}{suffix}: n={hist.count} "
+                    f"{hist.quantile(0.5) * 1000:.0f}/{hist.quantile(0.95) * 1000:.0f}/{hist.quantile(0.99) * 1000:.0f}"
+                )
+        return "\n".join(lines)
+
+    def render_prometheus(self, gauges: dict[str, dict] | None = None) -> str:
+        """导出 Prometheus 文本格式；gauges 为各组件的数值状态，按组件名展开"""
+        ns = self.namespace
+        out: list[str] = []
+
+        def labels(label_name: str, label: str, extra: str = "") -> str:
+            parts = [f'{label_name}="{_escape_label(label)}"'] if label else []
+            if extra:
+                parts.append(extra)
+            return "{" + ",".join(parts) + "}" if parts else ""
+
+        for name in sorted({n for n, _ in self.counters}):
+            out.append(f"# TYPE {ns}_{name}_total counter")
+            for (n, label), value in sorted(self.counters.items()):
+                if n == name:
+                    out.append(f"{ns}_{name}_total{labels('label', label)} {value}")
+
+        for name in sorted({n for n, _ in self.histograms}):
+            out.append(f"# TYPE {ns}_{name}_seconds histogram")
+            for (n, label), hist in sorted(self.histograms.items()):
+                if n != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(hist.buckets, hist.counts):
+                    cumulative += count
+                    le = 'le="%s"' % bound
+                    out.append(f"{ns}_{name}_seconds_bucket{labels('label', label, le)} {cumulative}")
+                le = 'le="+Inf"'
+                out.append(f"{ns}_{name}_seconds_bucket{labels('label', label, le)} {hist.count}")
+                out.append(f"{ns}_{name}_seconds_sum{labels('label', label)} {hist.sum}")
+                out.append(f"{ns}_{name}_seconds_count{labels('label', label)} {hist.count}")
+
+        if gauges:
+            out.append(f"# TYPE {ns}_component gauge")
+            for component, values in sorted(gauges.items()):
+                for key, value in _flatten(values):
+                    if isinstance(value, bool):
+                        value = int(value)
+                    if isinstance(value, (int, float)):
+                        out.append(
+                            f'{ns}_component{{component="{_escape_label(component)}",key="{_escape_label(key)}"}} {value}'
+                        )
+
+        return "\n".join(out) + "\n"
+
+
+def _escape_label(value: str) -> str:
+    """按 Prometheus 文本格式转义标签值（关键词、文件夹名等可能包含任意字符）"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _flatten(values: dict, prefix: str = ""):
+    for key, value in values.items():
+        full_key = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{full_key}.")
+        else:
+            yield full_key, value
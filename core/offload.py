@@ -0,0 +1,109 @@
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+
+class BlockingOffloader:
+    """将阻塞的文件读写与大 JSON 解析卸载到有界线程池。
+
+    size 小于 inline_threshold 的任务直接在事件循环内执行，省去线程切换开销；
+    卸载执行的任务会累计其耗时，即事件循环原本会被阻塞的时间。
+    """
+
+    def __init__(self, max_workers: int = 4, inline_threshold: int = 64 * 1024):
+        self.max_workers = max(1, int(max_workers))
+        self.inline_threshold = max(0, int(inline_threshold))
+        self._executor: ThreadPoolExecutor | None = None
+        # label -> [内联次数, 内联耗时秒, 卸载次数, 卸载耗时秒]
+        self._stats: dict[str, list] = {}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="cloudimg-offload",
+            )
+        return self._executor
+
+    def _record(self, label: str, offloaded: bool, elapsed: float):
+        stat = self._stats.get(label)
+        if stat is None:
+            stat = self._stats[label] = [0, 0.0, 0, 0.0]
+        if offloaded:
+            stat[2] += 1
+            stat[3] += elapsed
+        else:
+            stat[0] += 1
+            stat[1] += elapsed
+
+    async def run(self, label: str, func: Callable[..., Any], *args, size: int = 0) -> Any:
+        """执行阻塞函数，size 为预估处理字节数，用于决定是否卸载"""
+        if size < self.inline_threshold:
+            start = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                self._record(label, False, time.perf_counter() - start)
+
+        def timed():
+            start = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                self._record(label, True, time.perf_counter() - start)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), timed)
+
+    async def read_file(self, path: str) -> bytes:
+        def read() -> bytes:
+            with open(path, "rb") as f:
+                return f.read()
+
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = self.inline_threshold
+        return await self.run("read_file", read, size=size)
+
+    async def json_loads(self, text: str | bytes) -> Any:
+        return await self.run("json_loads", json.loads, text, size=len(text))
+
+    async def write_json(self, path: str, obj: Any, size_hint: int = 0, **dump_kwargs):
+        """序列化并原子写入 JSON 文件（先写临时文件再替换）"""
+        def write():
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(obj, f, **dump_kwargs)
+            os.replace(tmp_path, path)
+
+        await self.run("write_json", write, size=size_hint)
+
+    async def write_text(self, path: str, text: str):
+        """原子写入文本文件"""
+        def write():
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+
+        await self.run("write_text", write, size=len(text))
+
+    def stats(self) -> dict[str, dict]:
+        return {
+            label: {
+                "inline": stat[0],
+                "inline_ms": round(stat[1] * 1000, 2),
+                "offloaded": stat[2],
+                "offloaded_ms": round(stat[3] * 1000, 2),
+            }
+            for label, stat in self._stats.items()
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
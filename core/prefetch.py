@@ -0,0 +1,167 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Generic, Iterable, TypeVar
+
+from astrbot import logger
+
+PrefetchKey = tuple[str, str]
+T = TypeVar("T")
+
+
+class _PrefetchBuffer:
+    __slots__ = ("queue", "last_access", "refill_task")
+
+    def __init__(self, depth: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=depth)
+        self.last_access = time.monotonic()
+        self.refill_task: asyncio.Task | None = None
+
+
+class RandomPathPrefetcher(Generic[T]):
+    """按 (文件夹, 内容类型) 预取随机文件路径的后台缓冲层。
+
+    缓冲中保存 fetcher 的返回值原样（如路径与提供它的实例），返回 None 或空值表示取数失败。
+
+    每个被访问过的键维护一个小队列，队列低于低水位时由后台任务补充；
+    长时间未访问的键会被淘汰，避免为冷门文件夹持续请求图床。
+    预热只为尚无缓冲的键填充到低水位之上一条，且缓冲总数达到 warm_limit 后不再预热新键。
+    """
+
+    def __init__(
+        self,
+        fetcher: Callable[[str, str], Awaitable[T | None]],
+        depth: int = 5,
+        low_water: int = 2,
+        refill_concurrency: int = 2,
+        idle_ttl: float = 600,
+        warm_limit: int = 20,
+    ):
+        self._fetcher = fetcher
+        self.depth = max(1, int(depth))
+        self.low_water = min(max(0, int(low_water)), self.depth - 1)
+        self.idle_ttl = max(0.0, float(idle_ttl))
+        self.warm_limit = max(0, int(warm_limit))
+        self._refill_semaphore = asyncio.Semaphore(max(1, int(refill_concurrency)))
+        self._buffers: dict[PrefetchKey, _PrefetchBuffer] = {}
+        self._pending_warm: set[PrefetchKey] = set()
+        self._last_sweep = time.monotonic()
+        self._closed = False
+        self._hits = 0
+        self._misses = 0
+
+    def take(self, folder_name: str, content_type: str) -> T | None:
+        """取出一个已预取的路径，缓冲为空时返回 None 并触发补充"""
+        if self._closed:
+            return None
+        self._flush_pending_warm()
+        self._sweep_idle()
+
+        key = (folder_name, content_type)
+        buf = self._buffers.get(key)
+        if buf is None:
+            buf = self._buffers[key] = _PrefetchBuffer(self.depth)
+        buf.last_access = time.monotonic()
+
+        path = None
+        try:
+            path = buf.queue.get_nowait()
+            self._hits += 1
+        except asyncio.QueueEmpty:
+            self._misses += 1
+
+        if buf.queue.qsize() <= self.low_water:
+            self._schedule_refill(key, buf)
+        return path
+
+    def warm(self, keys: Iterable[PrefetchKey]):
+        """预热一组键（如关键词映射的目标文件夹），无事件循环时延后到首次取用"""
+        if self._closed:
+            return
+        for key in keys:
+            if key in self._buffers or key in self._pending_warm:
+                continue
+            if len(self._buffers) + len(self._pending_warm) >= self.warm_limit:
+                break
+            self._pending_warm.add(key)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._flush_pending_warm()
+
+    def discard(self, folder_name: str):
+        """丢弃指定文件夹的全部缓冲（如文件夹内容发生变化）"""
+        for key in [k for k in self._buffers if k[0] == folder_name]:
+            buf = self._buffers.pop(key)
+            if buf.refill_task and not buf.refill_task.done():
+                buf.refill_task.cancel()
+
+    def _flush_pending_warm(self):
+        if not self._pending_warm:
+            return
+        keys, self._pending_warm = self._pending_warm, set()
+        for key in keys:
+            if key in self._buffers:
+                continue
+            buf = self._buffers[key] = _PrefetchBuffer(self.depth)
+            self._schedule_refill(key, buf, self.low_water + 1)
+
+    def _sweep_idle(self):
+        if not self.idle_ttl:
+            return
+        now = time.monotonic()
+        # 摊销到取用路径上，每个 idle_ttl 周期最多扫描一次
+        if now - self._last_sweep < self.idle_ttl:
+            return
+        self._last_sweep = now
+        expired = [k for k, b in self._buffers.items() if now - b.last_access > self.idle_ttl]
+        for key in expired:
+            buf = self._buffers.pop(key)
+            if buf.refill_task and not buf.refill_task.done():
+                buf.refill_task.cancel()
+        if expired:
+            logger.debug(f"预取缓冲淘汰空闲键: count={len(expired)}")
+
+    def _schedule_refill(self, key: PrefetchKey, buf: _PrefetchBuffer, target: int | None = None):
+        if buf.refill_task and not buf.refill_task.done():
+            return
+        buf.refill_task = asyncio.create_task(self._refill(key, buf, target or self.depth))
+
+    async def _refill(self, key: PrefetchKey, buf: _PrefetchBuffer, target: int):
+        folder_name, content_type = key
+        while not self._closed and buf.queue.qsize() < target:
+            if self._buffers.get(key) is not buf:
+                return
+            async with self._refill_semaphore:
+                try:
+                    path = await self._fetcher(folder_name, content_type)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning(f"预取随机路径失败: folder={folder_name}, content_type={content_type}, err={e}")
+                    return
+            if not path:
+                # 图床暂不可用时停止补充，等待下次取用再触发
+                return
+            try:
+                buf.queue.put_nowait(path)
+            except asyncio.QueueFull:
+                return
+
+    def stats(self) -> dict:
+        return {
+            "keys": len(self._buffers),
+            "buffered": sum(b.queue.qsize() for b in self._buffers.values()),
+            "hits": self._hits,
+            "misses": self._misses,
+        }
+
+    async def close(self):
+        self._closed = True
+        tasks = [b.refill_task for b in self._buffers.values() if b.refill_task and not b.refill_task.done()]
+        self._buffers.clear()
+        self._pending_warm.clear()
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
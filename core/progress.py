@@ -0,0 +1,68 @@
+import time
+
+
+def format_index_ranges(indexes: list[int]) -> str:
+    """将序号列表压缩为区间表示，如 [1, 2, 3, 7] -> "1-3, 7" """
+    parts: list[str] = []
+    start = prev = None
+    for i in sorted(indexes):
+        if prev is not None and i == prev + 1:
+            prev = i
+            continue
+        if start is not None:
+            parts.append(f"{start}-{prev}" if prev != start else str(start))
+        start = prev = i
+    if start is not None:
+        parts.append(f"{start}-{prev}" if prev != start else str(start))
+    return ", ".join(parts)
+
+
+class BatchProgress:
+    """批量上传的进度汇总：按完成顺序收集结果，每完成 every 条或间隔 interval 秒产生一次进度提示"""
+
+    def __init__(self, total: int, every: int = 10, interval: float = 15, enabled: bool = True):
+        self.total = total
+        self.every = max(1, int(every))
+        self.interval = max(1.0, float(interval))
+        self.enabled = enabled
+        self.timed_out = False
+        self._results: list[dict] = []
+        self._ok = 0
+        self._started = time.monotonic()
+        self._reported_at = self._started
+        self._reported_count = 0
+
+    def add(self, result: dict):
+        self._results.append(result)
+        if result.get("ok"):
+            self._ok += 1
+
+    @property
+    def done(self) -> int:
+        return len(self._results)
+
+    def next_report_in(self) -> float | None:
+        """距下一次按时间触发进度提示的秒数；没有新完成的条目时无需定时唤醒，返回 None"""
+        if not self.enabled or self.done >= self.total or self.done == self._reported_count:
+            return None
+        return max(0.0, self._reported_at + self.interval - time.monotonic())
+
+    def due(self) -> bool:
+        if not self.enabled or self.done >= self.total or self.done == self._reported_count:
+            return False
+        return (
+            self.done - self._reported_count >= self.every
+            or time.monotonic() - self._reported_at >= self.interval
+        )
+
+    def render(self) -> str:
+        self._reported_at = time.monotonic()
+        self._reported_count = self.done
+        failed = self.done - self._ok
+        text = f"上传进度 {self.done}/{self.total}：成功 {self._ok}"
+        if failed:
+            text += f"，失败 {failed}"
+        return f"{text}，已用时 {self._reported_at - self._started:.0f}s"
+
+    def results(self) -> list[dict]:
+        return sorted(self._results, key=lambda r: r["index"])
@@ -0,0 +1,141 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+DROP = "drop"
+QUEUE = "queue"
+NOTIFY = "notify"
+
+
+class TokenBucketSet:
+    """同一规则下按键（会话、用户）划分的令牌桶集合。
+
+    每个桶只保存 [剩余令牌, 更新时间] 两个数；按最近访问排序，
+    已空闲到令牌回满的桶与不存在等价，可无损淘汰，内存只与活跃键数量相关。
+    """
+
+    __slots__ = ("rate", "burst", "_buckets", "_refill_time")
+
+    def __init__(self, per_minute: float, burst: int):
+        self.rate = max(0.0, float(per_minute)) / 60
+        self.burst = max(1.0, float(burst))
+        self._buckets: OrderedDict[Hashable, list] = OrderedDict()
+        # 从空桶恢复到满桶所需时间
+        self._refill_time = self.burst / self.rate if self.rate else float("inf")
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def wait_time(self, key: Hashable, now: float) -> float:
+        """取一个令牌还需等待的秒数，0 表示可立即取得"""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return 0.0
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        if tokens >= 1:
+            return 0.0
+        return (1 - tokens) / self.rate
+
+    def consume(self, key: Hashable, now: float):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            self._buckets[key] = [self.burst - 1, now]
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate) - 1
+            bucket[1] = now
+            self._buckets.move_to_end(key)
+        self._evict(now)
+
+    def _evict(self, now: float):
+        buckets = self._buckets
+        while buckets:
+            key, bucket = next(iter(buckets.items()))
+            if now - bucket[1] < self._refill_time:
+                break
+            del buckets[key]
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class CommandRateLimiter:
+    """/img 与关键词指令的限流：会话、用户、全局三级令牌桶，需同时满足才放行。
+
+    超限时按 mode 处理：drop 直接忽略；queue 最多等待 max_queue_wait 秒后再次尝试；
+    notify 在每个会话的冷却期内只提示一次，其余请求直接忽略。
+    """
+
+    def __init__(
+        self,
+        chat: tuple[float, int] = (20, 5),
+        user: tuple[float, int] = (6, 3),
+        global_: tuple[float, int] = (120, 20),
+        mode: str = NOTIFY,
+        max_queue_wait: float = 3,
+    ):
+        self.chat = TokenBucketSet(*chat)
+        self.user = TokenBucketSet(*user)
+        self.global_ = TokenBucketSet(*global_)
+        self.mode = mode if mode in (DROP, QUEUE, NOTIFY) else NOTIFY
+        self.max_queue_wait = max(0.0, float(max_queue_wait))
+        # 会话 -> 冷却提示截止时间
+        self._notified: OrderedDict[Hashable, float] = OrderedDict()
+        self._allowed = 0
+        self._queued = 0
+        self._limited = 0
+
+    def _wait_time(self, chat_key: Hashable, user_key: Hashable, now: float) -> float:
+        wait = 0.0
+        for buckets, key in ((self.chat, chat_key), (self.user, user_key), (self.global_, None)):
+            if buckets.enabled:
+                wait = max(wait, buckets.wait_time(key, now))
+        return wait
+
+    def _consume(self, chat_key: Hashable, user_key: Hashable, now: float):
+        for buckets, key in ((self.chat, chat_key), (self.user, user_key), (self.global_, None)):
+            if buckets.enabled:
+                buckets.consume(key, now)
+
+    async def acquire(self, chat_key: Hashable, user_key: Hashable) -> tuple[bool, float]:
+        """尝试放行一次请求，返回 (是否放行, 超限时的建议等待秒数)"""
+        now = time.monotonic()
+        wait = self._wait_time(chat_key, user_key, now)
+        if wait > 0 and self.mode == QUEUE and wait <= self.max_queue_wait:
+            self._queued += 1
+            await asyncio.sleep(wait)
+            now = time.monotonic()
+            wait = self._wait_time(chat_key, user_key, now)
+        if wait > 0:
+            self._limited += 1
+            return False, wait
+        self._consume(chat_key, user_key, now)
+        self._allowed += 1
+        return True, 0.0
+
+    def should_notify(self, chat_key: Hashable, cooldown: float) -> bool:
+        """notify 模式下，会话在冷却期内只提示一次"""
+        if self.mode != NOTIFY:
+            return False
+        now = time.monotonic()
+        notified = self._notified
+        while notified:
+            key, until = next(iter(notified.items()))
+            if until > now:
+                break
+            del notified[key]
+        if chat_key in notified:
+            return False
+        notified[chat_key] = now + cooldown
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "allowed": self._allowed,
+            "queued": self._queued,
+            "limited": self._limited,
+            "chat_buckets": len(self.chat),
+            "user_buckets": len(self.user),
+        }
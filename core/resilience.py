@@ -0,0 +1,176 @@
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, TypeVar
+
+import aiohttp
+
+from astrbot import logger
+
+T = TypeVar("T")
+
+
+class HttpStatusError(Exception):
+    """HTTP 非 200 响应，携带状态码与响应文本"""
+
+    def __init__(self, status: int, text: str = ""):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.text = text
+
+
+class CircuitOpenError(RuntimeError):
+    """熔断器处于打开状态，请求被快速拒绝"""
+
+
+def status_of(e: BaseException) -> int | None:
+    if isinstance(e, HttpStatusError):
+        return e.status
+    if isinstance(e, aiohttp.ClientResponseError):
+        return e.status
+    return None
+
+
+def is_server_failure(e: BaseException) -> bool:
+    """是否属于服务端不可用类错误（连接失败、超时、5xx），计入熔断统计"""
+    if isinstance(e, (aiohttp.ClientConnectionError, asyncio.TimeoutError)):
+        return True
+    status = status_of(e)
+    return status is not None and status >= 500
+
+
+def is_idempotent_retryable(e: BaseException) -> bool:
+    """幂等 GET（随机接口、媒体下载）可重试的错误"""
+    return is_server_failure(e) or status_of(e) in (408, 429)
+
+
+def is_upload_retryable(e: BaseException) -> bool:
+    """上传仅在连接未建立或网关类错误时重试，避免重复写入"""
+    if isinstance(e, aiohttp.ClientConnectorError):
+        return True
+    return status_of(e) in (502, 503, 504)
+
+
+class RetryPolicy:
+    """指数退避 + 全抖动的重试策略，总耗时受 budget 约束"""
+
+    def __init__(self, attempts: int = 3, base_delay: float = 0.2, max_delay: float = 2.0, budget: float = 10.0):
+        self.attempts = max(1, int(attempts))
+        self.base_delay = max(0.0, float(base_delay))
+        self.max_delay = max(self.base_delay, float(max_delay))
+        self.budget = max(0.0, float(budget))
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+
+class CircuitBreaker:
+    """closed / open / half-open 三态熔断器。
+
+    连续失败达到阈值后打开，打开期间直接拒绝请求；经过 recovery_timeout 后进入半开，
+    仅放行少量探测请求，成功则关闭，失败则重新打开。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30, half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.recovery_timeout = max(0.0, float(recovery_timeout))
+        self.half_open_max_calls = max(1, int(half_open_max_calls))
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self.rejected = 0
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._half_open_calls = 0
+        return self._state
+
+    def before_call(self):
+        """请求前调用，熔断打开或半开探测名额已满时抛出 CircuitOpenError"""
+        state = self.state
+        if state == self.OPEN:
+            self.rejected += 1
+            raise CircuitOpenError(f"{self.name} 熔断中")
+        if state == self.HALF_OPEN:
+            if self._half_open_calls >= self.half_open_max_calls:
+                self.rejected += 1
+                raise CircuitOpenError(f"{self.name} 熔断探测中")
+            self._half_open_calls += 1
+
+    def release_probe(self):
+        """半开探测请求被取消时归还名额"""
+        if self._state == self.HALF_OPEN and self._half_open_calls > 0:
+            self._half_open_calls -= 1
+
+    def record_success(self):
+        if self._state != self.CLOSED:
+            logger.info(f"熔断器恢复: name={self.name}")
+        self._state = self.CLOSED
+        self._failures = 0
+        self._half_open_calls = 0
+
+    def record_failure(self):
+        self._failures += 1
+        if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                self.trips += 1
+                logger.warning(f"熔断器打开: name={self.name}, failures={self._failures}")
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._half_open_calls = 0
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self._failures,
+            "trips": self.trips,
+            "rejected": self.rejected,
+        }
+
+
+async def retry_call(
+    func: Callable[[], Awaitable[T]],
+    policy: RetryPolicy,
+    is_retryable: Callable[[BaseException], bool],
+    breaker: CircuitBreaker | None = None,
+) -> T:
+    """执行 func，可重试错误按策略退避重试；熔断打开时抛出 CircuitOpenError"""
+    deadline = time.monotonic() + policy.budget
+    attempt = 0
+    while True:
+        if breaker is not None:
+            breaker.before_call()
+        attempt += 1
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            if breaker is not None:
+                breaker.release_probe()
+            raise
+        except Exception as e:
+            if breaker is not None:
+                if is_server_failure(e):
+                    breaker.record_failure()
+                else:
+                    # 4xx 等业务错误说明服务本身可用
+                    breaker.record_success()
+            if attempt >= policy.attempts or not is_retryable(e):
+                raise
+            delay = policy.backoff(attempt)
+            if time.monotonic() + delay > deadline:
+                raise
+            logger.debug(f"请求失败，{delay:.2f}s 后重试: attempt={attempt}, err={type(e).__name__}")
+            await asyncio.sleep(delay)
+            continue
+        if breaker is not None:
+            breaker.record_success()
+        return result
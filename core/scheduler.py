@@ -0,0 +1,124 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Callable, Hashable
+
+
+class SchedulerClosedError(RuntimeError):
+    """调度器已关闭（插件卸载），排队中的任务被取消"""
+
+
+class FairScheduler:
+    """插件级公平调度器：全局并发上限 + 按通道（会话/用户）轮询放行。
+
+    每个通道维护一个 FIFO 等待队列，空出槽位时依次从各通道取一个等待者，
+    大批量任务只能占用自己那一份轮次，单个任务不会被饿死。
+    """
+
+    def __init__(self, limit: int = 4, on_wait: Callable[[float], None] | None = None):
+        self.limit = max(1, int(limit))
+        self._on_wait = on_wait
+        self._active = 0
+        # lane -> deque[(future, enqueued_at)]
+        self._lanes: OrderedDict[Hashable, deque] = OrderedDict()
+        self._closed = False
+        self._waits = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(q) for q in self._lanes.values())
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    async def acquire(self, lane: Hashable) -> float:
+        """获取一个槽位，返回排队等待的秒数"""
+        if self._closed:
+            raise SchedulerClosedError("调度器已关闭")
+        if self._active < self.limit and not self._lanes:
+            self._active += 1
+            self._record_wait(0.0)
+            return 0.0
+
+        future = asyncio.get_running_loop().create_future()
+        enqueued_at = time.monotonic()
+        self._lanes.setdefault(lane, deque()).append((future, enqueued_at))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 已被分配槽位后才取消，归还槽位
+                self.release()
+            else:
+                self._discard(lane, future)
+            raise
+        waited = time.monotonic() - enqueued_at
+        self._record_wait(waited)
+        return waited
+
+    def release(self):
+        self._active = max(0, self._active - 1)
+        self._wake_next()
+
+    @asynccontextmanager
+    async def slot(self, lane: Hashable):
+        await self.acquire(lane)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _wake_next(self):
+        while self._active < self.limit and self._lanes:
+            lane, waiters = next(iter(self._lanes.items()))
+            future, _ = waiters.popleft()
+            if waiters:
+                self._lanes.move_to_end(lane)
+            else:
+                del self._lanes[lane]
+            if future.done():
+                continue
+            self._active += 1
+            future.set_result(None)
+
+    def _discard(self, lane: Hashable, future: asyncio.Future):
+        waiters = self._lanes.get(lane)
+        if not waiters:
+            return
+        for item in waiters:
+            if item[0] is future:
+                waiters.remove(item)
+                break
+        if not waiters:
+            del self._lanes[lane]
+
+    def _record_wait(self, waited: float):
+        self._waits += 1
+        self._wait_total += waited
+        if waited > self._wait_max:
+            self._wait_max = waited
+        if self._on_wait:
+            self._on_wait(waited)
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self._active,
+            "queue_depth": self.queue_depth,
+            "lanes": len(self._lanes),
+            "avg_wait_ms": round(self._wait_total / self._waits * 1000, 2) if self._waits else 0.0,
+            "max_wait_ms": round(self._wait_max * 1000, 2),
+        }
+
+    def close(self):
+        """关闭调度器，取消所有排队中的任务"""
+        self._closed = True
+        lanes, self._lanes = self._lanes, OrderedDict()
+        for waiters in lanes.values():
+            for future, _ in waiters:
+                if not future.done():
+                    future.set_exception(SchedulerClosedError("插件已卸载，任务已取消"))
@@ -0,0 +1,142 @@
+import struct
+
+# 扩展名 -> MIME 类型，即图床上传支持的格式
+MEDIA_TYPES = {
+    ".jpg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".bmp": "image/bmp",
+    ".webp": "image/webp",
+    ".avif": "image/avif",
+    ".heic": "image/heic",
+    ".mp4": "video/mp4",
+    ".m4v": "video/x-m4v",
+    ".mov": "video/quicktime",
+    ".3gp": "video/3gpp",
+    ".mkv": "video/x-matroska",
+    ".webm": "video/webm",
+    ".avi": "video/x-msvideo",
+    ".wmv": "video/x-ms-wmv",
+    ".flv": "video/x-flv",
+}
+
+# 判断格式所需的头部字节数；流式上传时首个分块需至少包含这么多字节
+SNIFF_BYTES = 64
+
+_ASF_GUID = bytes.fromhex("3026b2758e66cf11a6d900aa0062ce6c")
+
+# ISO BMFF（ftyp）品牌：图片品牌优先于视频品牌；主品牌为纯音频（M4A 等）的不支持
+_AVIF_BRANDS = frozenset((b"avif", b"avis"))
+_HEIC_BRANDS = frozenset((b"heic", b"heix", b"heim", b"heis", b"hevc", b"hevx", b"mif1", b"msf1"))
+_AUDIO_BRANDS = frozenset((b"M4A ", b"M4B ", b"M4P ", b"F4A ", b"F4B "))
+# 有专属扩展名的视频品牌，其余视频品牌按 .mp4 上传
+_VIDEO_BRAND_EXTS = {
+    b"qt  ": ".mov",
+    b"M4V ": ".m4v",
+    b"M4VH": ".m4v",
+    b"M4VP": ".m4v",
+    b"3gp4": ".3gp",
+    b"3gp5": ".3gp",
+    b"3gp6": ".3gp",
+    b"3g2a": ".3gp",
+}
+# 主品牌或任一兼容品牌命中即视为视频；iso2 及以后的 isoN 按前缀匹配
+_VIDEO_BRANDS = frozenset((b"isom", b"mp41", b"mp42", b"avc1", b"mmp4", b"XAVC", b"dash", b"MSNV", b"f4v ")) | frozenset(_VIDEO_BRAND_EXTS)
+
+
+class UnsupportedMediaError(ValueError):
+    """文件头无法识别为支持的媒体格式，或文件头显示数据已截断"""
+
+
+def sniff_media(data: bytes | memoryview, total_size: int | None = None) -> tuple[str, str]:
+    """根据文件头判断媒体格式，返回 (扩展名, MIME 类型)。
+
+    只读取前 SNIFF_BYTES 字节，通过 memoryview 切片比较，不复制数据；
+    data 可以是完整文件或流式上传的首个分块，total_size 为已知的文件总大小，用于检查截断；
+    data 不足 SNIFF_BYTES 字节时视为完整文件。
+    """
+    view = memoryview(data)[:SNIFF_BYTES]
+    if total_size is None and len(data) < SNIFF_BYTES:
+        total_size = len(data)
+    ext = _match(view)
+    if ext is None:
+        raise UnsupportedMediaError("不支持的文件格式")
+    if total_size is not None and total_size < _min_size(view, ext):
+        raise UnsupportedMediaError("文件已损坏或不完整")
+    return ext, MEDIA_TYPES[ext]
+
+
+def _match(view: memoryview) -> str | None:
+    if view[:3] == b"\xff\xd8\xff":
+        return ".jpg"
+    if view[:8] == b"\x89PNG\r\n\x1a\n":
+        return ".png" if view[12:16] == b"IHDR" else None
+    if view[:6] in (b"GIF87a", b"GIF89a"):
+        return ".gif"
+    if view[:2] == b"BM" and view[6:10] == b"\x00\x00\x00\x00":
+        return ".bmp"
+    if view[:4] == b"RIFF":
+        form = view[8:12]
+        if form == b"WEBP":
+            return ".webp"
+        if form == b"AVI ":
+            return ".avi"
+        return None
+    if view[4:8] == b"ftyp":
+        return _match_ftyp(view)
+    if view[:4] == b"\x1a\x45\xdf\xa3":
+        # EBML 头中的 DocType 区分 WebM 与 Matroska
+        return ".webm" if _ebml_doctype_is_webm(view) else ".mkv"
+    if view[:3] == b"FLV":
+        return ".flv"
+    if view[:16] == _ASF_GUID:
+        return ".wmv"
+    return None
+
+
+def _ebml_doctype_is_webm(view: memoryview) -> bool:
+    """在 memoryview 上原地查找 DocType 元素（ID 0x4282，1 字节长度），不复制头部数据"""
+    for i in range(4, len(view) - 2):
+        if view[i] == 0x42 and view[i + 1] == 0x82:
+            size = view[i + 2]
+            # 长度为 1 字节 VINT（最高位为 1）
+            if size & 0x80:
+                start = i + 3
+                return view[start:start + (size & 0x7F)] == b"webm"
+    return False
+
+
+def _match_ftyp(view: memoryview) -> str | None:
+    """按 ftyp 盒的主品牌与兼容品牌区分 AVIF/HEIC 图片与 MP4/MOV/3GP 视频"""
+    box_size = struct.unpack_from(">I", view, 0)[0]
+    major = bytes(view[8:12])
+    if major in _AUDIO_BRANDS:
+        return None
+    # 兼容品牌列表从偏移 16 开始（跳过 minor_version），以盒大小与已读取的字节为界；每个品牌只复制 4 字节
+    end = min(box_size, len(view))
+    brands = [major] + [bytes(view[i:i + 4]) for i in range(16, end - 3, 4)]
+    if any(b in _AVIF_BRANDS for b in brands):
+        return ".avif"
+    if any(b in _HEIC_BRANDS for b in brands):
+        return ".heic"
+    if major in _VIDEO_BRAND_EXTS:
+        return _VIDEO_BRAND_EXTS[major]
+    if any(b in _VIDEO_BRANDS or (b.startswith(b"iso") and b != b"iso1") for b in brands):
+        return next((_VIDEO_BRAND_EXTS[b] for b in brands if b in _VIDEO_BRAND_EXTS), ".mp4")
+    return None
+
+
+def _min_size(view: memoryview, ext: str) -> int:
+    """文件头能推断出的最小文件长度"""
+    if ext in (".webp", ".avi") and len(view) >= 8:
+        return struct.unpack_from("<I", view, 4)[0] + 8
+    if ext == ".bmp" and len(view) >= 6:
+        return struct.unpack_from("<I", view, 2)[0]
+    if ext == ".png":
+        # 签名 + IHDR 块 + IEND 块
+        return 8 + 25 + 12
+    if ext in (".mp4", ".m4v", ".mov", ".3gp", ".avif", ".heic") and len(view) >= 4:
+        return struct.unpack_from(">I", view, 0)[0]
+    if ext == ".gif":
+        return 14
+    return 4
@@ -0,0 +1,113 @@
+import asyncio
+import os
+from typing import AsyncIterator, Awaitable, Callable
+
+import aiohttp
+
+
+class MediaStream:
+    """按块读取的媒体数据源，用于边读取边上传，峰值内存受块大小约束。
+
+    只能被消费一次；消费方负责在结束后调用 close() 释放底层连接或文件句柄。
+    source 标识数据来源（URL 或本地文件），用于分块上传的续传清单区分不同文件。
+    """
+
+    def __init__(
+        self,
+        chunks: AsyncIterator[bytes],
+        size: int | None = None,
+        closer: Callable[[], Awaitable[None]] | None = None,
+        source: str | None = None,
+    ):
+        self._chunks = chunks
+        self.size = size
+        self.source = source
+        self._closer = closer
+        self._consumed = False
+        self._head: bytes | None = None
+        self.bytes_read = 0
+        # 可选的增量哈希器，读取时同步更新（用于上传去重）
+        self.hasher = None
+
+    @property
+    def consumed(self) -> bool:
+        return self._consumed
+
+    async def peek(self, min_size: int) -> bytes:
+        """预读开头至少 min_size 字节（不足时为全部数据），不计为消费，之后 iter_chunks 仍从头输出"""
+        if self._consumed:
+            raise RuntimeError("媒体流已被消费")
+        if self._head is None:
+            head = b""
+            while len(head) < min_size:
+                try:
+                    head += await self._chunks.__anext__()
+                except StopAsyncIteration:
+                    break
+            self._head = head
+        return self._head
+
+    async def iter_chunks(self) -> AsyncIterator[bytes]:
+        if self._consumed:
+            raise RuntimeError("媒体流已被消费")
+        self._consumed = True
+        head, self._head = self._head, None
+        if head:
+            self.bytes_read += len(head)
+            if self.hasher is not None:
+                self.hasher.update(head)
+            yield head
+        async for chunk in self._chunks:
+            self.bytes_read += len(chunk)
+            if self.hasher is not None:
+                self.hasher.update(chunk)
+            yield chunk
+
+    async def close(self):
+        if self._closer is not None:
+            closer, self._closer = self._closer, None
+            await closer()
+
+
+async def open_url_stream(
+    session: aiohttp.ClientSession,
+    url: str,
+    chunk_size: int,
+    min_stream_size: int = 0,
+) -> bytes | MediaStream:
+    """打开远程媒体；已知体积小于 min_stream_size 时直接读入内存返回 bytes"""
+    resp = await session.get(url)
+    try:
+        resp.raise_for_status()
+        size = resp.content_length
+        if size is not None and size < min_stream_size:
+            return await resp.read()
+    except BaseException:
+        resp.release()
+        raise
+
+    async def closer():
+        resp.release()
+
+    return MediaStream(resp.content.iter_chunked(chunk_size), size=size, closer=closer, source=url)
+
+
+def open_file_stream(path: str, chunk_size: int, min_stream_size: int = 0) -> MediaStream | None:
+    """打开本地媒体文件；体积小于 min_stream_size 时返回 None，由调用方走整体读取"""
+    st = os.stat(path)
+    size = st.st_size
+    if size < min_stream_size:
+        return None
+    f = open(path, "rb")
+
+    async def chunks() -> AsyncIterator[bytes]:
+        while True:
+            chunk = await asyncio.to_thread(f.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    async def closer():
+        f.close()
+
+    return MediaStream(chunks(), size=size, closer=closer, source=f"{os.path.abspath(path)}\0{st.st_mtime_ns}")
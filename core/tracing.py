@@ -0,0 +1,172 @@
+import contextvars
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import AsyncIterator, Iterator, TypeVar
+
+from astrbot import logger
+
+from .util import format_size
+
+T = TypeVar("T")
+
+# 当前命令的追踪；asyncio 任务创建时复制上下文，批量上传中的子任务会继承
+_current: contextvars.ContextVar["Trace | None"] = contextvars.ContextVar("cloudimg_trace", default=None)
+
+
+class Span:
+    __slots__ = ("name", "label", "start", "duration", "bytes", "outcome")
+
+    def __init__(self, name: str, label: str, start: float):
+        self.name = name
+        self.label = label
+        # 相对追踪开始的偏移（秒）
+        self.start = start
+        self.duration = 0.0
+        self.bytes = 0
+        self.outcome = "ok"
+
+
+class Trace:
+    """单条命令的追踪记录，span 数量有上限，超出部分只计数"""
+
+    __slots__ = ("trace_id", "command", "detail", "started_at", "_start", "duration", "spans", "dropped", "finished", "_max_spans")
+
+    def __init__(self, command: str, detail: str = "", max_spans: int = 256):
+        self.trace_id = os.urandom(4).hex()
+        self.command = command
+        self.detail = detail
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.duration = 0.0
+        self.spans: list[Span] = []
+        self.dropped = 0
+        self.finished = False
+        self._max_spans = max_spans
+
+    def elapsed(self) -> float:
+        return self.duration if self.finished else time.perf_counter() - self._start
+
+    def _add(self, name: str, label: str, start: float) -> Span | None:
+        if self.finished:
+            return None
+        if len(self.spans) >= self._max_spans:
+            self.dropped += 1
+            return None
+        span = Span(name, label, start - self._start)
+        self.spans.append(span)
+        return span
+
+    def breakdown(self) -> str:
+        """按阶段汇总：次数、累计耗时、最长单次、字节数与失败数；并发阶段的累计耗时可能超过总耗时"""
+        phases: dict[str, list] = {}
+        for span in self.spans:
+            # [次数, 累计, 最长, 字节, 失败]
+            agg = phases.setdefault(span.name, [0, 0.0, 0.0, 0, 0])
+            agg[0] += 1
+            agg[1] += span.duration
+            agg[2] = max(agg[2], span.duration)
+            agg[3] += span.bytes
+            if span.outcome != "ok":
+                agg[4] += 1
+        lines = [f"追踪 {self.trace_id}：{self.command} 总耗时 {self.elapsed():.2f}s"]
+        for name, (count, total, longest, size, failed) in phases.items():
+            line = f"  {name} ×{count} 累计 {total:.2f}s"
+            if count > 1:
+                line += f" 最长 {longest:.2f}s"
+            if size:
+                line += f" {format_size(size)}"
+            if failed:
+                line += f" 失败 {failed}"
+            lines.append(line)
+        if self.dropped:
+            lines.append(f"  另有 {self.dropped} 个阶段未记录")
+        return "\n".join(lines)
+
+
+class Tracer:
+    """命令级追踪：最近的追踪保存在定长环形缓冲中，总耗时超过阈值时输出慢请求日志"""
+
+    def __init__(self, ring_size: int = 200, slow_threshold: float = 15, max_spans: int = 256):
+        self.recent: deque[Trace] = deque(maxlen=max(1, int(ring_size)))
+        self.slow_threshold = max(0.0, float(slow_threshold))
+        self.max_spans = max(1, int(max_spans))
+        self._traces = 0
+        self._slow = 0
+
+    def start(self, command: str, detail: str = "") -> Trace:
+        return Trace(command, detail, self.max_spans)
+
+    @contextmanager
+    def activate(self, trace: Trace) -> Iterator[Trace]:
+        """在 with 块内将 trace 设为当前追踪；块内不可跨越 yield"""
+        token = _current.set(trace)
+        try:
+            yield trace
+        finally:
+            _current.reset(token)
+
+    async def drive(self, trace: Trace, agen: AsyncIterator[T]) -> AsyncIterator[T]:
+        """逐步驱动异步生成器，仅在其执行期间激活 trace，产出的结果原样转发"""
+        try:
+            while True:
+                with self.activate(trace):
+                    try:
+                        item = await agen.__anext__()
+                    except StopAsyncIteration:
+                        return
+                yield item
+        finally:
+            await agen.aclose()
+
+    def finish(self, trace: Trace):
+        if trace.finished:
+            return
+        trace.duration = time.perf_counter() - trace._start
+        trace.finished = True
+        self.recent.append(trace)
+        self._traces += 1
+        if self.slow_threshold and trace.duration >= self.slow_threshold:
+            self._slow += 1
+            logger.warning(f"慢请求: {trace.detail}\n{trace.breakdown()}")
+
+    def stats(self) -> dict:
+        return {
+            "traces": self._traces,
+            "slow": self._slow,
+            "kept": len(self.recent),
+        }
+
+
+@contextmanager
+def trace_span(name: str, label: str = "") -> Iterator[Span | None]:
+    """记录当前追踪中的一个阶段；没有当前追踪时不做任何事并返回 None。
+
+    正常结束记为 ok，抛出异常时记为异常类名；调用方可在块内自行设置 bytes 与 outcome。
+    """
+    trace = _current.get()
+    current = trace._add(name, label, time.perf_counter()) if trace is not None else None
+    if current is None:
+        yield None
+        return
+    start = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.outcome = type(e).__name__
+        raise
+    finally:
+        current.duration = time.perf_counter() - start
+
+
+def record_span(name: str, duration: float, label: str = "", size: int = 0, outcome: str = "ok"):
+    """补记一个已结束的阶段（如排队等待、已有计时的请求）"""
+    trace = _current.get()
+    if trace is None:
+        return
+    current = trace._add(name, label, time.perf_counter() - duration)
+    if current is not None:
+        current.duration = duration
+        current.bytes = size
+        current.outcome = outcome
@@ -0,0 +1,187 @@
+import asyncio
+import importlib.util
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .util import format_size
+
+# 可重新编码的图片格式；GIF 可能为动图，不处理，WebP/PNG 动图在解码后识别并保留原图
+TRANSCODABLE_EXTS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+OUTPUT_EXTS = {"webp": ".webp", "jpeg": ".jpg"}
+
+
+def pillow_available() -> bool:
+    return importlib.util.find_spec("PIL") is not None
+
+
+def transcode_image(
+    data: bytes,
+    max_dimension: int,
+    fmt: str,
+    quality: int,
+    strip_metadata: bool,
+) -> tuple[bytes, float]:
+    """在子进程中执行：缩放并重新编码图片，返回 (新数据, CPU 耗时秒)。
+
+    动图（动态 WebP、APNG）与无法保留透明度的情况（输出 JPEG）原样返回输入数据。
+    """
+    from PIL import Image, ImageOps
+
+    start = time.process_time()
+    with Image.open(io.BytesIO(data)) as img:
+        if getattr(img, "is_animated", False):
+            return data, time.process_time() - start
+        has_alpha = "A" in img.getbands() or img.info.get("transparency") is not None
+        if not has_alpha and hasattr(img, "has_transparency_data"):
+            has_alpha = img.has_transparency_data
+        if has_alpha and fmt == "jpeg":
+            return data, time.process_time() - start
+        exif = img.info.get("exif")
+        # 先按 EXIF 方向摆正，去除元数据后方向信息不再保留
+        img = ImageOps.exif_transpose(img)
+        if max_dimension and max(img.size) > max_dimension:
+            img.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+        if fmt == "jpeg" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        elif fmt == "webp" and (has_alpha and img.mode != "RGBA" or img.mode not in ("RGB", "RGBA", "L")):
+            # 调色板透明（P + transparency）等情况需转为 RGBA，否则透明区域变为不透明
+            img = img.convert("RGBA" if has_alpha else "RGB")
+        out = io.BytesIO()
+        save_kwargs = {"quality": quality}
+        if fmt == "jpeg":
+            save_kwargs["optimize"] = True
+        else:
+            save_kwargs["method"] = 4
+        if exif and not strip_metadata:
+            save_kwargs["exif"] = exif
+        img.save(out, format=fmt.upper(), **save_kwargs)
+    return out.getvalue(), time.process_time() - start
+
+
+class TranscodeResult:
+    __slots__ = ("data", "filename", "saved", "cpu_time")
+
+    def __init__(self, data: bytes, filename: str, saved: int, cpu_time: float):
+        self.data = data
+        self.filename = filename
+        self.saved = saved
+        self.cpu_time = cpu_time
+
+
+class TranscodeTally:
+    """单条上传指令内的压缩汇总，用于回复末尾的统计"""
+
+    __slots__ = ("files", "bytes_saved", "cpu_time")
+
+    def __init__(self):
+        self.files = 0
+        self.bytes_saved = 0
+        self.cpu_time = 0.0
+
+    def add(self, result: TranscodeResult):
+        self.files += 1
+        self.bytes_saved += result.saved
+        self.cpu_time += result.cpu_time
+
+    def summary(self) -> str | None:
+        if not self.files:
+            return None
+        return f"已压缩 {self.files} 张图片，节省 {format_size(self.bytes_saved)}，CPU 耗时 {self.cpu_time:.2f}s"
+
+
+class ImageTranscoder:
+    """上传前的可选图片压缩，CPU 密集的解码/编码放在进程池中执行，不占用事件循环。
+
+    压缩后体积减少比例低于 min_savings 的文件保留原图；
+    folders_include 非空时仅对其中的文件夹生效，folders_exclude 中的文件夹始终跳过（含子目录）。
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        max_dimension: int = 2560,
+        fmt: str = "webp",
+        quality: int = 82,
+        strip_metadata: bool = True,
+        min_savings: float = 0.1,
+        min_size: int = 64 * 1024,
+        folders_include: list[str] | None = None,
+        folders_exclude: list[str] | None = None,
+    ):
+        self.max_workers = max(1, int(max_workers))
+        self.max_dimension = max(0, int(max_dimension))
+        self.fmt = fmt if fmt in OUTPUT_EXTS else "webp"
+        self.quality = min(100, max(1, int(quality)))
+        self.strip_metadata = strip_metadata
+        self.min_savings = max(0.0, float(min_savings))
+        self.min_size = max(0, int(min_size))
+        self.folders_include = [f.strip("/") for f in folders_include or [] if f.strip("/")]
+        self.folders_exclude = [f.strip("/") for f in folders_exclude or [] if f.strip("/")]
+        self._executor: ProcessPoolExecutor | None = None
+        self._transcoded = 0
+        self._skipped = 0
+        self._failed = 0
+        self._bytes_in = 0
+        self._bytes_out = 0
+        self._cpu_time = 0.0
+
+    @staticmethod
+    def _matches(folder: str, patterns: list[str]) -> bool:
+        return any(folder == p or folder.startswith(p + "/") for p in patterns)
+
+    def applies_to(self, folder: str) -> bool:
+        folder = (folder or "").strip("/")
+        if self._matches(folder, self.folders_exclude):
+            return False
+        return not self.folders_include or self._matches(folder, self.folders_include)
+
+    async def transcode(self, data: bytes, filename: str | None, folder: str) -> TranscodeResult | None:
+        """压缩图片，不适用或收益不足时返回 None"""
+        name = filename or "upload.jpg"
+        base, ext = os.path.splitext(name)
+        if ext.lower() not in TRANSCODABLE_EXTS or len(data) < self.min_size or not self.applies_to(folder):
+            return None
+
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        loop = asyncio.get_running_loop()
+        try:
+            output, cpu_time = await loop.run_in_executor(
+                self._executor,
+                transcode_image,
+                data,
+                self.max_dimension,
+                self.fmt,
+                self.quality,
+                self.strip_metadata,
+            )
+        except Exception:
+            self._failed += 1
+            raise
+        self._cpu_time += cpu_time
+
+        saved = len(data) - len(output)
+        if output == data or saved < len(data) * self.min_savings:
+            self._skipped += 1
+            return None
+        self._transcoded += 1
+        self._bytes_in += len(data)
+        self._bytes_out += len(output)
+        return TranscodeResult(output, f"{base or 'upload'}{OUTPUT_EXTS[self.fmt]}", saved, cpu_time)
+
+    def stats(self) -> dict:
+        return {
+            "transcoded": self._transcoded,
+            "skipped": self._skipped,
+            "failed": self._failed,
+            "bytes_in": self._bytes_in,
+            "bytes_out": self._bytes_out,
+            "cpu_s": round(self._cpu_time, 3),
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,124 @@
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+from astrbot import logger
+
+
+def parse_active_hours(spec: str | None) -> tuple[int, int] | None:
+    """解析 "8-24" 形式的活跃时段（本地时间，左闭右开，可跨零点如 "22-2"），为空或无效时返回 None 表示全天"""
+    if not spec or "-" not in spec:
+        return None
+    try:
+        start, end = (int(part) for part in spec.split("-", 1))
+    except ValueError:
+        return None
+    if not (0 <= start <= 24 and 0 <= end <= 24) or start % 24 == end % 24:
+        return None
+    return start % 24, end % 24
+
+
+def in_active_hours(window: tuple[int, int] | None, hour: int) -> bool:
+    if window is None:
+        return True
+    start, end = window
+    if start < end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+class ConnectionWarmer:
+    """图床连接预热与保活。
+
+    插件加载时预解析域名、并发发起几次轻量请求以建立连接池中的长连接并唤醒 Worker；
+    之后在活跃时段内低频发送保活请求，最近已有真实请求时跳过，避免连接与 Worker 在空闲时冷却。
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        ping: Callable[[], Awaitable[None]],
+        connections: int = 2,
+        interval: float = 50,
+        active_hours: tuple[int, int] | None = None,
+    ):
+        self.host = host
+        self.port = port
+        self._ping = ping
+        self.connections = max(1, int(connections))
+        self.interval = max(0.0, float(interval))
+        self.active_hours = active_hours
+        self._last_activity = 0.0
+        self._task: asyncio.Task | None = None
+        self._warmups = 0
+        self._pings = 0
+        self._skipped = 0
+        self._failures = 0
+        self._last_ping_ms: float | None = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def touch(self):
+        """记录一次真实请求，保活计时从此刻重新开始"""
+        self._last_activity = time.monotonic()
+
+    async def warm_up(self):
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            await loop.getaddrinfo(self.host, self.port)
+        except Exception as e:
+            logger.warning(f"图床域名预解析失败: host={self.host}, err={type(e).__name__}")
+        dns_ms = (time.perf_counter() - start) * 1000
+        # 并发请求使连接池同时建立多条连接
+        results = await asyncio.gather(*(self._ping_once() for _ in range(self.connections)))
+        self._warmups += 1
+        logger.info(
+            f"图床连接预热完成: host={self.host}, dns={dns_ms:.0f}ms, "
+            f"成功 {sum(results)}/{self.connections}, 总耗时 {(time.perf_counter() - start) * 1000:.0f}ms"
+        )
+
+    async def _ping_once(self) -> bool:
+        start = time.perf_counter()
+        try:
+            await self._ping()
+        except Exception as e:
+            self._failures += 1
+            logger.debug(f"图床保活请求失败: err={type(e).__name__}")
+            return False
+        self._pings += 1
+        self._last_ping_ms = (time.perf_counter() - start) * 1000
+        self._last_activity = time.monotonic()
+        return True
+
+    async def _run(self):
+        if in_active_hours(self.active_hours, time.localtime().tm_hour):
+            await self.warm_up()
+        if not self.interval:
+            return
+        while True:
+            await asyncio.sleep(self.interval)
+            if not in_active_hours(self.active_hours, time.localtime().tm_hour):
+                continue
+            if time.monotonic() - self._last_activity < self.interval:
+                self._skipped += 1
+                continue
+            await self._ping_once()
+
+    def stats(self) -> dict:
+        return {
+            "warmups": self._warmups,
+            "pings": self._pings,
+            "skipped": self._skipped,
+            "failures": self._failures,
+            "last_ping_ms": round(self._last_ping_ms, 1) if self._last_ping_ms is not None else None,
+        }
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
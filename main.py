@@ -3,17 +3,53 @@ from astrbot.api.event import filter, AstrMessageEvent, MessageEventResult
 from astrbot.api.star import Context, Star, StarTools, register
 import asyncio
 import aiohttp
+import functools
 import os
 import json
 import re
 import string
 import random
+import time
+from typing import Awaitable, Callable
 from urllib.parse import urlparse
 from astrbot import logger
-from astrbot.api.message_components import Video, Reply as ApiReply
+from astrbot.api.message_components import Node, Nodes, Video, Reply as ApiReply
 from astrbot.core.message.components import Image, Plain, Reply
 from astrbot.core.platform.astr_message_event import AstrMessageEvent as BaseAstrMessageEvent
 
+from .core.backends import Backend, BackendRouter, parse_backends
+from .core.chunked_upload import ChunkedUploader
+from .core.http_pool import HttpSessionPool
+from .core.deadline import Deadline, DeadlineExceeded
+from .core.dispatch import KeywordDispatchIndex, parse_aliases
+from .core.dedup import UploadDedupIndex, content_digest, new_hasher
+from .core.file_resolver import FileUrlResolver
+from .core.forward_cache import ForwardRefCache
+from .core.keyword_store import KeywordMappingStore
+from .core.manifest import FolderManifestIndex, classify_media_kind
+from .core.media_cache import MediaDiskCache
+from .core.metrics import Metrics
+from .core.offload import BlockingOffloader
+from .core.prefetch import RandomPathPrefetcher
+from .core.progress import BatchProgress, format_index_ranges
+from .core.ratelimit import CommandRateLimiter
+from .core.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    HttpStatusError,
+    RetryPolicy,
+    is_idempotent_retryable,
+    is_server_failure,
+    is_upload_retryable,
+    retry_call,
+)
+from .core.scheduler import FairScheduler, SchedulerClosedError
+from .core.sniff import MEDIA_TYPES, SNIFF_BYTES, UnsupportedMediaError, sniff_media
+from .core.streaming import MediaStream, open_file_stream, open_url_stream
+from .core.tracing import Tracer, record_span, trace_span
+from .core.warmup import ConnectionWarmer, parse_active_hours
+from .core.transcode import ImageTranscoder, TranscodeTally, pillow_available
+
 
 @register("astrbot_plugin_CloudImg", "Foolllll", "获取随机媒体及上传图片/视频到CloudFlare图床。使用指令可获取随机媒体，使用 /上传 文件夹名 回复图片或视频消息进行上传。", "1.3", "https://github.com/Foolllll-J/astrbot_plugin_CloudImg")
 class CloudImgPlugin(Star):
@@ -31,37 +67,293 @@ class CloudImgPlugin(Star):
 
         os.makedirs(self.plugin_data_dir, exist_ok=True)
 
+        metrics_conf = config.get("metrics", {}) or {}
+        self.metrics = Metrics()
+        self.metrics_dump_interval = max(0, int(metrics_conf.get("prometheus_dump_s", 0)))
+        self.metrics_dump_path = os.path.join(self.plugin_data_dir, "metrics.prom")
+        self._metrics_task: asyncio.Task | None = None
+
+        tracing_conf = config.get("tracing", {}) or {}
+        self.tracer = Tracer(
+            ring_size=tracing_conf.get("ring_size", 200),
+            slow_threshold=tracing_conf.get("slow_threshold_s", 15),
+        )
+
+        offload_conf = config.get("offload", {}) or {}
+        self.offload = BlockingOffloader(
+            max_workers=offload_conf.get("max_workers", 4),
+            inline_threshold=max(0, int(offload_conf.get("inline_threshold_kb", 64))) * 1024,
+        )
+
+        network_conf = config.get("network", {}) or {}
+        self.http = HttpSessionPool(
+            limit=network_conf.get("limit", 64),
+            limit_per_host=network_conf.get("limit_per_host", 8),
+            dns_cache_ttl=network_conf.get("dns_cache_ttl", 300),
+            keepalive_timeout=network_conf.get("keepalive_timeout", 60),
+            on_response=self._on_http_response,
+            imgbed_verify_ssl=network_conf.get("imgbed_verify_ssl", False),
+        )
+
+        timeout_conf = config.get("timeouts", {}) or {}
+        self.upload_command_timeout = timeout_conf.get("upload_command_s", 600)
+        self.phase_budgets = {
+            "get_msg": timeout_conf.get("get_msg_s", 10),
+            "get_forward_msg": timeout_conf.get("get_forward_msg_s", 30),
+            "get_file": timeout_conf.get("get_file_s", 15),
+            "download": timeout_conf.get("download_s", 120),
+            "upload": timeout_conf.get("upload_s", 180),
+        }
+
+        resilience_conf = config.get("resilience", {}) or {}
+        self.get_retry = RetryPolicy(
+            attempts=resilience_conf.get("retry_attempts", 3),
+            base_delay=resilience_conf.get("retry_base_delay_ms", 200) / 1000,
+            max_delay=resilience_conf.get("retry_max_delay_ms", 2000) / 1000,
+            budget=resilience_conf.get("retry_budget_s", 10),
+        )
+        self.upload_retry = RetryPolicy(
+            attempts=resilience_conf.get("upload_retry_attempts", 2),
+            base_delay=resilience_conf.get("retry_base_delay_ms", 200) / 1000,
+            max_delay=resilience_conf.get("retry_max_delay_ms", 2000) / 1000,
+            budget=resilience_conf.get("retry_budget_s", 10),
+        )
+        self.imgbed_breaker = CircuitBreaker(
+            "imgbed",
+            failure_threshold=resilience_conf.get("breaker_failure_threshold", 5),
+            recovery_timeout=resilience_conf.get("breaker_recovery_s", 30),
+        )
+
+        def breaker_for(name: str, primary: bool) -> CircuitBreaker:
+            # 主图床沿用原有熔断器，镜像实例各自独立熔断
+            if primary:
+                return self.imgbed_breaker
+            return CircuitBreaker(
+                name,
+                failure_threshold=resilience_conf.get("breaker_failure_threshold", 5),
+                recovery_timeout=resilience_conf.get("breaker_recovery_s", 30),
+            )
+
+        backends_conf = config.get("backends", {}) or {}
+        self.mirror_upload = backends_conf.get("mirror_upload", False)
+        self.backends = BackendRouter(
+            parse_backends(self.base_url, self.auth_code, backends_conf.get("mirrors", []), breaker_for),
+            alpha=backends_conf.get("ewma_alpha", 0.3),
+            explore=backends_conf.get("explore", 0.05),
+        )
+
+        warmup_conf = config.get("warmup", {}) or {}
+        self.warmup_path = warmup_conf.get("path", "/") or "/"
+        # 主机 -> 预热器；主图床与各镜像实例分别预热，同一主机只预热一次
+        self.warmers: dict[str, ConnectionWarmer] = {}
+        if warmup_conf.get("enabled", False):
+            for backend in self.backends.backends:
+                parsed = urlparse(backend.base_url)
+                if not parsed.hostname or parsed.hostname in self.warmers:
+                    continue
+                self.warmers[parsed.hostname] = ConnectionWarmer(
+                    parsed.hostname,
+                    parsed.port or (443 if parsed.scheme == "https" else 80),
+                    functools.partial(self._ping_imgbed, backend),
+                    connections=warmup_conf.get("connections", 2),
+                    interval=warmup_conf.get("keepalive_interval_s", 50),
+                    active_hours=parse_active_hours(warmup_conf.get("active_hours", "8-24")),
+                )
+
+        streaming_conf = config.get("streaming", {}) or {}
+        self.streaming_enabled = streaming_conf.get("enabled", False)
+        self.stream_chunk_size = max(16, int(streaming_conf.get("chunk_size_kb", 256))) * 1024
+        self.stream_min_size = max(0, int(streaming_conf.get("min_size_mb", 8))) * 1024 * 1024
+
+        chunked_conf = config.get("chunked_upload", {}) or {}
+        self.chunked_uploader: ChunkedUploader | None = None
+        if chunked_conf.get("enabled", False):
+            self.chunked_uploader = ChunkedUploader(
+                os.path.join(self.plugin_data_dir, "chunked_uploads"),
+                self._post_upload_form,
+                retry_policy=self.upload_retry,
+                breaker=self.imgbed_breaker,
+                threshold=max(1, int(chunked_conf.get("threshold_mb", 50))) * 1024 * 1024,
+                chunk_size=max(1, int(chunked_conf.get("chunk_size_mb", 8))) * 1024 * 1024,
+                parallel=chunked_conf.get("parallel", 3),
+                resume_ttl=chunked_conf.get("resume_ttl_s", 3600),
+            )
+
+        transcode_conf = config.get("transcode", {}) or {}
+        self.transcoder: ImageTranscoder | None = None
+        if transcode_conf.get("enabled", False):
+            if pillow_available():
+                self.transcoder = ImageTranscoder(
+                    max_workers=transcode_conf.get("max_workers", 2),
+                    max_dimension=transcode_conf.get("max_dimension", 2560),
+                    fmt=transcode_conf.get("format", "webp"),
+                    quality=transcode_conf.get("quality", 82),
+                    strip_metadata=transcode_conf.get("strip_metadata", True),
+                    min_savings=transcode_conf.get("min_savings_percent", 10) / 100,
+                    min_size=max(0, int(transcode_conf.get("min_size_kb", 64))) * 1024,
+                    folders_include=transcode_conf.get("folders_include", []),
+                    folders_exclude=transcode_conf.get("folders_exclude", []),
+                )
+            else:
+                logger.warning("已开启上传前图片压缩，但未安装 Pillow，压缩功能不可用")
+
+        scheduler_conf = config.get("scheduler", {}) or {}
+        self.upload_scheduler = FairScheduler(
+            scheduler_conf.get("max_concurrency", 4),
+            on_wait=lambda waited: self._on_queue_wait("upload", waited),
+        )
+        self.download_scheduler = FairScheduler(
+            scheduler_conf.get("download_concurrency", 4),
+            on_wait=lambda waited: self._on_queue_wait("download", waited),
+        )
+        self.pipeline_buffer = max(1, int(scheduler_conf.get("pipeline_buffer", 8)))
+
+        progress_conf = config.get("progress", {}) or {}
+        self.progress_enabled = progress_conf.get("enabled", False)
+        self.progress_min_batch = max(1, int(progress_conf.get("min_batch", 10)))
+        self.progress_every = max(1, int(progress_conf.get("every", 10)))
+        self.progress_interval = max(1, int(progress_conf.get("interval_s", 15)))
+        self.progress_inline_links = max(1, int(progress_conf.get("inline_links", 10)))
+        self.progress_forward_links = progress_conf.get("forward_links", False)
+
+        dedup_conf = config.get("dedup", {}) or {}
+        self.dedup: UploadDedupIndex | None = None
+        if dedup_conf.get("enabled", False):
+            self.dedup = UploadDedupIndex(
+                os.path.join(self.plugin_data_dir, "upload_dedup.json"),
+                max_entries=dedup_conf.get("max_entries", 20000),
+                writer=lambda path, obj: self.offload.write_json(path, obj, size_hint=len(obj) * 96, ensure_ascii=False),
+            )
+
+        resolver_conf = config.get("resolver", {}) or {}
+        self.file_resolver = FileUrlResolver(
+            ttl=resolver_conf.get("ttl", 300),
+            max_entries=resolver_conf.get("max_entries", 5000),
+            concurrency=resolver_conf.get("max_concurrency", 4),
+        )
+
+        rate_limit_conf = config.get("rate_limit", {}) or {}
+        self.rate_limiter: CommandRateLimiter | None = None
+        self.rate_limit_notice_cooldown = max(0, int(rate_limit_conf.get("notice_cooldown_s", 60)))
+        if rate_limit_conf.get("enabled", False):
+            self.rate_limiter = CommandRateLimiter(
+                chat=(rate_limit_conf.get("chat_per_minute", 20), rate_limit_conf.get("chat_burst", 5)),
+                user=(rate_limit_conf.get("user_per_minute", 6), rate_limit_conf.get("user_burst", 3)),
+                global_=(rate_limit_conf.get("global_per_minute", 120), rate_limit_conf.get("global_burst", 20)),
+                mode=rate_limit_conf.get("mode", "notify"),
+                max_queue_wait=rate_limit_conf.get("max_queue_s", 3),
+            )
+
+        forward_cache_conf = config.get("forward_cache", {}) or {}
+        self.forward_cache = ForwardRefCache(
+            ttl=forward_cache_conf.get("ttl", 600),
+            max_entries=forward_cache_conf.get("max_entries", 64),
+            max_refs=forward_cache_conf.get("max_refs", 20000),
+        )
+
+        dispatch_conf = config.get("dispatch", {}) or {}
+        self.keyword_case_fold = dispatch_conf.get("case_fold", False)
+        self.keyword_aliases = parse_aliases(dispatch_conf.get("aliases", []))
+
         self.keyword_folder_map = {}
         self.mappings_file = os.path.join(self.plugin_data_dir, "keyword_mappings.json")
-        self.load_keyword_mappings()
+        self.keyword_store = KeywordMappingStore(
+            os.path.join(self.plugin_data_dir, "keyword_mappings.db"),
+            legacy_json_path=self.mappings_file,
+        )
+        self._mappings_loaded = False
+        self._mappings_lock = asyncio.Lock()
+        self._rebuild_dispatch_index()
+
+        prefetch_conf = config.get("prefetch", {}) or {}
+        self.prefetcher: RandomPathPrefetcher | None = None
+        if prefetch_conf.get("enabled", False):
+            self.prefetcher = RandomPathPrefetcher(
+                self._prefetch_random_path,
+                depth=prefetch_conf.get("depth", 5),
+                low_water=prefetch_conf.get("low_water", 2),
+                refill_concurrency=prefetch_conf.get("refill_concurrency", 2),
+                idle_ttl=prefetch_conf.get("idle_ttl", 600),
+                warm_limit=prefetch_conf.get("warm_limit", 20),
+            )
+        self.prefetch_warm_keywords = prefetch_conf.get("warm_keywords", True)
+
+        manifest_conf = config.get("manifest", {}) or {}
+        self.manifest_list_path = manifest_conf.get("list_path", "/api/manage/list")
+        self.manifest_page_size = max(1, int(manifest_conf.get("page_size", 1000)))
+        self.manifest: FolderManifestIndex | None = None
+        if manifest_conf.get("enabled", False):
+            persist_dir = None
+            if manifest_conf.get("persist", True):
+                persist_dir = os.path.join(self.plugin_data_dir, "manifests")
+            self.manifest = FolderManifestIndex(
+                self._list_folder_files,
+                persist_dir=persist_dir,
+                ttl=manifest_conf.get("ttl", 1800),
+            )
 
-    # ==================== 配置文件管理 ====================
+        media_cache_conf = config.get("media_cache", {}) or {}
+        self.media_cache: MediaDiskCache | None = None
+        if media_cache_conf.get("enabled", False):
+            self.media_cache = MediaDiskCache(
+                os.path.join(self.plugin_data_dir, "media_cache"),
+                self._fetch_cache_media,
+                max_bytes=max(1, int(media_cache_conf.get("max_size_mb", 512))) * 1024 * 1024,
+                max_file_bytes=max(1, int(media_cache_conf.get("max_file_mb", 20))) * 1024 * 1024,
+                admit_after=media_cache_conf.get("admit_after", 2),
+            )
 
-    def load_keyword_mappings(self):
-        """从文件加载关键词-文件夹映射"""
+        # 映射在后台懒加载，不阻塞插件初始化；无事件循环时延后到首次使用
         try:
-            if os.path.exists(self.mappings_file):
-                with open(self.mappings_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.keyword_folder_map = {}
-                    for keyword, value in data.items():
-                        if isinstance(value, str):
-                            self.keyword_folder_map[keyword] = {"folder": value, "content_type": "image,video"}
-                        else:
-                            self.keyword_folder_map[keyword] = value
-            else:
-                self.keyword_folder_map = {}
-        except Exception as e:
-            logger.error(f"加载关键词映射失败: {e}")
-            self.keyword_folder_map = {}
+            loop = asyncio.get_running_loop()
+            loop.create_task(self.load_keyword_mappings())
+            if self.metrics_dump_interval:
+                self._metrics_task = loop.create_task(self._metrics_dump_loop())
+            for warmer in self.warmers.values():
+                warmer.start()
+        except RuntimeError:
+            pass
 
-    def save_keyword_mappings(self):
-        """保存关键词-文件夹映射到文件"""
-        try:
-            with open(self.mappings_file, 'w', encoding='utf-8') as f:
-                json.dump(self.keyword_folder_map, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"保存关键词映射失败: {e}")
+    # ==================== 配置文件管理 ====================
+
+    async def load_keyword_mappings(self):
+        """加载关键词-文件夹映射（仅首次调用时读取存储，并自动迁移旧版 JSON 文件）"""
+        if self._mappings_loaded:
+            return
+        async with self._mappings_lock:
+            if self._mappings_loaded:
+                return
+            try:
+                mappings = await self.keyword_store.load()
+                if self.keyword_store.migrated:
+                    logger.info(f"已将 {self.keyword_store.migrated} 条关键词映射从 JSON 迁移到 SQLite")
+            except Exception as e:
+                logger.error(f"加载关键词映射失败: {e}")
+                mappings = {}
+            # 加载期间通过指令修改的映射优先
+            mappings.update(self.keyword_folder_map)
+            self.keyword_folder_map = mappings
+            self._mappings_loaded = True
+            self._rebuild_dispatch_index()
+            self._warm_prefetch()
+
+    def _rebuild_dispatch_index(self):
+        """映射变更后重建动态指令分发索引"""
+        self.dispatch_index = KeywordDispatchIndex(
+            self.keyword_folder_map,
+            case_fold=self.keyword_case_fold,
+            aliases=self.keyword_aliases,
+        )
+
+    def save_keyword_mappings(self, *keywords: str):
+        """记录指定关键词的映射变更，由存储延迟合并后在一个事务内写入"""
+        for keyword in keywords:
+            mapping = self.keyword_folder_map.get(keyword)
+            if mapping is None:
+                self.keyword_store.delete(keyword)
+            else:
+                self.keyword_store.put(keyword, mapping)
+        self._rebuild_dispatch_index()
 
     # ==================== 核心功能方法 ====================
 
@@ -80,6 +372,7 @@ class CloudImgPlugin(Star):
         }
         
         friendly_msg = error_map.get(status, f"未知错误 (HTTP {status})")
+        self.metrics.inc("imgbed_errors", label=str(status))
         logger.error(f"API 请求失败: status={status}, response={response_text}")
         return f"操作失败: {friendly_msg}"
 
@@ -97,56 +390,329 @@ class CloudImgPlugin(Star):
         if self.local_random_type and "," in content_type:
             types = [t.strip() for t in content_type.split(",") if t.strip()]
             if len(types) > 1:
+                # 有文件清单时排除文件夹中不存在的类型，避免抽中空类型
+                manifest = self.manifest.get(folder_name) if self.manifest else None
+                if manifest is not None:
+                    types = [t for t in types if manifest.count(t) > 0] or types
                 content_type = random.choice(types)
                 logger.debug(f"本地随机媒体类型: 选中 {content_type}")
 
-        api_request_url = f"{self.base_url}/random?form=text&content={content_type}"
+        # 路径与提供它的实例一同保存，文件从该实例获取，避免镜像实例尚未同步该文件
+        relative_file_path = None
+        backend = None
+        source = "manifest"
+        if self.manifest:
+            sampled = self.manifest.sample(folder_name, content_type)
+            if sampled:
+                name, listed_by = sampled
+                lister = self.backends.get(listed_by)
+                if lister is not None and not lister.ejected:
+                    backend, relative_file_path = lister, f"/file/{name}"
+        if relative_file_path is None and self.prefetcher:
+            source = "prefetch"
+            prefetched = self.prefetcher.take(folder_name, content_type)
+            if prefetched is not None and not prefetched[0].ejected:
+                backend, relative_file_path = prefetched
+        local_path = None
+        if relative_file_path is None:
+            source = "api"
+            with trace_span("random_api", folder_name):
+                relative_file_path, err, backend = await self._fetch_random_path(folder_name, content_type)
+            if err:
+                # 图床异常时从该文件夹已缓存的文件中返回一个
+                cached = self.media_cache.fallback(folder_name, content_type) if self.media_cache else None
+                if cached is None:
+                    return err
+                source = "cache_fallback"
+                relative_file_path, local_path = cached
+                logger.info(f"图床请求失败，使用本地缓存: folder={folder_name}")
+        if local_path is None and self.media_cache:
+            local_path = self.media_cache.lookup(relative_file_path)
+            if local_path is None:
+                self.media_cache.offer(relative_file_path, folder_name)
+        self.metrics.inc("random_served", label=source)
+
+        file_url = f"{(backend or self.backends.pick_read()).base_url}{relative_file_path}"
+        is_video = classify_media_kind(relative_file_path) == "video"
+
+        # 命中本地缓存时直接发送本地文件，平台无需再从图床拉取
+        if local_path is not None:
+            return [Video.fromFileSystem(local_path) if is_video else Image.fromFileSystem(local_path)]
+
+        # 根据文件扩展名判断是图片还是视频
+        if is_video:
+            # 视频文件
+            chain = [
+                Video.fromURL(file_url)
+            ]
+        else:
+            # 图片文件
+            chain = [
+                Image.fromURL(file_url)
+            ]
+
+        return chain
+
+    async def _fetch_random_path(
+        self, folder_name: str, content_type: str
+    ) -> tuple[str | None, str | None, Backend | None]:
+        """按延迟依次尝试可读实例的随机接口，返回 (相对路径, 错误提示, 提供路径的实例)"""
+        err = "\n请求图床失败。请检查网络连接、base_url 和文件夹名是否正确。"
+        for backend in self.backends.read_order():
+            relative_file_path, err, failover = await self._fetch_random_path_from(backend, folder_name, content_type)
+            if not failover:
+                return relative_file_path, err, backend
+            logger.warning(f"图床实例不可用，尝试下一个: backend={backend.name}")
+        return None, err, None
+
+    async def _fetch_random_path_from(
+        self, backend: Backend, folder_name: str, content_type: str
+    ) -> tuple[str | None, str | None, bool]:
+        """请求单个实例的随机接口，返回 (相对路径, 错误提示, 是否应转移到其他实例)"""
+        api_request_url = f"{backend.base_url}/random?form=text&content={content_type}"
         if folder_name:
             api_request_url += f"&dir={folder_name}"
 
-        # 创建不验证SSL的连接上下文
-        ssl_context = aiohttp.TCPConnector(verify_ssl=False)
-        async with aiohttp.ClientSession(connector=ssl_context) as session:
+        async def request() -> str:
+            session = await self.http.imgbed()
+            async with session.get(api_request_url) as response:
+                response_text = await response.text()
+                # 检查HTTP状态码
+                if response.status != 200:
+                    raise HttpStatusError(response.status, response_text)
+                return response_text
+
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            relative_file_path = await retry_call(request, self.get_retry, is_idempotent_retryable, backend.breaker)
+            outcome = "ok"
+            return relative_file_path.strip(), None, False
+        except CircuitOpenError:
+            outcome = "circuit_open"
+            return None, "\n图床暂时不可用，请稍后再试。", True
+        except HttpStatusError as e:
+            return None, self._handle_response_error(e.status, e.text), is_server_failure(e)
+        except Exception as e:
+            logger.error(f"请求图床异常: backend={backend.name}, err={e}")
+            return None, "\n请求图床失败。请检查网络连接、base_url 和文件夹名是否正确。", is_server_failure(e)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.metrics.inc("random_requests", label=outcome)
+            self.metrics.observe("random_latency", elapsed)
+            if outcome != "circuit_open":
+                self.backends.record(backend, elapsed, outcome == "ok")
+                self.metrics.observe("backend_latency", elapsed, label=backend.name)
+
+    async def _prefetch_random_path(self, folder_name: str, content_type: str) -> tuple[Backend, str] | None:
+        """预取缓冲使用的取数函数，返回 (提供路径的实例, 相对路径)，失败时返回 None"""
+        if not self.base_url:
+            return None
+        relative_file_path, err, backend = await self._fetch_random_path(folder_name, content_type)
+        if err:
+            return None
+        return backend, relative_file_path
+
+    async def _ping_imgbed(self, backend: Backend):
+        """预热与保活使用的轻量请求，只读取响应头；与其他图床请求共用同一连接池与 SSL 设置，预热的连接可被复用"""
+        session = await self.http.imgbed()
+        async with session.head(f"{backend.base_url}{self.warmup_path}", allow_redirects=False) as resp:
+            if resp.status >= 500:
+                raise HttpStatusError(resp.status, "")
+
+    def _on_http_response(self, pool: str, host: str, cold: bool, elapsed: float):
+        """按是否新建连接分别记录首字节延迟，用于观察预热与保活的效果"""
+        self.metrics.observe("http_ttfb", elapsed, label=f"{pool}:{'cold' if cold else 'warm'}")
+        warmer = self.warmers.get(host) if pool == HttpSessionPool.IMGBED else None
+        if warmer:
+            warmer.touch()
+
+    async def _fetch_cache_media(self, relative_file_path: str) -> bytes | None:
+        """为媒体缓存下载图床文件，超过单文件上限时放弃；实例不可达或尚未同步（404）时尝试下一个可读实例"""
+        limit = self.media_cache.max_file_bytes if self.media_cache else 0
+        session = await self.http.imgbed()
+        for backend in self.backends.read_order():
             try:
-                async with session.get(api_request_url) as response:
-                    # 检查HTTP状态码
+                async with session.get(f"{backend.base_url}{relative_file_path}") as resp:
+                    if resp.status == 404:
+                        continue
+                    if resp.status != 200:
+                        return None
+                    if limit and resp.content_length and resp.content_length > limit:
+                        return None
+                    data = await resp.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # 单个实例连接失败或超时时尝试下一个可读实例
+                self.backends.record(backend, None, False)
+                self.metrics.inc("cache_fetch_failures", label=backend.name)
+                logger.debug(f"媒体缓存下载失败: backend={backend.name}, err={type(e).__name__}")
+                continue
+            self.metrics.inc("download_bytes", len(data))
+            return data
+        return None
+
+    async def _list_folder_files(self, folder_name: str, etag: str | None) -> tuple[list | None, str | None, str]:
+        """通过图床列表接口分页拉取文件夹（含子目录）内的文件，返回 (文件列表, etag, 实例地址)，未修改时文件列表为 None"""
+        if not self.base_url:
+            raise RuntimeError("未配置 base_url")
+
+        # 分页期间固定使用同一实例，避免不同实例的列表不一致
+        backend = self.backends.pick_read()
+        list_url = f"{backend.base_url}{self.manifest_list_path}"
+        files: list[tuple[str, str | None, float]] = []
+        new_etag = None
+        start = 0
+        while True:
+            params = {
+                "dir": folder_name,
+                "start": start,
+                "count": self.manifest_page_size,
+                "recursive": "true",
+            }
+            if backend.auth_code:
+                params["authCode"] = backend.auth_code
+            headers = {"If-None-Match": etag} if etag and start == 0 else None
+
+            async def request() -> tuple[int, object, str | None]:
+                session = await self.http.imgbed()
+                async with session.get(list_url, params=params, headers=headers) as response:
+                    if response.status == 304:
+                        return 304, None, etag
                     if response.status != 200:
-                        response_text = await response.text()
-                        return self._handle_response_error(response.status, response_text)
+                        raise HttpStatusError(response.status, await response.text())
+                    return 200, await response.json(content_type=None), response.headers.get("ETag")
 
-                    relative_file_path = await response.text()
-                    relative_file_path = relative_file_path.strip()
+            try:
+                status, data, page_etag = await retry_call(request, self.get_retry, is_idempotent_retryable, backend.breaker)
+            except HttpStatusError as e:
+                raise RuntimeError(self._handle_response_error(e.status, e.text)) from e
+            if start == 0:
+                if status == 304:
+                    return None, etag, backend.base_url
+                new_etag = page_etag
+
+            items = data.get("files") if isinstance(data, dict) else None
+            if not isinstance(items, list):
+                break
+            for item in items:
+                if not isinstance(item, dict) or not item.get("name"):
+                    continue
+                metadata = item.get("metadata") or {}
+                try:
+                    mtime = float(metadata.get("TimeStamp") or 0)
+                except (TypeError, ValueError):
+                    mtime = 0.0
+                files.append((item["name"], metadata.get("FileType"), mtime))
+            if len(items) < self.manifest_page_size:
+                break
+            start += len(items)
 
-                    file_url = f"{self.base_url}{relative_file_path}"
+        return files, new_etag, backend.base_url
 
-                    # 根据文件扩展名判断是图片还是视频
-                    if any(file_url.lower().endswith(ext) for ext in ['.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.webm']):
-                        # 视频文件
-                        chain = [
-                            Video.fromURL(file_url)
-                        ]
-                    else:
-                        # 图片文件
-                        chain = [
-                            Image.fromURL(file_url)
-                        ]
+    def _choose_folder(self, folders: list[str] | tuple[str, ...], content_type: str) -> str:
+        """从多个文件夹中随机选择一个，有文件清单时按实际文件数加权"""
+        if self.manifest and len(folders) > 1:
+            counts = [self.manifest.count(f, content_type) for f in folders]
+            if all(c is not None for c in counts) and sum(counts) > 0:
+                return random.choices(folders, weights=counts)[0]
+        return random.choice(folders)
 
-                    return chain
+    @staticmethod
+    def _mapping_targets(mapping) -> list[tuple[str, str]]:
+        """关键词映射指向的 (文件夹, 内容类型) 列表"""
+        if isinstance(mapping, dict):
+            folder_name_raw = mapping.get("folder", "")
+            content_type = mapping.get("content_type", "image,video")
+        else:
+            folder_name_raw = mapping or ""
+            content_type = "image,video"
+        return [(f.strip(), content_type) for f in folder_name_raw.replace('，', ',').split(',') if f.strip()]
+
+    def _iter_prefetch_targets(self, keywords: list[str] | None = None):
+        """列出需要预热的 (文件夹, 内容类型)：未指定关键词时为 /img 根目录及所有关键词映射目标"""
+        if keywords is None:
+            targets = [("", "image,video")]
+            mappings = list(self.keyword_folder_map.values())
+        else:
+            targets = []
+            mappings = [self.keyword_folder_map[k] for k in keywords if k in self.keyword_folder_map]
+        for mapping in mappings:
+            targets.extend(self._mapping_targets(mapping))
 
-            except Exception as e:
-                logger.error(f"请求图床异常: {e}")
-                return "\n请求图床失败。请检查网络连接、base_url 和文件夹名是否正确。"
+        for folder, content_type in targets:
+            types = [t.strip() for t in content_type.split(",") if t.strip()]
+            # 本地随机类型开启时，实际请求的是拆分后的单一类型
+            if self.local_random_type and len(types) > 1:
+                for t in types:
+                    yield folder, t
+            else:
+                yield folder, content_type
+
+    def _warm_prefetch(self, keywords: list[str] | None = None):
+        if self.prefetcher and self.base_url and self.prefetch_warm_keywords:
+            # 保持顺序，预热数量达到上限时优先 /img 根目录与靠前的映射
+            self.prefetcher.warm(dict.fromkeys(self._iter_prefetch_targets(keywords)))
+
+    def _on_mapping_changed(self, keyword: str, old_mapping):
+        """映射变更后丢弃不再被任何映射引用的文件夹缓冲，并只预热该关键词"""
+        if not self.prefetcher:
+            return
+        referenced = {folder for folder, _ in self._iter_prefetch_targets()}
+        for folder, _ in self._mapping_targets(old_mapping):
+            if folder not in referenced:
+                self.prefetcher.discard(folder)
+        self._warm_prefetch([keyword])
 
     async def download_image(self, url: str) -> bytes | None:
         """下载图片并返回字节数据"""
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as resp:
-                    resp.raise_for_status()
-                    return await resp.read()
-        except Exception as e:
-            logger.error(f"图片下载失败: url={self._redact_url_for_log(url)}, err={type(e).__name__}")
-            return None
+        async def request() -> bytes:
+            session = await self.http.cdn()
+            async with session.get(url) as resp:
+                resp.raise_for_status()
+                return await resp.read()
+
+        start = time.perf_counter()
+        with trace_span("download") as span:
+            try:
+                data = await retry_call(request, self.get_retry, is_idempotent_retryable)
+            except Exception as e:
+                logger.error(f"图片下载失败: url={self._redact_url_for_log(url)}, err={type(e).__name__}")
+                self.metrics.inc("downloads", label="error")
+                if span:
+                    span.outcome = "error"
+                return None
+            if span:
+                span.bytes = len(data)
+        self.metrics.inc("downloads", label="ok")
+        self.metrics.inc("download_bytes", len(data))
+        self.metrics.observe_since("download_latency", start)
+        return data
+
+    async def _fetch_media(self, url: str, allow_stream: bool = False) -> bytes | MediaStream | None:
+        """下载媒体；开启流式上传且体积较大时返回 MediaStream，否则返回字节数据"""
+        if not (allow_stream and self.streaming_enabled):
+            return await self.download_image(url)
+        async def request() -> bytes | MediaStream:
+            session = await self.http.cdn()
+            return await open_url_stream(session, url, self.stream_chunk_size, self.stream_min_size)
+
+        start = time.perf_counter()
+        with trace_span("download", "stream") as span:
+            try:
+                data = await retry_call(request, self.get_retry, is_idempotent_retryable)
+            except Exception as e:
+                logger.error(f"媒体流打开失败: url={self._redact_url_for_log(url)}, err={type(e).__name__}")
+                self.metrics.inc("downloads", label="error")
+                if span:
+                    span.outcome = "error"
+                return None
+            if span:
+                span.bytes = len(data) if isinstance(data, bytes) else (data.size or 0)
+        # 流式数据的耗时只计到响应头，字节数按声明长度统计
+        self.metrics.inc("downloads", label="ok")
+        self.metrics.inc("download_bytes", len(data) if isinstance(data, bytes) else (data.size or 0))
+        self.metrics.observe_since("download_latency", start)
+        return data
 
     async def get_first_image(self, event: BaseAstrMessageEvent) -> bytes | None:
         """获取消息里的第一张图并返回字节数据。
@@ -167,8 +733,7 @@ class CloudImgPlugin(Star):
                                 return await self.download_image(reply_seg.url)
                             if hasattr(reply_seg, 'file') and reply_seg.file:
                                 if os.path.exists(reply_seg.file):
-                                    with open(reply_seg.file, 'rb') as f:
-                                        return f.read()
+                                    return await self.offload.read_file(reply_seg.file)
 
         # 检查当前消息中的图片
         for seg in messages:
@@ -177,12 +742,11 @@ class CloudImgPlugin(Star):
                     return await self.download_image(seg.url)
                 if hasattr(seg, 'file') and seg.file:
                     if os.path.exists(seg.file):
-                        with open(seg.file, 'rb') as f:
-                            return f.read()
+                        return await self.offload.read_file(seg.file)
 
         return None
 
-    async def get_first_video_from_reply(self, event: BaseAstrMessageEvent) -> tuple[bytes | None, str | None]:
+    async def get_first_video_from_reply(self, event: BaseAstrMessageEvent) -> tuple[bytes | MediaStream | None, str | None]:
         """从引用消息中获取第一个视频并返回(字节数据, 原始文件名)。"""
 
         messages = event.get_messages()
@@ -194,14 +758,13 @@ class CloudImgPlugin(Star):
                         if isinstance(item, Video):
                             original_filename = getattr(item, 'file', None)
                             if hasattr(item, 'url') and item.url:
-                                return await self.download_image(item.url), original_filename
+                                return await self._fetch_media(item.url, allow_stream=True), original_filename
                             if hasattr(item, 'file') and item.file:
                                 try:
                                     if hasattr(event, 'bot') and hasattr(event.bot, 'api'):
-                                        result = await event.bot.api.call_action('get_file', file_id=item.file)
-                                        if result and 'url' in result:
-                                            video_url = result['url']
-                                            video_data = await self.download_image(video_url)
+                                        video_url = await self._resolve_file_url(event, item.file)
+                                        if video_url:
+                                            video_data = await self._fetch_media(video_url, allow_stream=True)
                                             return video_data, original_filename
                                 except Exception:
                                     pass
@@ -209,86 +772,348 @@ class CloudImgPlugin(Star):
 
         return None, None
 
-    async def upload_to_cloudflare_imgbed(self, image_data: bytes, folder_name: str, original_filename: str = None) -> str | None:
-        """上传文件到CloudFlare ImgBed"""
+    async def upload_to_cloudflare_imgbed(
+        self,
+        image_data: bytes | MediaStream,
+        folder_name: str,
+        original_filename: str = None,
+        force: bool = False,
+        deadline: Deadline | None = None,
+        tally: TranscodeTally | None = None,
+    ) -> str | None:
+        """上传文件到CloudFlare ImgBed
+
+        image_data 为 MediaStream 时以分块方式流式发送，并在结束后关闭该流。
+        开启上传去重时，相同内容上传到同一文件夹直接返回已记录的链接，
+        并发上传相同内容只会发起一次请求；force 为真时跳过查找强制重新上传。
+        deadline 为命令级截止时间，上传阶段最多使用其 upload 预算。
+        开启图片压缩时，成功上传的压缩结果累计到 tally 中。
+        """
+        deadline = deadline or Deadline.unbounded()
+        try:
+            return await deadline.run(
+                self._upload_with_dedup(image_data, folder_name, original_filename, force, tally),
+                "upload",
+            )
+        except DeadlineExceeded:
+            logger.warning(f"上传超时: folder={folder_name}")
+            return "上传超时"
+        finally:
+            # 截止时间已过时协程不会执行，需在此处关闭流
+            if isinstance(image_data, MediaStream):
+                await image_data.close()
+
+    async def _upload_with_dedup(
+        self,
+        image_data: bytes | MediaStream,
+        folder_name: str,
+        original_filename: str = None,
+        force: bool = False,
+        tally: TranscodeTally | None = None,
+    ) -> str | None:
+        if not self.dedup:
+            return await self._post_to_imgbed(image_data, folder_name, original_filename, tally)
+
+        if isinstance(image_data, MediaStream):
+            # 流式数据无法预先得到哈希，边上传边计算，成功后记录供后续去重
+            image_data.hasher = new_hasher()
+            result = await self._post_to_imgbed(image_data, folder_name, original_filename)
+            if isinstance(result, str) and result.startswith("http"):
+                self.dedup.record(image_data.hasher.hexdigest(), folder_name, result)
+            return result
+
+        digest = await self.offload.run("hash", content_digest, image_data, size=len(image_data))
+        if not force:
+            cached = await self.dedup.lookup(digest, folder_name)
+            if cached:
+                logger.debug(f"上传去重命中: folder={folder_name}, digest={digest}")
+                return cached
+
+        async def upload():
+            result = await self._post_to_imgbed(image_data, folder_name, original_filename, tally)
+            if isinstance(result, str) and result.startswith("http"):
+                self.dedup.record(digest, folder_name, result)
+            return result
+
+        return await self.dedup.flight.do((digest, folder_name), upload)
+
+    async def _post_to_imgbed(
+        self,
+        image_data: bytes | MediaStream,
+        folder_name: str,
+        original_filename: str = None,
+        tally: TranscodeTally | None = None,
+    ) -> str | None:
+        """向图床 /upload 发起上传请求，返回链接或错误提示"""
         if not self.upload_api_url:
+            if isinstance(image_data, MediaStream):
+                await image_data.close()
             return "上传API地址未配置"
 
-        upload_url = f"{self.upload_api_url}/upload"
-
-        file_ext = ".jpg"
-        content_type = "image/jpeg"
-
-        ext_map = {
-            ".jpg": ("image", "jpeg"),
-            ".jpeg": ("image", "jpeg"),
-            ".png": ("image", "png"),
-            ".gif": ("image", "gif"),
-            ".bmp": ("image", "bmp"),
-            ".webp": ("image", "webp"),
-            ".mp4": ("video", "mp4"),
-            ".webm": ("video", "webm"),
-            ".mov": ("video", "quicktime"),
-            ".mkv": ("video", "x-matroska"),
-            ".avi": ("video", "x-msvideo"),
-            ".wmv": ("video", "x-ms-wmv"),
-            ".flv": ("video", "x-flv"),
-            ".m4v": ("video", "x-m4v"),
-        }
+        # 按文件头判断实际格式，文件名缺失或扩展名与内容不符时以文件头为准
+        try:
+            if isinstance(image_data, MediaStream):
+                head = await image_data.peek(SNIFF_BYTES)
+                file_ext, content_type = sniff_media(head, image_data.size)
+            else:
+                file_ext, content_type = sniff_media(image_data, len(image_data))
+        except UnsupportedMediaError as e:
+            if isinstance(image_data, MediaStream):
+                await image_data.close()
+            self.metrics.inc("uploads", label="rejected")
+            logger.warning(f"拒绝上传: folder={folder_name}, filename={original_filename}, reason={e}")
+            return f"{e}，已取消上传"
+        except Exception as e:
+            # 预读流开头时的网络或文件读取错误
+            if isinstance(image_data, MediaStream):
+                await image_data.close()
+            logger.error(f"读取文件失败: err={type(e).__name__}")
+            return "文件上传失败"
+        base_name = os.path.splitext(os.path.basename(original_filename or ""))[0] or "upload"
 
-        if original_filename:
-            ext = os.path.splitext(original_filename)[1].lower()
-            if ext in ext_map:
-                major, minor = ext_map[ext]
-                file_ext = ext
-                content_type = f"{major}/{minor}"
+        transcoded = None
+        if self.transcoder and isinstance(image_data, bytes):
+            try:
+                transcoded = await self.transcoder.transcode(image_data, f"{base_name}{file_ext}", folder_name)
+            except Exception as e:
+                logger.warning(f"图片压缩失败，按原图上传: err={type(e).__name__}")
+            if transcoded is not None:
+                logger.debug(f"图片已压缩: {len(image_data)} -> {len(transcoded.data)} bytes, cpu={transcoded.cpu_time:.3f}s")
+                image_data = transcoded.data
+                file_ext = os.path.splitext(transcoded.filename)[1]
+                content_type = MEDIA_TYPES[file_ext]
 
         # 准备表单数据
         filename = f"upload{file_ext}"
-        data = aiohttp.FormData()
-        data.add_field('file', image_data, filename=filename, content_type=content_type)
-
-        params = {}
-        if self.auth_code:
-            params['authCode'] = self.auth_code
-        params['serverCompress'] = 'false'  # 禁用压缩
-        params['uploadFolder'] = folder_name
-        params['returnFormat'] = 'full'  # 使用完整格式
 
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(upload_url, data=data, params=params) as response:
+        def build_form() -> aiohttp.FormData:
+            # FormData 只能发送一次，每次重试重新构建
+            data = aiohttp.FormData()
+            if isinstance(image_data, MediaStream):
+                logger.debug(f"流式上传: size={image_data.size}, chunk_size={self.stream_chunk_size}")
+                data.add_field('file', image_data.iter_chunks(), filename=filename, content_type=content_type)
+            else:
+                data.add_field('file', image_data, filename=filename, content_type=content_type)
+            return data
+
+        def is_retryable(e: BaseException) -> bool:
+            # 流式数据一旦开始发送就无法重放
+            if isinstance(image_data, MediaStream) and image_data.consumed:
+                return False
+            return is_upload_retryable(e)
+
+        size = len(image_data) if isinstance(image_data, bytes) else image_data.size
+        use_chunked = self.chunked_uploader is not None and self.chunked_uploader.should_chunk(size)
+        resume_key = None
+        if use_chunked:
+            # 续传清单需区分同名同大小的不同文件：内存数据用内容哈希，流式数据用来源 URL 或文件
+            if isinstance(image_data, MediaStream):
+                identity = image_data.source or content_digest(head)
+            else:
+                identity = await self.offload.run("hash", content_digest, image_data, size=len(image_data))
+            resume_key = f"{folder_name}\0{base_name}{file_ext}\0{identity}"
+
+        async def send(backend: Backend) -> str:
+            params = {}
+            if backend.auth_code:
+                params['authCode'] = backend.auth_code
+            params['serverCompress'] = 'false'  # 禁用压缩
+            params['uploadFolder'] = folder_name
+            params['returnFormat'] = 'full'  # 使用完整格式
+            upload_url = f"{backend.base_url}/upload"
+
+            async def request() -> str:
+                session = await self.http.imgbed()
+                async with session.post(upload_url, data=build_form(), params=params) as response:
                     response_text = await response.text()
-
                     if response.status != 200:
-                        return self._handle_response_error(response.status, response_text)
+                        raise HttpStatusError(response.status, response_text)
+                    return response_text
 
-                    try:
-                        response_json = json.loads(response_text) # Use json.loads since we already have response_text
-
-                        if isinstance(response_json, list) and len(response_json) > 0:
-                            src_path = response_json[0].get('src', '')
-                            if src_path:
-                                return src_path
-                            else:
-                                logger.error(f"上传成功但未找到链接，响应: {response_text}")
-                                return "上传成功但未找到链接"
-                        elif 'data' in response_json and isinstance(response_json['data'], list) and len(response_json['data']) > 0:
-                            src_path = response_json['data'][0].get('src', '')
-                            if src_path:
-                                return src_path
-                            else:
-                                logger.error(f"上传成功但未找到链接，响应: {response_text}")
-                                return "上传成功但未找到链接"
-                        else:
-                            logger.error(f"上传响应格式错误，响应: {response_text}")
-                            return "上传响应格式错误"
-                    except json.JSONDecodeError:
-                        logger.error(f"上传响应不是有效的JSON格式，响应: {response_text}")
-                        return "上传响应不是有效的JSON格式"
+            backend_outcome = "error"
+            try:
+                if use_chunked:
+                    # 大文件分块上传，各分块独立重试，中断后可续传
+                    logger.info(f"分块上传: backend={backend.name}, folder={folder_name}, size={size}")
+                    text = await self.chunked_uploader.upload(
+                        image_data,
+                        filename,
+                        content_type,
+                        upload_url,
+                        params,
+                        resume_key=resume_key,
+                        breaker=backend.breaker,
+                    )
+                else:
+                    text = await retry_call(request, self.upload_retry, is_retryable, backend.breaker)
+                backend_outcome = "ok"
+                return text
+            except CircuitOpenError:
+                backend_outcome = "circuit_open"
+                raise
+            finally:
+                # 熔断拒绝时未发出请求，不计入实例统计
+                if backend_outcome != "circuit_open":
+                    self.backends.record(backend, None, backend_outcome == "ok")
+                self.metrics.inc("backend_uploads", label=f"{backend.name}:{backend_outcome}")
+
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            writers = self.backends.write_order()
+            if self.mirror_upload and len(writers) > 1 and isinstance(image_data, bytes):
+                response_text = await self._upload_mirrored(writers, send)
+            else:
+                response_text = await self._upload_with_failover(writers, send, image_data)
+            outcome = "ok"
+        except CircuitOpenError:
+            outcome = "circuit_open"
+            return "图床暂时不可用，请稍后再试"
+        except HttpStatusError as e:
+            return self._handle_response_error(e.status, e.text)
         except Exception as e:
             logger.error(f"文件上传失败: err={type(e).__name__}")
             return "文件上传失败"
+        finally:
+            if isinstance(image_data, MediaStream):
+                await image_data.close()
+            self.metrics.inc("uploads", label=outcome)
+            self.metrics.observe_since("upload_latency", start)
+            sent = image_data.bytes_read if isinstance(image_data, MediaStream) else len(image_data)
+            record_span("upload", time.perf_counter() - start, "chunked" if use_chunked else "", sent, outcome)
+            if outcome == "ok":
+                self.metrics.inc("upload_bytes", sent)
+                if transcoded is not None:
+                    self.metrics.inc("transcode_saved_bytes", transcoded.saved)
+                    self.metrics.observe("transcode_cpu", transcoded.cpu_time)
+                    if tally is not None:
+                        tally.add(transcoded)
+
+        try:
+            response_json = json.loads(response_text) # Use json.loads since we already have response_text
+
+            if isinstance(response_json, list) and len(response_json) > 0:
+                src_path = response_json[0].get('src', '')
+                if src_path:
+                    self._on_folder_written(folder_name)
+                    return src_path
+                else:
+                    logger.error(f"上传成功但未找到链接，响应: {response_text}")
+                    return "上传成功但未找到链接"
+            elif 'data' in response_json and isinstance(response_json['data'], list) and len(response_json['data']) > 0:
+                src_path = response_json['data'][0].get('src', '')
+                if src_path:
+                    self._on_folder_written(folder_name)
+                    return src_path
+                else:
+                    logger.error(f"上传成功但未找到链接，响应: {response_text}")
+                    return "上传成功但未找到链接"
+            else:
+                logger.error(f"上传响应格式错误，响应: {response_text}")
+                return "上传响应格式错误"
+        except json.JSONDecodeError:
+            logger.error(f"上传响应不是有效的JSON格式，响应: {response_text}")
+            return "上传响应不是有效的JSON格式"
+
+    async def _upload_with_failover(
+        self,
+        writers: list[Backend],
+        send: Callable[[Backend], Awaitable[str]],
+        image_data: bytes | MediaStream,
+    ) -> str:
+        """按顺序向可写实例上传，仅在实例不可用（熔断、连接失败、网关错误）且数据可重发时转移到下一个"""
+        last_error: BaseException | None = None
+        for backend in writers:
+            try:
+                return await send(backend)
+            except Exception as e:
+                if isinstance(image_data, MediaStream) and image_data.consumed:
+                    raise
+                if not isinstance(e, CircuitOpenError) and not is_upload_retryable(e):
+                    raise
+                last_error = e
+                logger.warning(f"图床实例不可用，转移上传: backend={backend.name}, err={type(e).__name__}")
+        raise last_error or CircuitOpenError("没有可写的图床实例")
+
+    async def _upload_mirrored(self, writers: list[Backend], send: Callable[[Backend], Awaitable[str]]) -> str:
+        """并发上传到所有可写实例，返回按写入顺序第一个成功的响应；全部失败时抛出第一个实例的错误"""
+        results = await asyncio.gather(*(send(backend) for backend in writers), return_exceptions=True)
+        response_text = None
+        for backend, result in zip(writers, results):
+            if isinstance(result, BaseException):
+                logger.warning(f"镜像上传失败: backend={backend.name}, err={type(result).__name__}")
+            elif response_text is None:
+                response_text = result
+        if response_text is None:
+            raise results[0]
+        return response_text
+
+    async def _post_upload_form(self, url: str, params: dict, fields: dict, chunk: bytes | None, filename: str) -> str:
+        """分块上传使用的单次表单请求，返回响应文本"""
+        data = aiohttp.FormData()
+        for name, value in fields.items():
+            data.add_field(name, value)
+        if chunk is not None:
+            data.add_field('file', chunk, filename=filename, content_type='application/octet-stream')
+        session = await self.http.imgbed()
+        async with session.post(url, data=data, params=params) as response:
+            response_text = await response.text()
+            if response.status != 200:
+                raise HttpStatusError(response.status, response_text)
+            return response_text
+
+    def _on_folder_written(self, folder_name: str):
+        """上传成功后使相关文件夹的本地清单失效"""
+        if self.manifest:
+            self.manifest.invalidate(folder_name)
+
+    async def _call_action(self, event: AstrMessageEvent, action: str, deadline: Deadline | None = None, **params):
+        """调用 OneBot 接口，使用同名阶段预算并记录次数与耗时"""
+        deadline = deadline or Deadline.unbounded()
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await deadline.run(event.bot.api.call_action(action, **params), action)
+            outcome = "ok"
+            return result
+        except DeadlineExceeded:
+            outcome = "timeout"
+            raise
+        finally:
+            self.metrics.inc("onebot_calls", label=f"{action}:{outcome}")
+            self.metrics.observe_since("onebot_latency", start, label=action)
+            record_span(action, time.perf_counter() - start, outcome=outcome)
+
+    async def _resolve_file_url(self, event: AstrMessageEvent, file_id: str, deadline: Deadline | None = None) -> str | None:
+        """通过 get_file 将 file_id 解析为下载链接，结果按 TTL 缓存，相同 file_id 的并发解析只调用一次"""
+        deadline = deadline or Deadline.unbounded()
+        return await deadline.run(self.file_resolver.resolve(file_id, self._get_file_fetcher(event, file_id)))
+
+    def _get_file_fetcher(self, event: AstrMessageEvent, file_id: str):
+        async def fetch() -> str | None:
+            # 解析任务可能被多条指令共享，不受某一条指令的截止时间约束，只使用 get_file 阶段预算
+            result = await self._call_action(event, "get_file", Deadline(None, self.phase_budgets), file_id=file_id)
+            return result.get("url") if isinstance(result, dict) else None
+
+        return fetch
+
+    def _prefetch_file_urls(self, event: AstrMessageEvent, refs: list[dict]) -> list[asyncio.Task]:
+        """为只有 file_id 的媒体提前在后台解析链接，上传任务执行到读取时可直接命中或加入进行中的解析"""
+        if not hasattr(event, "bot") or not hasattr(event.bot, "api"):
+            return []
+        file_ids = []
+        for ref in refs:
+            url = ref.get("url")
+            file_or_id = ref.get("file")
+            if isinstance(url, str) and url.startswith(("http://", "https://")):
+                continue
+            if isinstance(file_or_id, str) and file_or_id and not os.path.exists(file_or_id):
+                file_ids.append(file_or_id)
+        if not file_ids:
+            return []
+
+        logger.debug(f"提前解析 file_id: count={len(file_ids)}")
+        return self.file_resolver.prefetch(file_ids, lambda file_id: self._get_file_fetcher(event, file_id))
 
     def _guess_filename_from_url(self, url: str, fallback_ext: str) -> str:
         try:
@@ -312,18 +1137,32 @@ class CloudImgPlugin(Star):
         except Exception:
             return "<invalid-url>"
 
-    def _build_upload_reply(self, title: str, results: list[dict]) -> str:
+    def _use_compact_summary(self, total: int) -> bool:
+        """精简汇总与进度报告一同启用，未开启时保持原有的逐条结果格式"""
+        return self.progress_enabled and total > self.progress_inline_links
+
+    def _build_upload_reply(
+        self,
+        title: str,
+        results: list[dict],
+        tally: TranscodeTally | None = None,
+        links_forwarded: bool = False,
+    ) -> str:
+        """上传结果回复；结果较多时使用精简格式，links_forwarded 为真表示链接已通过合并转发单独发送"""
         total = len(results)
         ok_results = [r for r in results if r.get("ok")]
         fail_results = [r for r in results if not r.get("ok")]
+        transcode_summary = tally.summary() if tally else None
 
         # 如果只有一个任务且成功，返回精简格式
         if total == 1 and len(ok_results) == 1:
             res = ok_results[0]
             kind_name = "视频" if res.get("kind") == "video" else "图片"
             if self.show_upload_link and res.get("url"):
-                return f"{kind_name}上传成功！\n链接: {res.get('url')}"
-            return f"{kind_name}上传成功！"
+                reply = f"{kind_name}上传成功！\n链接: {res.get('url')}"
+            else:
+                reply = f"{kind_name}上传成功！"
+            return f"{reply}\n{transcode_summary}" if transcode_summary else reply
 
         img_total = sum(1 for r in results if r.get("kind") == "image")
         vid_total = sum(1 for r in results if r.get("kind") == "video")
@@ -338,6 +1177,22 @@ class CloudImgPlugin(Star):
         type_suffix = f"（{'，'.join(type_parts)}）" if type_parts else ""
 
         msg_lines = [f"{title}：成功 {len(ok_results)}/{total}{type_suffix}"]
+        if self._use_compact_summary(total):
+            # 精简格式：链接每行一条，失败按原因合并序号
+            if links_forwarded:
+                msg_lines.append("链接已通过合并转发消息发送")
+            elif self.show_upload_link and ok_results:
+                msg_lines.append("链接：")
+                msg_lines.extend(f"{r['index']}. {r.get('url')}" for r in ok_results)
+            errors: dict[str, list[int]] = {}
+            for r in fail_results:
+                errors.setdefault(str(r.get("error")), []).append(r["index"])
+            for error, failed in errors.items():
+                msg_lines.append(f"失败（序号 {format_index_ranges(failed)}）：{error}")
+            if transcode_summary:
+                msg_lines.append(transcode_summary)
+            return "\n".join(msg_lines)
+
         for r in ok_results:
             kind = "视频" if r.get("kind") == "video" else "图片"
             if self.show_upload_link:
@@ -347,9 +1202,225 @@ class CloudImgPlugin(Star):
         for r in fail_results:
             kind = "视频" if r.get("kind") == "video" else "图片"
             msg_lines.append(f"- 序号 {r['index']}: {kind} 失败: {r.get('error')}")
+        if transcode_summary:
+            msg_lines.append(transcode_summary)
 
         return "\n".join(msg_lines)
 
+    def _build_link_nodes(self, event: AstrMessageEvent, ok_results: list[dict]) -> list | None:
+        """将上传链接打包为合并转发消息，仅在开启该选项且平台支持时返回"""
+        if not (self.progress_forward_links and self.show_upload_link and ok_results):
+            return None
+        if event.get_platform_name() != "aiocqhttp":
+            return None
+        lines = [f"{r['index']}. {r.get('url')}" for r in ok_results]
+        nodes = [
+            Node(uin=event.get_self_id(), name="CF图床助手", content=[Plain("\n".join(lines[i:i + 20]))])
+            for i in range(0, len(lines), 20)
+        ]
+        return [Nodes(nodes)]
+
+    async def _collect_upload_results(
+        self,
+        tasks: dict[int, asyncio.Task],
+        deadline: Deadline,
+        kind_of,
+        progress: BatchProgress,
+    ):
+        """按完成顺序将批量上传结果收集到 progress，需要时产出进度提示；到达截止时间后取消未完成的任务"""
+        index_of = {task: i for i, task in tasks.items()}
+
+        def result_of(task: asyncio.Task) -> dict:
+            i = index_of[task]
+            if task.cancelled():
+                return {"index": i, "ok": False, "error": "已超时取消", "kind": kind_of(i)}
+            if task.exception() is not None:
+                logger.error(f"上传任务异常: index={i}, err={task.exception()!r}")
+                return {"index": i, "ok": False, "error": "上传任务异常", "kind": kind_of(i)}
+            return task.result()
+
+        pending = set(tasks.values())
+        try:
+            while pending:
+                remaining = deadline.remaining()
+                if remaining is not None and remaining <= 0:
+                    break
+                waits = [t for t in (remaining, progress.next_report_in()) if t is not None]
+                done, pending = await asyncio.wait(
+                    pending, timeout=min(waits) if waits else None, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    progress.add(result_of(task))
+                if progress.due():
+                    yield progress.render()
+        finally:
+            # 超时或指令被中止时取消剩余任务
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+                for task in pending:
+                    progress.add(result_of(task))
+            progress.timed_out = bool(pending)
+
+    async def _upload_batch(
+        self,
+        event: AstrMessageEvent,
+        refs: list[dict],
+        indexes: list[int],
+        folder_name: str,
+        force: bool,
+        deadline: Deadline,
+        label: str,
+        progress: BatchProgress,
+        tally: TranscodeTally | None = None,
+    ):
+        """批量上传流水线：下载与上传分为两个阶段，各自排队并受独立的全局并发限制。
+
+        条目下载完成后立即释放下载槽位并进入上传队列，下载与上传得以重叠；
+        单条指令中已下载未上传完的条目数不超过 pipeline_buffer，避免大批量时占满内存。
+        结果按完成顺序收集到 progress 中，期间产出进度提示文本。
+        """
+        lane = self._upload_lane(event)
+        buffer = asyncio.Semaphore(self.pipeline_buffer)
+        prefetch_tasks = self._prefetch_file_urls(event, [refs[i - 1] for i in indexes])
+
+        async def upload_one(i: int):
+            ref = refs[i - 1]
+            kind = ref.get("kind") or "image"
+            try:
+                async with buffer:
+                    async with self.download_scheduler.slot(lane):
+                        logger.debug(
+                            f"{label}上传任务开始: index={i}, kind={kind}, filename={ref.get('filename')}, has_url={bool(ref.get('url'))}, has_file={bool(ref.get('file'))}"
+                        )
+                        data, filename, read_err = await self._read_media_bytes(event, ref, allow_stream=True, deadline=deadline)
+                    if read_err:
+                        logger.warning(f"{label}读取失败: index={i}, err={read_err}")
+                        return {"index": i, "ok": False, "error": read_err, "filename": filename, "kind": kind}
+                    try:
+                        async with self.upload_scheduler.slot(lane):
+                            result = await self.upload_to_cloudflare_imgbed(
+                                data, folder_name, filename, force=force, deadline=deadline, tally=tally
+                            )
+                    except BaseException:
+                        # 排队上传期间被取消时，流式数据尚未交给上传方法，需在此关闭
+                        if isinstance(data, MediaStream):
+                            await data.close()
+                        raise
+                if isinstance(result, str) and result.startswith("http"):
+                    return {"index": i, "ok": True, "url": result, "filename": filename, "kind": kind}
+                err_msg = result or "上传失败"
+                logger.warning(f"{label}上传失败: index={i}, err={err_msg}")
+                return {"index": i, "ok": False, "error": err_msg, "filename": filename, "kind": kind}
+            except SchedulerClosedError as e:
+                return {"index": i, "ok": False, "error": str(e), "filename": ref.get("filename"), "kind": kind}
+
+        try:
+            async for text in self._collect_upload_results(
+                {i: asyncio.create_task(upload_one(i)) for i in indexes},
+                deadline,
+                lambda i: refs[i - 1].get("kind") or "image",
+                progress,
+            ):
+                yield text
+        finally:
+            for task in prefetch_tasks:
+                task.cancel()
+
+    async def _run_batch_upload(
+        self,
+        event: AstrMessageEvent,
+        refs: list[dict],
+        indexes: list[int],
+        folder_name: str,
+        force: bool,
+        deadline: Deadline,
+        label: str,
+        tally: TranscodeTally | None = None,
+    ):
+        """执行批量上传并产出回复：较大的批次先确认开始并定期报告进度，最后发送汇总"""
+        progress = BatchProgress(
+            len(indexes),
+            every=self.progress_every,
+            interval=self.progress_interval,
+            enabled=self.progress_enabled and len(indexes) >= self.progress_min_batch,
+        )
+        if progress.enabled:
+            yield event.plain_result(f"开始上传 {len(indexes)} 个{label}，将每完成 {progress.every} 个或每 {progress.interval:.0f} 秒报告一次进度")
+        async for text in self._upload_batch(event, refs, indexes, folder_name, force, deadline, label, progress, tally):
+            yield event.plain_result(text)
+
+        results = progress.results()
+        ok_results = [r for r in results if r.get("ok")]
+        logger.info(
+            f"{label}上传结束: folder={folder_name}, success={len(ok_results)}, "
+            f"fail={len(results) - len(ok_results)}, timed_out={progress.timed_out}"
+        )
+
+        link_nodes = self._build_link_nodes(event, ok_results) if self._use_compact_summary(len(results)) else None
+        if link_nodes:
+            yield event.chain_result(link_nodes)
+        title = "上传超时，部分完成" if progress.timed_out else "上传完成"
+        yield event.plain_result(self._build_upload_reply(title, results, tally, links_forwarded=bool(link_nodes)))
+
+    def _upload_lane(self, event: AstrMessageEvent) -> tuple[str, str]:
+        """上传调度的公平通道：按 会话 + 发送者 区分（限流也按同样的键计数）"""
+        origin = getattr(event, "unified_msg_origin", "") or ""
+        try:
+            sender = str(event.get_sender_id() or "")
+        except Exception:
+            sender = ""
+        return origin, sender
+
+    def _on_queue_wait(self, label: str, waited: float):
+        self.metrics.observe("queue_wait", waited, label=label)
+        record_span("queue_wait", waited, label)
+
+    async def _get_random_traced(self, command: str, folder_name: str, content_type: str):
+        """带追踪地获取随机媒体，返回消息链或错误提示"""
+        trace = self.tracer.start(command, f"{command} folder={folder_name or '/'}")
+        try:
+            with self.tracer.activate(trace), trace_span("random", folder_name) as span:
+                result = await self.get_random_file_from_folder(folder_name, content_type)
+                if span and not isinstance(result, list):
+                    span.outcome = "error"
+                return result
+        finally:
+            self.tracer.finish(trace)
+
+    async def _check_rate_limit(self, event: AstrMessageEvent) -> tuple[bool, str | None]:
+        """随机媒体指令的限流检查，返回 (是否放行, 需要回复的提示)"""
+        if not self.rate_limiter:
+            return True, None
+        origin, sender = self._upload_lane(event)
+        allowed, wait = await self.rate_limiter.acquire(origin, sender)
+        if allowed:
+            return True, None
+        self.metrics.inc("rate_limited", label=self.rate_limiter.mode)
+        logger.debug(f"随机媒体请求被限流: origin={origin}, sender={sender}, wait={wait:.1f}s")
+        if self.rate_limiter.should_notify(origin, self.rate_limit_notice_cooldown):
+            return False, f"请求过于频繁，请 {max(1, round(wait))} 秒后再试"
+        return False, None
+
+    def _parse_upload_flags(
+        self,
+        event: AstrMessageEvent,
+        index_spec: str | None,
+        option: str | None,
+    ) -> tuple[str | None, set[str]]:
+        """从 /上传 参数中分离 --xxx 形式的选项，返回 (序号参数, 选项集合)"""
+        flags: set[str] = set()
+        for token in (getattr(event, "message_str", "") or "").split():
+            if token.startswith("--"):
+                flags.add(token.lower())
+        for arg in (index_spec, option):
+            if isinstance(arg, str) and arg.startswith("--"):
+                flags.add(arg.lower())
+        if isinstance(index_spec, str) and index_spec.startswith("--"):
+            index_spec = None
+        return index_spec, flags
+
     def _parse_index_spec(
         self,
         spec: str | None,
@@ -456,7 +1527,8 @@ class CloudImgPlugin(Star):
             logger.debug(f"检测到当前消息多图: count={len(current_refs)}")
         return [r for r in current_refs if r.get("url") or r.get("file")]
 
-    async def _try_get_forward_id(self, event: AstrMessageEvent) -> tuple[str | None, bool]:
+    async def _try_get_forward_id(self, event: AstrMessageEvent, deadline: Deadline | None = None) -> tuple[str | None, bool]:
+        deadline = deadline or Deadline.unbounded()
         forward_id = None
         found_json_forward = False
         msg_id = getattr(getattr(event, "message_obj", None), "message_id", None)
@@ -533,9 +1605,12 @@ class CloudImgPlugin(Star):
                         return inner.id, found_json_forward
 
         if reply_id and hasattr(event, "bot") and hasattr(event.bot, "api"):
-            try:
+            async def lookup() -> tuple[str | None, bool]:
+                # 解析任务可能被多条指令共享，只使用 get_msg 阶段预算
+                forward_id = None
+                found_json_forward = False
                 logger.debug(f"尝试从被回复消息解析合并转发: reply_id={reply_id}")
-                original_msg = await event.bot.api.call_action("get_msg", message_id=reply_id)
+                original_msg = await self._call_action(event, "get_msg", Deadline(None, self.phase_budgets), message_id=reply_id)
                 original_chain = original_msg.get("message") if isinstance(original_msg, dict) else None
                 if isinstance(original_chain, list):
                     logger.debug(f"get_msg 返回消息段: count={len(original_chain)}")
@@ -568,19 +1643,47 @@ class CloudImgPlugin(Star):
                                         logger.debug("检测到 JSON 合并聊天记录，但未解析到 forward_id")
                             except Exception:
                                 pass
+                return forward_id, found_json_forward
+
+            try:
+                forward_id, found_json_forward = await deadline.run(self.forward_cache.forward_of_reply(reply_id, lookup))
             except Exception as e:
                 logger.warning(f"获取被回复消息详情失败: {e}")
 
         logger.debug(f"/上传 合并检测结束: forward_id={forward_id}, found_json_forward={found_json_forward}, reply_id={reply_id}")
         return forward_id, found_json_forward
 
-    async def _list_media_refs_from_forward(self, event: AstrMessageEvent, forward_id: str) -> list[dict]:
+    async def _list_media_refs_from_forward(
+        self,
+        event: AstrMessageEvent,
+        forward_id: str,
+        deadline: Deadline | None = None,
+    ) -> list[dict]:
+        """合并转发中的媒体列表，优先使用缓存，超出截止时间时抛出 DeadlineExceeded"""
         if not hasattr(event, "bot") or not hasattr(event.bot, "api"):
             return []
 
+        deadline = deadline or Deadline.unbounded()
+        # 解析任务可能被多条指令共享，只使用 get_forward_msg 阶段预算
+        return await deadline.run(
+            self.forward_cache.media_refs(
+                forward_id,
+                lambda: self._fetch_media_refs_from_forward(event, forward_id, Deadline(None, self.phase_budgets)),
+            )
+        )
+
+    async def _fetch_media_refs_from_forward(
+        self,
+        event: AstrMessageEvent,
+        forward_id: str,
+        deadline: Deadline,
+    ) -> list[dict]:
+        """拉取合并转发并解析其中的媒体"""
         try:
             logger.debug(f"开始拉取合并转发详情: forward_id={forward_id}")
-            forward_data = await event.bot.api.call_action("get_forward_msg", id=forward_id)
+            forward_data = await self._call_action(event, "get_forward_msg", deadline, id=forward_id)
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.warning(f"调用 get_forward_msg API 失败 (ID: {forward_id}): {e}")
             return []
@@ -600,7 +1703,7 @@ class CloudImgPlugin(Star):
                 content_chain = []
                 if isinstance(raw_content, str):
                     try:
-                        parsed = json.loads(raw_content)
+                        parsed = await self.offload.json_loads(raw_content)
                         if isinstance(parsed, list):
                             content_chain = parsed
                     except Exception:
@@ -661,7 +1764,15 @@ class CloudImgPlugin(Star):
         logger.debug(f"合并转发媒体解析完成: total={len(filtered)}, images={img_count}, videos={vid_count}")
         return filtered
 
-    async def _read_media_bytes(self, event: AstrMessageEvent, media_ref: dict) -> tuple[bytes | None, str | None, str | None]:
+    async def _read_media_bytes(
+        self,
+        event: AstrMessageEvent,
+        media_ref: dict,
+        allow_stream: bool = False,
+        deadline: Deadline | None = None,
+    ) -> tuple[bytes | MediaStream | None, str | None, str | None]:
+        """读取媒体数据，allow_stream 为真且开启流式上传时大文件以 MediaStream 返回"""
+        deadline = deadline or Deadline.unbounded()
         url = media_ref.get("url")
         file_or_id = media_ref.get("file")
         filename = media_ref.get("filename")
@@ -671,7 +1782,10 @@ class CloudImgPlugin(Star):
             logger.debug(
                 f"读取媒体(直链): kind={kind}, filename={filename}, url={self._redact_url_for_log(url)}"
             )
-            data = await self.download_image(url)
+            try:
+                data = await deadline.run(self._fetch_media(url, allow_stream), "download")
+            except DeadlineExceeded:
+                return None, filename, "下载超时"
             if not data:
                 return None, filename, "下载失败"
             return data, filename, None
@@ -680,24 +1794,27 @@ class CloudImgPlugin(Star):
             if os.path.exists(file_or_id):
                 try:
                     logger.debug(f"读取媒体(本地文件): kind={kind}, filename={filename}, path={file_or_id}")
-                    with open(file_or_id, "rb") as f:
-                        return f.read(), filename, None
+                    if allow_stream and self.streaming_enabled:
+                        stream = open_file_stream(file_or_id, self.stream_chunk_size, self.stream_min_size)
+                        if stream is not None:
+                            return stream, filename, None
+                    return await self.offload.read_file(file_or_id), filename, None
                 except Exception as e:
                     return None, filename, f"读取文件失败: {e}"
 
             if hasattr(event, "bot") and hasattr(event.bot, "api"):
                 try:
                     logger.debug(f"读取媒体(get_file): kind={kind}, filename={filename}, file_id={file_or_id}")
-                    result = await event.bot.api.call_action("get_file", file_id=file_or_id)
-                    if isinstance(result, dict) and result.get("url"):
-                        data = await self.download_image(result["url"])
+                    resolved_url = await self._resolve_file_url(event, file_or_id, deadline)
+                    if resolved_url:
+                        data = await deadline.run(self._fetch_media(resolved_url, allow_stream), "download")
                         if not data:
                             return None, filename, "下载失败"
                         if not filename:
                             if kind == "video":
-                                filename = self._guess_filename_from_url(result["url"], ".mp4")
+                                filename = self._guess_filename_from_url(resolved_url, ".mp4")
                             else:
-                                filename = self._guess_filename_from_url(result["url"], ".jpg")
+                                filename = self._guess_filename_from_url(resolved_url, ".jpg")
                         return data, filename, None
                 except Exception as e:
                     return None, filename, f"获取文件失败: {e}"
@@ -709,17 +1826,45 @@ class CloudImgPlugin(Star):
     @filter.command("img")
     async def get_image(self, event: AstrMessageEvent):
         """获取随机图片或视频"""
-        result = await self.get_random_file_from_folder("", "image,video")
+        allowed, notice = await self._check_rate_limit(event)
+        if not allowed:
+            if notice:
+                yield event.plain_result(notice)
+            return
+        result = await self._get_random_traced("/img", "", "image,video")
         if isinstance(result, list):
             yield event.chain_result(result)
         else:
             yield event.plain_result(result)
 
     @filter.command("上传", alias={"upload"})
-    async def upload_image(self, event: AstrMessageEvent, folder_name: str = None, index_spec: str = None):
+    async def upload_image(self, event: AstrMessageEvent, folder_name: str = None, index_spec: str = None, option: str = None):
         """上传图片到CloudFlare ImgBed"""
+        index_spec, flags = self._parse_upload_flags(event, index_spec, option)
+        # --trace 仅对管理员生效，在回复末尾附上各阶段耗时
+        show_trace = "--trace" in flags and event.is_admin()
+        trace = self.tracer.start("/上传", f"/上传 folder={folder_name} index={index_spec}")
+        last = None
+        try:
+            async for result in self.tracer.drive(trace, self._handle_upload(event, folder_name, index_spec, flags)):
+                if not show_trace:
+                    yield result
+                    continue
+                # 阶段明细附在最后一条回复上，需延后一条发送
+                if last is not None:
+                    yield last
+                last = result
+        finally:
+            self.tracer.finish(trace)
+        if last is not None:
+            last.message(f"\n\n{trace.breakdown()}")
+            yield last
+
+    async def _handle_upload(self, event: AstrMessageEvent, folder_name: str | None, index_spec: str | None, flags: set[str]):
+        """/上传 的实际处理流程，在 upload_image 的追踪中执行"""
         msg_id = getattr(getattr(event, "message_obj", None), "message_id", None)
-        logger.info(f"/上传: folder={folder_name}, index_spec={index_spec}")
+        force = "--force" in flags
+        logger.info(f"/上传: folder={folder_name}, index_spec={index_spec}, flags={sorted(flags)}")
         logger.debug(f"/上传 message_id={msg_id}")
         if self.upload_admin_only:
             if not event.is_admin():
@@ -735,10 +1880,16 @@ class CloudImgPlugin(Star):
             yield event.plain_result(f"文件夹名 {folder_name} 不允许包含英文标点")
             return
         
-        forward_id, found_json_forward = await self._try_get_forward_id(event)
+        deadline = Deadline(self.upload_command_timeout, self.phase_budgets)
+        tally = TranscodeTally()
+        forward_id, found_json_forward = await self._try_get_forward_id(event, deadline)
         logger.debug(f"/上传 检测结果: forward_id={forward_id}, found_json_forward={found_json_forward}")
         if forward_id:
-            media_refs = await self._list_media_refs_from_forward(event, forward_id)
+            try:
+                media_refs = await self._list_media_refs_from_forward(event, forward_id, deadline)
+            except DeadlineExceeded:
+                yield event.plain_result("获取合并聊天记录超时，请稍后重试")
+                return
             if not media_refs:
                 yield event.plain_result("合并聊天记录中未找到可上传的图片/视频")
                 return
@@ -756,34 +1907,11 @@ class CloudImgPlugin(Star):
             logger.info(f"合并聊天记录上传开始: folder={folder_name}, total={len(media_refs)}, selected={len(indexes)}")
             logger.debug(f"合并聊天记录上传 indexes={indexes}")
 
-            semaphore = asyncio.Semaphore(3)
-
-            async def upload_one(i: int):
-                ref = media_refs[i - 1]
-                async with semaphore:
-                    logger.debug(
-                        f"合并聊天记录上传任务开始: index={i}, kind={ref.get('kind')}, filename={ref.get('filename')}, has_url={bool(ref.get('url'))}, has_file={bool(ref.get('file'))}"
-                    )
-                    data, filename, read_err = await self._read_media_bytes(event, ref)
-                    if read_err:
-                        logger.warning(f"合并聊天记录媒体读取失败: index={i}, err={read_err}")
-                        return {"index": i, "ok": False, "error": read_err, "filename": filename, "kind": ref.get("kind")}
-                    result = await self.upload_to_cloudflare_imgbed(data, folder_name, filename)
-                    if isinstance(result, str) and result.startswith("http"):
-                        return {"index": i, "ok": True, "url": result, "filename": filename, "kind": ref.get("kind")}
-                    err_msg = result or "上传失败"
-                    logger.warning(f"合并聊天记录媒体上传失败: index={i}, err={err_msg}")
-                    return {"index": i, "ok": False, "error": err_msg, "filename": filename, "kind": ref.get("kind")}
-
-            results = await asyncio.gather(*(upload_one(i) for i in indexes))
-
-            ok_results = [r for r in results if r.get("ok")]
-            fail_results = [r for r in results if not r.get("ok")]
-
-            logger.info(f"合并聊天记录上传结束: folder={folder_name}, success={len(ok_results)}, fail={len(fail_results)}")
+            async for result in self._run_batch_upload(
+                event, media_refs, indexes, folder_name, force, deadline, "合并聊天记录媒体", tally
+            ):
+                yield result
             logger.debug(f"合并聊天记录上传 forward_id={forward_id}")
-
-            yield event.plain_result(self._build_upload_reply("上传完成", results))
             return
 
         if found_json_forward:
@@ -800,52 +1928,49 @@ class CloudImgPlugin(Star):
             logger.info(f"图片上传开始: folder={folder_name}, total={len(image_refs)}, selected={len(indexes)}")
             logger.debug(f"图片上传 indexes={indexes}")
 
-            semaphore = asyncio.Semaphore(3)
-
-            async def upload_one(i: int):
-                ref = image_refs[i - 1]
-                async with semaphore:
-                    logger.debug(
-                        f"图片上传任务开始: index={i}, filename={ref.get('filename')}, has_url={bool(ref.get('url'))}, has_file={bool(ref.get('file'))}"
-                    )
-                    data, filename, read_err = await self._read_media_bytes(event, ref)
-                    if read_err:
-                        logger.warning(f"图片读取失败: index={i}, err={read_err}")
-                        return {"index": i, "ok": False, "error": read_err, "filename": filename, "kind": "image"}
-                    result = await self.upload_to_cloudflare_imgbed(data, folder_name, filename)
-                    if isinstance(result, str) and result.startswith("http"):
-                        return {"index": i, "ok": True, "url": result, "filename": filename, "kind": "image"}
-                    err_msg = result or "上传失败"
-                    logger.warning(f"图片上传失败: index={i}, err={err_msg}")
-                    return {"index": i, "ok": False, "error": err_msg, "filename": filename, "kind": "image"}
-
-            results = await asyncio.gather(*(upload_one(i) for i in indexes))
-            ok_results = [r for r in results if r.get("ok")]
-            fail_results = [r for r in results if not r.get("ok")]
-
-            logger.info(f"图片上传结束: folder={folder_name}, success={len(ok_results)}, fail={len(fail_results)}")
-
-            yield event.plain_result(self._build_upload_reply("上传完成", results))
+            async for result in self._run_batch_upload(
+                event, image_refs, indexes, folder_name, force, deadline, "图片", tally
+            ):
+                yield result
             return
 
-        image_data = await self.get_first_image(event)
+        async def upload_single() -> tuple[str | None, str]:
+            lane = self._upload_lane(event)
+            async with self.download_scheduler.slot(lane):
+                data, original_filename, kind = await self.get_first_image(event), None, "image"
+                if not data:
+                    kind = "video"
+                    data, original_filename = await self.get_first_video_from_reply(event)
+            if not data:
+                return None, kind
+            try:
+                async with self.upload_scheduler.slot(lane):
+                    return await self.upload_to_cloudflare_imgbed(
+                        data, folder_name, original_filename, force=force, deadline=deadline, tally=tally
+                    ), kind
+            except BaseException:
+                if isinstance(data, MediaStream):
+                    await data.close()
+                raise
+
+        try:
+            result, kind = await deadline.run(upload_single())
+        except SchedulerClosedError as e:
+            yield event.plain_result(str(e))
+            return
+        except DeadlineExceeded:
+            yield event.plain_result("上传超时，请稍后重试")
+            return
 
-        if not image_data:
-            video_data, original_filename = await self.get_first_video_from_reply(event)
-            if video_data:
-                result = await self.upload_to_cloudflare_imgbed(video_data, folder_name, original_filename)
-                kind = "video"
-            else:
-                yield event.plain_result("未找到引用消息中的图片/视频")
-                return
-        else:
-            result = await self.upload_to_cloudflare_imgbed(image_data, folder_name, None)
-            kind = "image"
+        if result is None:
+            yield event.plain_result("未找到引用消息中的图片/视频")
+            return
 
         if isinstance(result, str) and result.startswith("http"):
             reply = self._build_upload_reply(
                 "上传完成",
                 [{"index": 1, "ok": True, "url": result, "kind": kind}],
+                tally,
             )
             yield event.plain_result(reply)
         else:
@@ -858,6 +1983,8 @@ class CloudImgPlugin(Star):
             yield event.plain_result("此指令仅限管理员使用")
             return
 
+        await self.load_keyword_mappings()
+
         if not keyword:
             if not self.keyword_folder_map:
                 yield event.plain_result("当前没有已设置的关键词映射。")
@@ -890,11 +2017,13 @@ class CloudImgPlugin(Star):
         else:
             final_content_type = "image,video"
 
+        old_mapping = self.keyword_folder_map.get(keyword)
         self.keyword_folder_map[keyword] = {
             "folder": folder_name,
             "content_type": final_content_type
         }
-        self.save_keyword_mappings()
+        self.save_keyword_mappings(keyword)
+        self._on_mapping_changed(keyword, old_mapping)
 
         content_type_desc = {"image": "图片", "video": "视频", "image,video": "图片或视频"}
         desc = content_type_desc.get(final_content_type, "图片或视频")
@@ -908,6 +2037,8 @@ class CloudImgPlugin(Star):
             yield event.plain_result("此指令仅限管理员使用")
             return
 
+        await self.load_keyword_mappings()
+
         if not keyword:
             yield event.plain_result("参数错误！格式：/imgunlink 关键词 [文件夹名]\n例如：/imgunlink test 或 /imgunlink test 3cy,test1")
             return
@@ -918,13 +2049,15 @@ class CloudImgPlugin(Star):
 
         if not folders_to_remove:
             # 删除整个关键词映射
-            del self.keyword_folder_map[keyword]
-            self.save_keyword_mappings()
+            old_mapping = self.keyword_folder_map.pop(keyword)
+            self.save_keyword_mappings(keyword)
+            self._on_mapping_changed(keyword, old_mapping)
             yield event.plain_result(f"已完全删除关键词 '{keyword}' 的所有映射。")
             return
 
         # 删除指定的文件夹
         mapping = self.keyword_folder_map[keyword]
+        old_mapping = dict(mapping) if isinstance(mapping, dict) else mapping
         if isinstance(mapping, dict):
             current_folders_str = mapping.get("folder", "")
         else:
@@ -965,9 +2098,89 @@ class CloudImgPlugin(Star):
             if not_found:
                 msg += f"\n注：未找到以下文件夹：{', '.join(not_found)}"
 
-        self.save_keyword_mappings()
+        self.save_keyword_mappings(keyword)
+        self._on_mapping_changed(keyword, old_mapping)
         yield event.plain_result(msg)
 
+    # ==================== 运行指标 ====================
+
+    @filter.command("imgstats")
+    async def show_stats(self, event: AstrMessageEvent, view: str = None, trace_id: str = None):
+        """查看插件运行指标"""
+        if not event.is_admin():
+            yield event.plain_result("此指令仅限管理员使用")
+            return
+
+        if view == "trace":
+            yield event.plain_result(self._format_traces(trace_id))
+            return
+
+        lines = ["CF图床助手运行指标", self.metrics.render_text()]
+        for name, stats in self._component_stats().items():
+            if stats:
+                lines.append(f"{name}: {json.dumps(stats, ensure_ascii=False)}")
+        yield event.plain_result("\n".join(lines))
+
+    def _format_traces(self, trace_id: str | None = None, limit: int = 10) -> str:
+        """最近的命令追踪；指定追踪 ID 时显示其阶段明细"""
+        if trace_id:
+            for trace in self.tracer.recent:
+                if trace.trace_id == trace_id:
+                    return trace.breakdown()
+            return f"未找到追踪 {trace_id}，可能已被新的记录覆盖"
+        traces = list(self.tracer.recent)[-limit:]
+        if not traces:
+            return "暂无追踪记录"
+        lines = [f"最近 {len(traces)} 条追踪（/imgstats trace <ID> 查看明细）："]
+        for trace in reversed(traces):
+            ts = time.strftime("%H:%M:%S", time.localtime(trace.started_at))
+            lines.append(f"  {ts} {trace.trace_id} {trace.detail} {trace.duration:.2f}s")
+        return "\n".join(lines)
+
+    def _component_stats(self) -> dict[str, dict]:
+        """汇总各组件自带的状态统计"""
+        stats = {
+            "http": self.http.stats(),
+            "scheduler": self.upload_scheduler.stats(),
+            "download_scheduler": self.download_scheduler.stats(),
+            "breaker": self.imgbed_breaker.stats(),
+            "offload": self.offload.stats(),
+            "resolver": self.file_resolver.stats(),
+            "forward_cache": self.forward_cache.stats(),
+            "tracing": self.tracer.stats(),
+            "backends": self.backends.stats(),
+        }
+        if self.warmers:
+            stats["warmup"] = {host: warmer.stats() for host, warmer in self.warmers.items()}
+        if self.rate_limiter:
+            stats["rate_limit"] = self.rate_limiter.stats()
+        if self.chunked_uploader:
+            stats["chunked_upload"] = self.chunked_uploader.stats()
+        if self.transcoder:
+            stats["transcode"] = self.transcoder.stats()
+        if self.prefetcher:
+            stats["prefetch"] = self.prefetcher.stats()
+        if self.manifest:
+            stats["manifest"] = self.manifest.stats()
+        if self.media_cache:
+            stats["media_cache"] = self.media_cache.stats()
+        if self.dedup:
+            stats["dedup"] = self.dedup.stats()
+        return stats
+
+    async def _dump_metrics(self):
+        """以 Prometheus 文本格式写出指标，供 node_exporter textfile 等采集"""
+        try:
+            text = self.metrics.render_prometheus(self._component_stats())
+            await self.offload.write_text(self.metrics_dump_path, text)
+        except Exception as e:
+            logger.warning(f"写出指标文件失败: {e}")
+
+    async def _metrics_dump_loop(self):
+        while True:
+            await asyncio.sleep(self.metrics_dump_interval)
+            await self._dump_metrics()
+
     # ==================== 动态命令处理 ====================
 
     @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
@@ -986,39 +2199,63 @@ class CloudImgPlugin(Star):
 
     async def _process_dynamic_command(self, event: AstrMessageEvent):
         """处理动态命令"""
+        if not self._mappings_loaded:
+            await self.load_keyword_mappings()
+        index = self.dispatch_index
+        # 快速拒绝：基于原始文本首字符判断，绝大多数普通消息无需遍历消息段
+        raw_text = getattr(getattr(event, "message_obj", None), "message_str", None)
+        if index.quick_reject(raw_text):
+            return
+
         message_text = ""
         for seg in event.get_messages():
             if isinstance(seg, Plain):
                 message_text = seg.text.strip()
                 break
 
-        if message_text.startswith('/') and len(message_text) > 1:
-            keyword = message_text[1:]
-
-            if keyword in self.keyword_folder_map:
-                mapping = self.keyword_folder_map[keyword]
-                if isinstance(mapping, dict):
-                    folder_name_raw = mapping.get("folder", "")
-                    content_type = mapping.get("content_type", "image,video")
-                else:
-                    folder_name_raw = mapping
-                    content_type = "image,video"
+        route = index.match(message_text)
+        if route is None:
+            return
 
-                # 处理多文件夹随机逻辑
-                folders = [f.strip() for f in folder_name_raw.replace('，', ',').split(',') if f.strip()]
-                if not folders:
-                    return
+        allowed, notice = await self._check_rate_limit(event)
+        if not allowed:
+            if notice:
+                yield event.plain_result(notice)
+            else:
+                event.stop_event()
+            return
 
-                folder_name = random.choice(folders)
-                logger.debug(f"动态命令 /{keyword} 触发，从 {folders} 中随机选择文件夹: {folder_name}")
+        # 处理多文件夹随机逻辑
+        folder_name = self._choose_folder(route.folders, route.content_type)
+        logger.debug(f"动态命令 /{route.keyword} 触发，从 {list(route.folders)} 中随机选择文件夹: {folder_name}")
 
-                result = await self.get_random_file_from_folder(folder_name, content_type)
+        result = await self._get_random_traced(f"/{route.keyword}", folder_name, route.content_type)
 
-                if isinstance(result, list):
-                    yield event.chain_result(result)
-                else:
-                    yield event.plain_result(result)
+        if isinstance(result, list):
+            yield event.chain_result(result)
+        else:
+            yield event.plain_result(result)
 
     async def terminate(self):
         """插件销毁时的清理工作"""
+        if self._metrics_task:
+            self._metrics_task.cancel()
+            await self._dump_metrics()
+        for warmer in self.warmers.values():
+            await warmer.close()
+        self.download_scheduler.close()
+        self.upload_scheduler.close()
+        if self.prefetcher:
+            await self.prefetcher.close()
+        if self.manifest:
+            await self.manifest.close()
+        if self.media_cache:
+            await self.media_cache.close()
+        await self.keyword_store.close()
+        if self.dedup:
+            await self.dedup.close()
+        await self.http.close()
+        if self.transcoder:
+            self.transcoder.shutdown()
+        self.offload.shutdown()
         logger.info("CF图床助手已卸载")
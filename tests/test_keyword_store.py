@@ -0,0 +1,36 @@
+"""关键词映射存储测试，在插件根目录下运行：python -m pytest tests"""
+
+import asyncio
+import os
+
+from core.keyword_store import KeywordMappingStore
+
+
+def test_corrupt_legacy_json(tmp_path):
+    legacy = tmp_path / "keyword_mappings.json"
+    legacy.write_text('{"acg": "anime",', encoding="utf-8")
+    db_path = str(tmp_path / "keyword_mappings.db")
+
+    async def first_run():
+        store = KeywordMappingStore(db_path, legacy_json_path=str(legacy), flush_delay=0)
+        try:
+            assert await store.load() == {}
+            store.put("cat", {"folder": "cats", "content_type": "image"})
+            await store.flush()
+        finally:
+            await store.close()
+
+    async def second_run():
+        store = KeywordMappingStore(db_path, legacy_json_path=str(legacy), flush_delay=0)
+        try:
+            return await store.load()
+        finally:
+            await store.close()
+
+    asyncio.run(first_run())
+    assert not legacy.exists()
+    assert os.path.exists(f"{legacy}.corrupt")
+    # 重启后新增的映射仍然存在，损坏的旧文件不再被重复迁移
+    legacy.write_text('{"acg": "anime",', encoding="utf-8")
+    assert asyncio.run(second_run()) == {"cat": {"folder": "cats", "content_type": "image"}}
+    assert legacy.exists()
@@ -0,0 +1,61 @@
+"""文件头识别测试，在插件根目录下运行：python -m pytest tests"""
+
+import struct
+
+import pytest
+
+from core.sniff import UnsupportedMediaError, sniff_media
+
+
+def ftyp(major: bytes, *compatible: bytes, size: int = 4096) -> bytes:
+    body = b"ftyp" + major + b"\x00\x00\x02\x00" + b"".join(compatible)
+    box = struct.pack(">I", len(body) + 4) + body
+    return box + b"\x00" * (size - len(box))
+
+
+@pytest.mark.parametrize(
+    "data, expected",
+    [
+        (ftyp(b"isom", b"isom", b"iso2", b"avc1", b"mp41"), ".mp4"),
+        (ftyp(b"XAVC", b"XAVC", b"mp42", b"iso2"), ".mp4"),
+        (ftyp(b"iso8", b"iso8"), ".mp4"),
+        (ftyp(b"iso9", b"iso9", b"mp41"), ".mp4"),
+        (ftyp(b"mmp4", b"mmp4", b"mp41", b"isom"), ".mp4"),
+        (ftyp(b"abcd", b"abcd", b"mp42"), ".mp4"),
+        (ftyp(b"qt  ", b"qt  "), ".mov"),
+        (ftyp(b"M4V ", b"M4V ", b"M4A ", b"mp42", b"isom"), ".m4v"),
+        (ftyp(b"3gp4", b"isom", b"3gp4"), ".3gp"),
+        (ftyp(b"avif", b"avif", b"mif1", b"miaf"), ".avif"),
+        (ftyp(b"mif1", b"mif1", b"avif"), ".avif"),
+        (ftyp(b"heic", b"mif1", b"heic"), ".heic"),
+    ],
+)
+def test_ftyp_brands(data, expected):
+    assert sniff_media(data)[0] == expected
+
+
+@pytest.mark.parametrize("major", [b"M4A ", b"M4B ", b"M4P ", b"F4A "])
+def test_audio_only_ftyp_rejected(major):
+    with pytest.raises(UnsupportedMediaError):
+        sniff_media(ftyp(major, major, b"mp42", b"isom"))
+
+
+def test_unknown_ftyp_rejected():
+    with pytest.raises(UnsupportedMediaError):
+        sniff_media(ftyp(b"abcd", b"abcd"))
+
+
+def test_truncated_mp4_rejected():
+    with pytest.raises(UnsupportedMediaError):
+        # ftyp 盒声明的长度超过文件总大小
+        sniff_media(ftyp(b"isom", b"isom", b"mp41"), total_size=16)
+
+
+def test_ebml_doctype():
+    def ebml(doctype: bytes) -> bytes:
+        # EBML 头：EBMLVersion、EBMLReadVersion，然后是 DocType
+        header = b"\x1a\x45\xdf\xa3\x9f\x42\x86\x81\x01\x42\xf7\x81\x01\x42\x82" + bytes([0x80 | len(doctype)]) + doctype
+        return header + b"\x00" * 64
+
+    assert sniff_media(ebml(b"webm"))[0] == ".webm"
+    assert sniff_media(ebml(b"matroska"))[0] == ".mkv"